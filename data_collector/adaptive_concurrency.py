@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+頻寬與磁碟感知的自適應並行控制
+Adaptive concurrency controller for the staged download pipeline
+
+每隔 interval 秒量測各受控階段的 MB/s 與輸出磁碟的剩餘空間:
+
+* 以爬山法 (hill climbing) 調整 prefetch / fasterq-dump 的並行上限，
+  上一步調整讓吞吐量變好就沿同方向繼續，變差就反向；
+  階段佇列沒有積壓時不會再加大並行數。
+* 剩餘空間低於門檻時暫停送入新任務，回升到門檻的 1.2 倍後恢復。
+  暫停期間流水線已沒有任務 (不會再有任務釋放空間) 時每次量測都會警告，
+  持續 max_idle_wait 秒後本批次剩餘任務直接記為磁碟空間不足 (disk_full)，
+  依重試政策留待下次執行。
+"""
+
+import shutil
+import threading
+import time
+
+# 吞吐量變化小於此比例視為持平
+TOLERANCE = 0.05
+# 平滑係數 (指數移動平均)
+SMOOTHING = 0.5
+# 剩餘空間恢復收件的倍數 (避免在門檻附近反覆切換)
+RESUME_FACTOR = 1.2
+# 暫停收件且流水線閒置多久 (秒) 後放棄等待
+MAX_IDLE_WAIT = 600
+
+
+class _StageTuner:
+    """單一階段的爬山法狀態"""
+
+    def __init__(self, stage, min_workers):
+        self.stage = stage
+        self.min_workers = min_workers
+        self.last_bytes = stage.stats.bytes
+        self.rate = None  # 平滑後的 MB/s
+        self.last_rate = None
+        self.direction = 1
+
+    def sample(self, seconds):
+        """量測本區間的 MB/s (指數移動平均)"""
+        nbytes = self.stage.stats.bytes
+        current = (nbytes - self.last_bytes) / (1024 * 1024) / max(seconds, 1e-6)
+        self.last_bytes = nbytes
+        self.rate = current if self.rate is None else SMOOTHING * current + (1 - SMOOTHING) * self.rate
+        return self.rate
+
+    def step(self):
+        """依吞吐量變化決定新的並行上限，回傳 (舊值, 新值)"""
+        stage = self.stage
+        old = stage.limit
+        if self.last_rate is not None:
+            if self.rate < self.last_rate * (1 - TOLERANCE):
+                self.direction = -self.direction  # 變差: 反向
+            elif self.rate <= self.last_rate * (1 + TOLERANCE):
+                self.direction = 1 if stage.backlog() > 0 else -1  # 持平: 有積壓才加
+        self.last_rate = self.rate
+
+        target = old + self.direction
+        if self.direction > 0 and stage.backlog() == 0:
+            target = old  # 沒有等待中的任務，加大並行沒有意義
+        target = max(self.min_workers, target)
+        new = stage.set_limit(target)
+        return old, new
+
+
+class AdaptiveController:
+    """在背景執行緒中調整流水線並行數並依磁碟空間控制收件"""
+
+    def __init__(
+        self,
+        pipeline,
+        disk_path,
+        stage_names=("prefetch", "fasterq-dump"),
+        min_free_gb=50,
+        interval=60,
+        min_workers=1,
+        max_idle_wait=MAX_IDLE_WAIT,
+        log=print,
+    ):
+        self.pipeline = pipeline
+        self.log = log
+        self.disk_path = disk_path
+        self.min_free_bytes = min_free_gb * 1024 ** 3
+        self.interval = interval
+        self.max_idle_wait = max_idle_wait
+        self._idle_since = None  # 暫停收件且流水線閒置的起始時間
+        self.tuners = [
+            _StageTuner(pipeline.stage(name), min_workers) for name in stage_names
+        ]
+        self.history = []  # [(時間, {stage: (MB/s, 並行數)}, 剩餘 GB)]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="adaptive-controller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        self.pipeline.resume_admission()
+
+    def free_bytes(self):
+        try:
+            return shutil.disk_usage(self.disk_path).free
+        except OSError:
+            return None
+
+    def _loop(self):
+        last = time.time()
+        while not self._stop.wait(self.interval):
+            now = time.time()
+            self.tick(now - last)
+            last = now
+
+    def tick(self, seconds):
+        """執行一次量測與調整"""
+        free = self.free_bytes()
+        self._check_disk(free)
+
+        snapshot = {}
+        for tuner in self.tuners:
+            rate = tuner.sample(seconds)
+            if self.pipeline.admission_paused:
+                snapshot[tuner.stage.name] = (rate, tuner.stage.limit)
+                continue
+            old, new = tuner.step()
+            snapshot[tuner.stage.name] = (rate, new)
+            if new != old:
+                self.log(f"\n🎛️  {tuner.stage.name} 並行數 {old} → {new} ({rate:.2f} MB/s)")
+
+        free_gb = free / 1024 ** 3 if free is not None else None
+        self.history.append((time.time(), snapshot, free_gb))
+        return snapshot
+
+    def _check_disk(self, free):
+        if free is None:
+            return
+        if not self.pipeline.admission_paused and free < self.min_free_bytes:
+            self.pipeline.pause_admission()
+            self.log(
+                f"\n⛔ {self.disk_path} 剩餘空間 {free / 1024 ** 3:.1f} GB，"
+                f"低於 {self.min_free_bytes / 1024 ** 3:.0f} GB，暫停送入新任務"
+            )
+        elif self.pipeline.admission_paused and free >= self.min_free_bytes * RESUME_FACTOR:
+            self.pipeline.resume_admission()
+            self._idle_since = None
+            self.log(f"\n▶️  {self.disk_path} 剩餘空間 {free / 1024 ** 3:.1f} GB，恢復送入新任務")
+        elif self.pipeline.admission_paused:
+            self._check_stalled(free)
+
+    def _check_stalled(self, free):
+        """暫停中但沒有任務會釋放空間 (例如空間被流水線以外的檔案占用) 時警告，逾時後拒收"""
+        if not self.pipeline.idle():
+            self._idle_since = None
+            return
+        now = time.time()
+        if self._idle_since is None:
+            self._idle_since = now
+        waited = now - self._idle_since
+        reason = (
+            f"disk full: {self.disk_path} 剩餘空間 {free / 1024 ** 3:.1f} GB，"
+            f"低於 {self.min_free_bytes / 1024 ** 3:.0f} GB"
+        )
+        if waited >= self.max_idle_wait:
+            if not self.pipeline.admission_rejected:
+                self.log(f"\n❌ {reason}，已等待 {waited / 60:.0f} 分鐘，本批次剩餘任務記為磁碟空間不足")
+            self.pipeline.reject_admission(reason)
+        else:
+            self.log(
+                f"\n⚠️  {reason}，流水線已無任務可釋放空間；請清出空間，"
+                f"{(self.max_idle_wait - waited) / 60:.0f} 分鐘後剩餘任務將記為磁碟空間不足"
+            )
@@ -4,20 +4,81 @@ Robust FASTQ batch downloader
 穩定的批量FASTQ下載器
 """
 
+import argparse
 import subprocess
 import os
 import sys
 import time
-import json
+import shutil
 import signal
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+
+from adaptive_concurrency import AdaptiveController
+from download_metrics import METRICS_NAME, MetricsSink, print_summary
+from download_pipeline import (
+    PipelineStage,
+    RunJob,
+    StagedPipeline,
+    format_stage_stats,
+)
+from fastq_compress import FORMATS, compress_file, is_compressed, prefer_compressed, superseded_raw
+from file_transfer import transfer_file
+from job_ordering import ORDER_MIXED, ORDERS, DiskBudget, fill_unknown_sizes, order_runs
+from progress_board import ProgressBoard
+from progress_journal import JOURNAL_NAME, LEGACY_NAME, ProgressJournal
+from retry_policy import BASE_DELAY, RetryScheduler, is_permanent
+from run_metadata import METADATA_NAME, load_run_metadata
+from transfer_probe import ByteEta, TransferProbe
+
+try:
+    import fastq_stats  # QC 階段 (選用) 需要 numpy
+except ImportError:
+    fastq_stats = None
 
 # 全局中斷標誌
 interrupt_flag = False
 
+# 各階段預設並行數: 網路 (prefetch) / CPU+磁碟 (fasterq-dump) / 磁碟 I/O (備份、清理)
+PREFETCH_WORKERS = 4
+DUMP_WORKERS = 3
+IO_WORKERS = 2
+STAGE_QUEUE_SIZE = 4
+
+# 自適應並行: 各階段並行數上限、輸出磁碟最低剩餘空間、調整間隔
+MAX_PREFETCH_WORKERS = 10
+MAX_DUMP_WORKERS = 6
+MIN_FREE_GB = 50
+ADAPT_INTERVAL = 120  # 秒
+MAX_DISK_WAIT_MIN = 10  # 空間不足且流水線閒置時最多等待分鐘數
+
+# FASTQ 壓縮 (選用): 同時壓縮的 run 數、每個檔案的壓縮執行緒數
+COMPRESS_WORKERS = 1
+COMPRESS_THREADS = max(1, (os.cpu_count() or 2) // 2)
+
+# FASTQ QC (選用): 同時 QC 的 run 數、解析用的行程數
+QC_WORKERS = 1
+QC_PROCESSES = os.cpu_count() or 1
+
+# 流水線階段內含的細部步驟 (計時指標逐一記錄)
+STAGE_SUBSTEPS = {"archive": ("backup", "cleanup")}
+
+# 任務排序與流水線中預期 .sra 大小總和上限 (GB，0 表示不限制)
+JOB_ORDER = ORDER_MIXED
+MAX_INFLIGHT_GB = 200
+
+SRA_BACKUP_ROOT = Path("E:/sra_files")
+# 備份時計算的雜湊 (NCBI 公布的 .sra 校驗碼為 MD5)
+BACKUP_DIGEST = "md5"
+
+# 所有進行中 run 的共用進度顯示 (單一繪製執行緒)
+progress_board = ProgressBoard()
+
+def echo(message):
+    """印出訊息 (不與進度狀態列互相覆蓋)"""
+    progress_board.echo(message)
+
+
 def signal_handler(signum, frame):
     """處理 Ctrl+C 中斷信號"""
     global interrupt_flag
@@ -26,26 +87,11 @@ def signal_handler(signum, frame):
     interrupt_flag = True
 
 
-def run_sra_command_with_timer(sra_bin, command, args, timeout=3600):
-    """執行SRA命令並顯示即時秒數"""
-    import threading
-
+def run_sra_command(sra_bin, command, args, timeout=3600):
+    """執行SRA命令 (執行秒數由 progress_board 統一顯示)"""
     executable = sra_bin / f"{command}.exe"
     cmd = [str(executable)] + args
 
-    start_time = time.time()
-    completed = False
-
-    def show_timer():
-        while not completed:
-            elapsed = int(time.time() - start_time)
-            print(f"\r  執行中... {elapsed}秒", end="", flush=True)
-            time.sleep(1)
-
-    # 啟動計時器線程
-    timer_thread = threading.Thread(target=show_timer, daemon=True)
-    timer_thread.start()
-
     try:
         result = subprocess.run(
             cmd,
@@ -55,227 +101,667 @@ def run_sra_command_with_timer(sra_bin, command, args, timeout=3600):
             encoding="utf-8",
             errors="ignore",
         )
-        completed = True
-        time.sleep(0.1)  # 等待計時器線程更新
-        print("\r", end="")  # 清除計時器顯示
         return result.returncode == 0, result.stdout, result.stderr
     except subprocess.TimeoutExpired:
-        completed = True
-        time.sleep(0.1)
-        print("\r", end="")
         return False, "", f"Timeout after {timeout}s"
     except Exception as e:
-        completed = True
-        time.sleep(0.1)
-        print("\r", end="")
         return False, "", str(e)
 
 
-def run_sra_command(sra_bin, command, args, timeout=3600):
-    """執行SRA命令(無計時器版本)"""
-    executable = sra_bin / f"{command}.exe"
-    cmd = [str(executable)] + args
-
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            encoding="utf-8",
-            errors="ignore",
+def find_fastq_files(output_dir, run_id):
+    """找出 run 的 FASTQ ({run_id}.fastq / {run_id}_1.fastq ...，含壓縮檔；同時存在時只取壓縮檔)"""
+    return prefer_compressed(
+        sorted(
+            f
+            for f in output_dir.glob(f"{run_id}*")
+            if f.name.startswith((f"{run_id}_", f"{run_id}.fastq")) and not f.name.endswith(".part")
         )
-        return result.returncode == 0, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return False, "", f"Timeout after {timeout}s"
-    except Exception as e:
-        return False, "", str(e)
+    )
 
 
-def download_fastq(run_id, sra_bin, output_dir, progress_data, base_dir):
-    """下載單個FASTQ"""
-    global interrupt_flag
-    
-    # 檢查中斷標誌
-    if interrupt_flag:
-        print(f"\n⏸️  跳過 {run_id} (用戶中斷)")
-        return False
-    
-    print(f"\n{'='*60}")
-    print(f"📥 處理: {run_id}")
-    print(f"{'='*60}")
+def archived_sra(job, backup_root):
+    """
+    上次已完成 archive 且備份仍在 (大小與日誌記錄相同) 時回傳備份路徑
 
-    # 檢查是否已完成
-    if run_id in progress_data.get("completed", []):
-        print(f"✅ 已完成，跳過")
+    archive 會把 .sra 搬出臨時資料夾並刪除該資料夾，之後的步驟 (例如壓縮)
+    失敗或中斷時，續傳要以備份判斷，而不是臨時資料夾中的 .sra。
+    """
+    if "archive" not in job.done_steps:
+        return None
+    backup = backup_root / job.run_id / f"{job.run_id}.sra"
+    try:
+        size = backup.stat().st_size
+    except OSError:
+        return None
+    recorded = job.resume_info.get("archive", {}).get("size")
+    if recorded is not None and recorded != size:
+        return None
+    return backup
+
+
+def step_prefetch(job, sra_bin, base_dir, backup_root=None):
+    """步驟 1: prefetch (下載到 OneDrive 臨時目錄)"""
+    run_id = job.run_id
+    backup = archived_sra(job, backup_root) if backup_root is not None else None
+    if backup is not None:
+        echo(f"  [{run_id}] 步驟 1/4: prefetch ⏩ 上次已備份，沿用 {backup}")
+        job.sra_path = backup
+        job.skipped_steps.add("prefetch")
         return True
 
-    start_time = time.time()
+    sra_source = base_dir / run_id / f"{run_id}.sra"
+    if "prefetch" in job.done_steps and sra_source.exists():
+        echo(f"  [{run_id}] 步驟 1/4: prefetch ⏩ 上次已完成，沿用既有 SRA")
+        job.skipped_steps.add("prefetch")
+        return True
 
-    # Step 1: prefetch (下載到 OneDrive 臨時目錄)
-    print(f"  步驟 1/4: prefetch {run_id}...")
-    step1_start = time.time()
-    success, stdout, stderr = run_sra_command_with_timer(
+    echo(f"  [{run_id}] 步驟 1/4: prefetch...")
+    step_start = time.time()
+    success, stdout, stderr = run_sra_command(
         sra_bin, "prefetch", [run_id, "--max-size", "100G"], timeout=7200  # 120分鐘超時
     )
-    step1_time = time.time() - step1_start
+    step_time = time.time() - step_start
 
     if not success:
-        print(f" ❌ 失敗 ({step1_time:.1f}秒)")
-        print(f"  錯誤: {stderr[:100]}")
-        progress_data["failed"].append(
-            {
-                "run_id": run_id,
-                "step": "prefetch",
-                "error": stderr[:200],
-                "time": datetime.now().isoformat(),
-            }
-        )
-        save_progress(progress_data)
+        echo(f"  [{run_id}] ❌ prefetch 失敗 ({step_time:.1f}秒)")
+        echo(f"  [{run_id}] 錯誤: {stderr[:100]}")
+        job.fail("prefetch", stderr)
         return False
 
-    print(f"  ✅ 完成 ({step1_time:.1f}秒)")
+    if sra_source.exists():
+        job.step_bytes["prefetch"] = sra_source.stat().st_size
+    echo(f"  [{run_id}] ✅ prefetch 完成 ({step_time:.1f}秒)")
+    return True
 
-    # Step 2: fasterq-dump (解壓到 E:\fastq_data)
-    print(f"  步驟 2/4: fasterq-dump {run_id}...")
-    step2_start = time.time()
-    success, stdout, stderr = run_sra_command_with_timer(
-        sra_bin,
-        "fasterq-dump",
-        [run_id, "-O", str(output_dir), "--split-files"],
-        timeout=9000,  # 150分鐘超時
-    )
-    step2_time = time.time() - step2_start
 
-    if not success:
-        print(f"  ❌ 失敗 ({step2_time:.1f}秒)")
-        print(f"  錯誤: {stderr[:100]}")
-        progress_data["failed"].append(
-            {
-                "run_id": run_id,
-                "step": "fasterq-dump",
-                "error": stderr[:200],
-                "time": datetime.now().isoformat(),
-            }
+def step_fasterq_dump(job, sra_bin, output_dir, scratch_dir=None):
+    """
+    步驟 2: fasterq-dump (解壓到 E:\\fastq_data)
+
+    scratch_dir: 暫存目錄 (-t)；串流模式下沒有本機 .sra，
+    fasterq-dump 直接從 NCBI 讀取 accession，暫存檔放在此目錄
+    """
+    run_id = job.run_id
+    if "fasterq-dump" in job.done_steps and find_fastq_files(output_dir, run_id):
+        echo(f"  [{run_id}] 步驟 2/4: fasterq-dump ⏩ 上次已完成，沿用既有 FASTQ")
+        job.skipped_steps.add("fasterq-dump")
+    else:
+        echo(f"  [{run_id}] 步驟 2/4: fasterq-dump...")
+        step_start = time.time()
+        # 沿用備份時臨時資料夾已清除，直接從備份的 .sra 解壓
+        source = str(job.sra_path) if job.sra_path is not None else run_id
+        dump_args = [source, "-O", str(output_dir), "--split-files"]
+        if scratch_dir is not None:
+            dump_args += ["-t", str(scratch_dir)]
+        success, stdout, stderr = run_sra_command(
+            sra_bin, "fasterq-dump", dump_args, timeout=9000  # 150分鐘超時
         )
-        save_progress(progress_data)
-        return False
+        step_time = time.time() - step_start
+
+        if not success:
+            echo(f"  [{run_id}] ❌ fasterq-dump 失敗 ({step_time:.1f}秒)")
+            echo(f"  [{run_id}] 錯誤: {stderr[:100]}")
+            job.fail("fasterq-dump", stderr)
+            return False
 
-    print(f"  ✅ 完成 ({step2_time:.1f}秒)")
+        echo(f"  [{run_id}] ✅ fasterq-dump 完成 ({step_time:.1f}秒)")
 
     # 檢查 FASTQ 檔案
-    fastq_files = list(output_dir.glob(f"{run_id}*"))
+    fastq_files = find_fastq_files(output_dir, run_id)
     if not fastq_files:
-        print(f"  ⚠️  找不到輸出檔案")
+        echo(f"  [{run_id}] ⚠️  找不到輸出檔案")
+        job.fail("fasterq-dump", "找不到輸出檔案")
         return False
 
-    total_size = sum(f.stat().st_size for f in fastq_files) / (1024 * 1024)
+    total_bytes = sum(f.stat().st_size for f in fastq_files)
+    job.fastq_files = fastq_files
+    job.fastq_size_mb = total_bytes / (1024 * 1024)
+    job.step_bytes["fasterq-dump"] = total_bytes
+
+    echo(f"  [{run_id}] 📁 FASTQ 檔案: {len(fastq_files)} 個, 💾 {job.fastq_size_mb:.1f} MB")
+    return True
+
 
-    print(f"  📁 FASTQ 檔案: {len(fastq_files)} 個")
-    print(f"  💾 大小: {total_size:.1f} MB")
+def step_backup_sra(
+    job, base_dir, backup_root, expected_md5=None, digest=BACKUP_DIGEST, redownload_on_mismatch=False
+):
+    """
+    步驟 3: 備份 SRA 到 E 槽 (失敗只警告，不影響結果)
 
-    # Step 3: 備份 SRA 到 E 槽
-    print(f"  步驟 3/4: 備份 SRA 到 E 槽...", end="", flush=True)
-    step3_start = time.time()
+    搬移後計算 MD5 (digest=None 時不計算)，與 NCBI 公布的 expected_md5 比對；
+    結果記錄在 job.step_info["archive"]。MD5 不符時預設保留檔案並記錄為未驗證
+    (prefetch 可能下載 SRA Lite 等其他版本，與公布的 MD5 本來就不同)；
+    redownload_on_mismatch=True 時才刪除備份與 FASTQ 並回傳 False 以重新下載。
+    """
+    run_id = job.run_id
+    step_start = time.time()
     sra_source = base_dir / run_id / f"{run_id}.sra"
-    sra_backup_dir = Path("E:/sra_files") / run_id
+    sra_backup_dir = backup_root / run_id
+    verified = None
 
     try:
         if sra_source.exists():
             sra_backup_dir.mkdir(parents=True, exist_ok=True)
             sra_dest = sra_backup_dir / f"{run_id}.sra"
 
-            # 複製 SRA 檔案到 E 槽
-            import shutil
-
-            shutil.copy2(sra_source, sra_dest)
-
-            step3_time = time.time() - step3_start
-            sra_size = sra_source.stat().st_size / (1024 * 1024)
-            print(f" ✅ 完成 ({sra_size:.1f} MB, {step3_time:.1f}秒)")
+            # 搬移 SRA 檔案到 E 槽 (步驟 4 反正會刪除來源，能改名就不複製)
+            result = transfer_file(sra_source, sra_dest, keep_source=False, digest=digest)
+
+            step_time = time.time() - step_start
+            job.step_bytes["backup"] = result.bytes
+            job.backup_method = result.method
+            stat = sra_dest.stat()
+            info = {
+                "path": str(sra_dest),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "method": result.method,
+            }
+            if result.digest:
+                info[digest] = result.digest
+                if expected_md5:
+                    verified = result.digest == expected_md5.lower()
+                    info["md5_verified"] = verified
+            job.step_info["archive"] = info
+
+            check = {True: ", MD5 ✓", False: ", MD5 ✗"}.get(verified, "")
+            echo(
+                f"  [{run_id}] 步驟 3/4: 備份 SRA ✅ 完成 ({result.bytes / (1024 * 1024):.1f} MB, "
+                f"{result.method}{check}, {step_time:.1f}秒)"
+            )
         else:
-            step3_time = time.time() - step3_start
-            print(f" ⚠️  找不到 SRA 檔案 ({step3_time:.1f}秒)")
+            step_time = time.time() - step_start
+            echo(f"  [{run_id}] 步驟 3/4: 備份 SRA ⚠️  找不到 SRA 檔案 ({step_time:.1f}秒)")
     except Exception as e:
-        step3_time = time.time() - step3_start
-        print(f" ⚠️  警告: {str(e)} ({step3_time:.1f}秒)")
+        step_time = time.time() - step_start
+        echo(f"  [{run_id}] 步驟 3/4: 備份 SRA ⚠️  警告: {str(e)} ({step_time:.1f}秒)")
+
+    job.step_times["backup"] = step_time
+    if verified is False:
+        if not redownload_on_mismatch:
+            echo(
+                f"  [{run_id}] ⚠️  MD5 與 NCBI 不符 (預期 {expected_md5})，保留檔案並記錄為未驗證；"
+                f"可用 --redownload-on-md5-mismatch 刪除後重新下載"
+            )
+            return True
+        # 視為下載損壞: 刪除備份與由它產生的 FASTQ，重試時從 prefetch 重新開始
+        echo(f"  [{run_id}] ❌ MD5 不符 (預期 {expected_md5})，刪除備份與 FASTQ")
+        for path in [sra_backup_dir / f"{run_id}.sra"] + list(job.fastq_files):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        # .sra 已搬走並刪除、FASTQ 也刪除: 這些步驟 (與由 FASTQ 算出的 QC) 重試時都要重做
+        job.invalidated_steps.update(("prefetch", "fasterq-dump", "qc", "archive"))
+        job.fail("archive", f"MD5 mismatch: {info[digest]} != {expected_md5}")
+        return False
+    return True
+
 
-    # Step 4: 清理 OneDrive 臨時資料夾
-    print(f"  步驟 4/4: 清理臨時資料夾...", end="", flush=True)
-    step4_start = time.time()
+def step_cleanup(job, base_dir):
+    """步驟 4: 清理 OneDrive 臨時資料夾 (失敗只警告，不影響結果)"""
+    run_id = job.run_id
+    step_start = time.time()
     sra_temp_dir = base_dir / run_id
 
     try:
         if sra_temp_dir.exists():
-            import shutil
-
             shutil.rmtree(sra_temp_dir)
-            step4_time = time.time() - step4_start
-            print(f" ✅ 完成 ({step4_time:.1f}秒)")
+            step_time = time.time() - step_start
+            echo(f"  [{run_id}] 步驟 4/4: 清理臨時資料夾 ✅ 完成 ({step_time:.1f}秒)")
         else:
-            step4_time = time.time() - step4_start
-            print(f" ⚠️  資料夾不存在 ({step4_time:.1f}秒)")
+            step_time = time.time() - step_start
+            echo(f"  [{run_id}] 步驟 4/4: 清理臨時資料夾 ⚠️  資料夾不存在 ({step_time:.1f}秒)")
     except Exception as e:
-        step4_time = time.time() - step4_start
-        print(f" ⚠️  警告: {str(e)} ({step4_time:.1f}秒)")
+        step_time = time.time() - step_start
+        echo(f"  [{run_id}] 步驟 4/4: 清理臨時資料夾 ⚠️  警告: {str(e)} ({step_time:.1f}秒)")
+
+    job.step_times["cleanup"] = step_time
+    return True
 
-    elapsed = time.time() - start_time
-    print(f"  ⏱️  總時間: {elapsed:.1f} 秒")
 
-    progress_data["completed"].append(run_id)
-    progress_data["total_size_mb"] = progress_data.get("total_size_mb", 0) + total_size
+def step_archive(
+    job, base_dir, backup_root, expected_md5=None, digest=BACKUP_DIGEST, redownload_on_mismatch=False
+):
+    """磁碟 I/O 階段: 備份 SRA (同時驗證 MD5) 後清理臨時資料夾"""
+    if job.sra_path is not None and job.sra_path == archived_sra(job, backup_root):
+        # 上次已備份並驗證過，不再覆寫備份
+        echo(f"  [{job.run_id}] 步驟 3/4: 備份 SRA ⏩ 上次已完成，保留既有備份")
+        job.skipped_steps.add("archive")
+        step_cleanup(job, base_dir)
+        return True
+    ok = step_backup_sra(job, base_dir, backup_root, expected_md5, digest, redownload_on_mismatch)
+    step_cleanup(job, base_dir)
+    job.step_bytes["archive"] = job.step_bytes.get("backup", 0)
+    return ok
+
+
+def step_qc(job, executor, processes, stats_path):
+    """額外步驟 (選用): 統計 FASTQ 內容 (讀數、GC、品質)，結果追加到 fastq_stats.jsonl"""
+    run_id = job.run_id
+    # 只有 FASTQ 沿用上次的結果時，上次的 QC 統計才仍然適用
+    if "qc" in job.done_steps and "fasterq-dump" in job.skipped_steps:
+        echo(f"  [{run_id}] QC ⏩ 上次已完成")
+        job.skipped_steps.add("qc")
+        return True
 
-    # 每完成一個就保存
-    save_progress(progress_data)
+    echo(f"  [{run_id}] 額外步驟: QC {len(job.fastq_files)} 個 FASTQ...")
+    try:
+        record = fastq_stats.run_fastq_stats(run_id, job.fastq_files, executor, processes)
+    except Exception as e:
+        echo(f"  [{run_id}] ❌ QC 失敗: {e}")
+        job.fail("qc", str(e))
+        return False
+    fastq_stats.append_stats(stats_path, record)
 
+    job.step_bytes["qc"] = sum(f.stat().st_size for f in job.fastq_files)
+    job.step_info["qc"] = {
+        key: record[key] for key in ("reads", "bases", "mean_length", "gc_percent", "q30_percent")
+    }
+    echo(
+        f"  [{run_id}] ✅ QC 完成 ({record['reads']:,} reads, 平均讀長 {record['mean_length']}, "
+        f"GC {record['gc_percent']}%, Q30 {record['q30_percent']}%, {record['mb_per_s']} MB/s)"
+    )
     return True
 
 
-def save_progress(progress_data):
-    """保存進度"""
-    progress_file = Path(__file__).parent / "download_progress.json"
-    progress_data["last_update"] = datetime.now().isoformat()
+def step_compress(job, fmt, threads):
+    """額外步驟 (選用): 壓縮 FASTQ 並刪除原始檔"""
+    run_id = job.run_id
+    # 上次壓縮完成但來不及刪除的原始檔
+    for fastq in job.fastq_files:
+        leftover = superseded_raw(fastq) if is_compressed(fastq) else None
+        if leftover is not None:
+            echo(f"  [{run_id}] 🧹 刪除已有壓縮檔的殘留原始檔 {Path(leftover).name}")
+            os.remove(leftover)
+    raw_files = [f for f in job.fastq_files if not is_compressed(f)]
+    if not raw_files:
+        job.skipped_steps.add("compress")
+        return True
 
-    with open(progress_file, "w", encoding="utf-8") as f:
-        json.dump(progress_data, f, ensure_ascii=False, indent=2)
+    echo(f"  [{run_id}] 額外步驟: {fmt} 壓縮 {len(raw_files)} 個 FASTQ...")
+    step_start = time.time()
+    raw_bytes = 0
+    compressed_bytes = 0
+    files = [f for f in job.fastq_files if is_compressed(f)]
+    for fastq in raw_files:
+        try:
+            result = compress_file(fastq, fmt=fmt, threads=threads)
+        except Exception as e:
+            echo(f"  [{run_id}] ❌ 壓縮 {fastq.name} 失敗: {e}")
+            job.fail("compress", str(e))
+            return False
+        raw_bytes += result.raw_bytes
+        compressed_bytes += result.compressed_bytes
+        files.append(Path(result.dest))
+    step_time = time.time() - step_start
+
+    job.fastq_files = files
+    job.fastq_size_mb = sum(f.stat().st_size for f in files) / (1024 * 1024)
+    job.step_bytes["compress"] = raw_bytes
+    ratio = raw_bytes / compressed_bytes if compressed_bytes else 0.0
+    mb_per_s = raw_bytes / (1024 * 1024) / step_time if step_time > 0 else 0.0
+    job.step_info["compress"] = {
+        "format": fmt,
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": compressed_bytes,
+        "ratio": round(ratio, 2),
+        "mb_per_s": round(mb_per_s, 1),
+    }
+    echo(
+        f"  [{run_id}] ✅ 壓縮完成 ({raw_bytes / (1024 * 1024):.1f} → {compressed_bytes / (1024 * 1024):.1f} MB, "
+        f"壓縮比 {ratio:.1f}x, {mb_per_s:.1f} MB/s)"
+    )
+    return True
+
+
+def emit_step_metrics(metrics, job, stage, seconds, ok=True):
+    """將一個階段 (含細部步驟) 的耗時與位元組數寫入指標"""
+    if metrics is None or stage in job.skipped_steps:
+        return
+    if ok and stage in STAGE_SUBSTEPS:
+        for name in STAGE_SUBSTEPS[stage]:
+            metrics.emit(
+                job.run_id, name, job.step_times.get(name, 0.0), job.step_bytes.get(name, 0)
+            )
+        return
+    metrics.emit(
+        job.run_id,
+        stage,
+        seconds,
+        job.step_bytes.get(stage, 0),
+        ok=ok,
+        **job.step_info.get(stage, {}),
+    )
+
+
+def build_pipeline(
+    sra_bin,
+    output_dir,
+    base_dir,
+    backup_root,
+    args,
+    journal=None,
+    metrics=None,
+    expected_bytes=None,
+    expected_md5=None,
+    qc_executor=None,
+):
+    """
+    建立 prefetch → fasterq-dump (→ QC) → 備份/清理 (→ 壓縮) 流水線
+
+    串流模式 (args.stream) 只有 fasterq-dump (→ QC → 壓縮): 直接對 accession 執行，
+    不產生 .sra，也沒有備份與清理。
+    qc_executor: 指定時 (ProcessPoolExecutor) 在 fasterq-dump 之後加入 QC 階段
+    """
+    expected_bytes = expected_bytes or {}
+    expected_md5 = expected_md5 or {}
+    digest = None if args.no_verify_md5 else BACKUP_DIGEST
+
+    def on_start(job, stage):
+        progress_board.start_stage(job.run_id, stage)
+        if stage == "prefetch" and job.run_id in expected_bytes:
+            progress_board.set_expected(job.run_id, expected_bytes[job.run_id])
+
+    def on_step(job, stage, seconds):
+        emit_step_metrics(metrics, job, stage, seconds)
+        if journal is not None and stage not in job.skipped_steps:
+            journal.record_step(
+                job.run_id,
+                stage,
+                seconds,
+                job.step_bytes.get(stage, 0),
+                info=job.step_info.get(stage),
+            )
+
+    dump_stage = PipelineStage(
+        "fasterq-dump",
+        lambda job: step_fasterq_dump(job, sra_bin, output_dir, args.scratch_dir),
+        args.dump_workers,
+        args.queue_size,
+        max_workers=args.max_dump_workers if args.adaptive else None,
+    )
+    dump_stages = [dump_stage]
+    if qc_executor is not None:
+        # 在壓縮之前統計: 未壓縮的 FASTQ 可以切段平行解析
+        stats_path = base_dir / fastq_stats.STATS_NAME
+        dump_stages.append(
+            PipelineStage(
+                "qc",
+                lambda job: step_qc(job, qc_executor, args.qc_processes, stats_path),
+                args.qc_workers,
+                args.queue_size,
+            )
+        )
+    if args.stream:
+        stages = dump_stages
+    else:
+        stages = [
+            PipelineStage(
+                "prefetch",
+                lambda job: step_prefetch(job, sra_bin, base_dir, backup_root),
+                args.prefetch_workers,
+                args.queue_size,
+                max_workers=args.max_prefetch_workers if args.adaptive else None,
+            ),
+            *dump_stages,
+            PipelineStage(
+                "archive",
+                lambda job: step_archive(
+                    job,
+                    base_dir,
+                    backup_root,
+                    expected_md5.get(job.run_id),
+                    digest,
+                    args.redownload_on_md5_mismatch,
+                ),
+                args.io_workers,
+                args.queue_size,
+            ),
+        ]
+    if args.compress:
+        stages.append(
+            PipelineStage(
+                "compress",
+                lambda job: step_compress(job, args.compress, args.compress_threads),
+                args.compress_workers,
+                args.queue_size,
+            )
+        )
+    return StagedPipeline(
+        stages,
+        on_step=on_step,
+        on_start=on_start,
+        log=echo,
+    )
+
+
+def new_job(run_id, journal):
+    """建立 job，並帶入上次中斷前已完成的步驟"""
+    job = RunJob(run_id)
+    job.done_steps = journal.done_steps(run_id)
+    run = journal.get(run_id)
+    if run is not None and job.done_steps:
+        job.resume_info = dict(run.info)
+    return job
+
+
+def record_result(job, journal, metrics=None, kind=None):
+    """將完成的 job 追加到進度日誌 (失敗步驟同時寫入指標)"""
+    if job.ok:
+        journal.record_completed(job.run_id, job.fastq_size_mb)
+    else:
+        journal.record_failed(
+            job.run_id,
+            job.failed_step,
+            job.error,
+            kind=kind,
+            permanent=is_permanent(kind),
+            invalidated=job.invalidated_steps,
+        )
+        emit_step_metrics(
+            metrics, job, job.failed_step, job.step_times.get(job.failed_step, 0.0), ok=False
+        )
 
 
 def load_progress():
-    """載入進度"""
-    progress_file = Path(__file__).parent / "download_progress.json"
+    """載入進度日誌 (首次執行時自動匯入舊版 download_progress.json)"""
+    base_dir = Path(__file__).parent
+    return ProgressJournal(base_dir / JOURNAL_NAME, legacy_path=base_dir / LEGACY_NAME).load()
 
-    if progress_file.exists():
-        try:
-            with open(progress_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # 確保completed是列表
-                if "completed" in data and isinstance(data["completed"], list):
-                    # 處理舊格式（dict）轉新格式（string）
-                    data["completed"] = [
-                        item["run_id"] if isinstance(item, dict) else item
-                        for item in data["completed"]
-                    ]
-                return data
-        except:
-            pass
-
-    return {
-        "completed": [],
-        "failed": [],
-        "total_size_mb": 0,
-        "start_time": datetime.now().isoformat(),
-    }
 
+def parse_args(argv=None):
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="批量下載 SRA 並轉為 FASTQ")
+    parser.add_argument(
+        "--prefetch-workers",
+        type=int,
+        default=PREFETCH_WORKERS,
+        help=f"prefetch (網路) 並行數 (預設: {PREFETCH_WORKERS})",
+    )
+    parser.add_argument(
+        "--dump-workers",
+        type=int,
+        default=DUMP_WORKERS,
+        help=f"fasterq-dump (CPU/磁碟) 並行數 (預設: {DUMP_WORKERS})",
+    )
+    parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=IO_WORKERS,
+        help=f"備份/清理 (磁碟 I/O) 並行數 (預設: {IO_WORKERS})",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=STAGE_QUEUE_SIZE,
+        help=f"階段之間的佇列長度 (預設: {STAGE_QUEUE_SIZE})",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="依吞吐量與磁碟剩餘空間自動調整 prefetch / fasterq-dump 並行數",
+    )
+    parser.add_argument(
+        "--max-prefetch-workers",
+        type=int,
+        default=MAX_PREFETCH_WORKERS,
+        help=f"自適應模式下 prefetch 並行數上限 (預設: {MAX_PREFETCH_WORKERS})",
+    )
+    parser.add_argument(
+        "--max-dump-workers",
+        type=int,
+        default=MAX_DUMP_WORKERS,
+        help=f"自適應模式下 fasterq-dump 並行數上限 (預設: {MAX_DUMP_WORKERS})",
+    )
+    parser.add_argument(
+        "--min-free-gb",
+        type=float,
+        default=MIN_FREE_GB,
+        help=f"輸出磁碟剩餘空間低於此值時暫停送入新任務 (預設: {MIN_FREE_GB})",
+    )
+    parser.add_argument(
+        "--max-disk-wait",
+        type=float,
+        default=MAX_DISK_WAIT_MIN,
+        help=(
+            "暫停收件且流水線已無任務時最多等待的分鐘數，之後本批次剩餘任務記為磁碟空間不足 "
+            f"(預設: {MAX_DISK_WAIT_MIN})"
+        ),
+    )
+    parser.add_argument(
+        "--adapt-interval",
+        type=float,
+        default=ADAPT_INTERVAL,
+        help=f"自適應調整間隔秒數 (預設: {ADAPT_INTERVAL})",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=sorted(FORMATS),
+        default=None,
+        help="fasterq-dump 後將 FASTQ 壓縮為 gzip / zstd 並刪除原始檔 (預設: 不壓縮)",
+    )
+    parser.add_argument(
+        "--compress-workers",
+        type=int,
+        default=COMPRESS_WORKERS,
+        help=f"同時壓縮的 run 數 (預設: {COMPRESS_WORKERS})",
+    )
+    parser.add_argument(
+        "--compress-threads",
+        type=int,
+        default=COMPRESS_THREADS,
+        help=f"每個檔案的壓縮執行緒數 (預設: {COMPRESS_THREADS})",
+    )
+    parser.add_argument(
+        "--qc",
+        action="store_true",
+        help="fasterq-dump 後統計 FASTQ 讀數、讀長、GC 與品質 (需要 numpy)，結果寫入 fastq_stats.jsonl",
+    )
+    parser.add_argument(
+        "--qc-workers",
+        type=int,
+        default=QC_WORKERS,
+        help=f"同時 QC 的 run 數 (預設: {QC_WORKERS})",
+    )
+    parser.add_argument(
+        "--qc-processes",
+        type=int,
+        default=QC_PROCESSES,
+        help=f"QC 解析 FASTQ 的行程數 (預設: {QC_PROCESSES})",
+    )
+    parser.add_argument(
+        "--prom-textfile",
+        type=Path,
+        default=None,
+        help="另外輸出 Prometheus textfile 指標到此路徑 (例如 node_exporter 的 textfile 目錄)",
+    )
+    parser.add_argument(
+        "--summary",
+        action="store_true",
+        help=f"只顯示 {METRICS_NAME} 中各階段 p50/p95 耗時與 MB/s，不下載",
+    )
+    parser.add_argument(
+        "--retry-base-delay",
+        type=float,
+        default=BASE_DELAY,
+        help=f"暫時性失敗第一次重試前的等待秒數，之後指數遞增 (預設: {BASE_DELAY})",
+    )
+    parser.add_argument(
+        "--retry-permanent",
+        action="store_true",
+        help="重新嘗試先前判定為永久失敗 (例如 accession 不存在) 的樣本",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="串流模式: 不執行 prefetch，fasterq-dump 直接讀取 accession，不產生也不備份 .sra",
+    )
+    parser.add_argument(
+        "--scratch-dir",
+        type=Path,
+        default=None,
+        help="fasterq-dump 暫存目錄 (-t)，建議放在本機 SSD (預設: 目前目錄)",
+    )
+    parser.add_argument(
+        "--no-verify-md5",
+        action="store_true",
+        help="備份 .sra 時不計算 / 比對 MD5 (同一磁碟搬移或 reflink 時可省下一次完整讀取)",
+    )
+    parser.add_argument(
+        "--redownload-on-md5-mismatch",
+        action="store_true",
+        help="MD5 與 NCBI 不符時刪除 .sra 與 FASTQ 並重新下載 (最多重試 1 次；預設保留並記錄為未驗證)",
+    )
+    parser.add_argument(
+        "--order",
+        choices=ORDERS,
+        default=JOB_ORDER,
+        help=(
+            "任務順序: file=runs.txt 順序 / shortest=由小到大 / "
+            f"mixed=小 run 優先並穿插大 run (預設: {JOB_ORDER})"
+        ),
+    )
+    parser.add_argument(
+        "--max-inflight-gb",
+        type=float,
+        default=MAX_INFLIGHT_GB,
+        help=(
+            "流水線中同時處理的預期 .sra 大小總和上限，超過時暫停送入新任務；"
+            f"FASTQ 通常是 .sra 的數倍大 (預設: {MAX_INFLIGHT_GB}，0 表示不限制)"
+        ),
+    )
+    parser.add_argument(
+        "--no-metadata",
+        action="store_true",
+        help=f"不向 NCBI 查詢預期大小 (只使用 {METADATA_NAME} 快取)；ETA 改以平均秒數估計",
+    )
+    return parser.parse_args(argv)
+
+
+def format_eta(estimated_seconds):
+    """格式化預估剩餘時間"""
+    hours = int(estimated_seconds // 3600)
+    minutes = int((estimated_seconds % 3600) // 60)
+    seconds = int(estimated_seconds % 60)
+
+    if hours > 0:
+        return f"{hours}小時{minutes}分鐘{seconds}秒"
+    elif minutes > 0:
+        return f"{minutes}分鐘{seconds}秒"
+    return f"{seconds}秒"
 
-def main():
+
+def main(argv=None):
     """主程序"""
-    global interrupt_flag
-    
+    args = parse_args(argv)
+
+    if args.summary:
+        print_summary(Path(__file__).parent / METRICS_NAME)
+        return
+
     # 註冊信號處理器
     signal.signal(signal.SIGINT, signal_handler)
-    
-    # 設定並行下載數量
-    MAX_WORKERS = 10
 
     # 設定環境變數，避免OneDrive同步鎖定問題
     os.environ["NCBI_HOME"] = "D:\\ncbi"
@@ -296,20 +782,36 @@ def main():
         print(f"❌ runs.txt 不存在: {runs_file}")
         return
 
+    if args.qc and fastq_stats is None:
+        print("❌ --qc 需要 numpy: pip install numpy")
+        return
+
     # 創建輸出目錄
     output_dir.mkdir(parents=True, exist_ok=True)
+    if args.scratch_dir is not None:
+        args.scratch_dir.mkdir(parents=True, exist_ok=True)
 
-    # 讀取任務列表
+    # 讀取任務列表 (去除重複，保留順序)
     with open(runs_file, "r") as f:
-        all_runs = [line.strip() for line in f if line.strip()]
+        all_runs = list(dict.fromkeys(line.strip() for line in f if line.strip()))
 
-    # 載入進度
-    progress_data = load_progress()
+    # 載入進度 (單次讀取建立 run 狀態索引，之後的查詢都是 O(1))
+    journal = load_progress()
+
+    # 過濾出需要處理的任務
+    unfinished = [run_id for run_id in all_runs if not journal.is_completed(run_id)]
+    if args.retry_permanent:
+        pending_runs = unfinished
+    else:
+        pending_runs = [
+            run_id for run_id in unfinished if not journal.is_permanent_failure(run_id)
+        ]
 
-    completed = len(progress_data.get("completed", []))
-    failed = len(progress_data.get("failed", []))
     total = len(all_runs)
-    remaining = total - completed
+    completed = total - len(unfinished)
+    failed = sum(1 for run_id in unfinished if run_id in journal.failed)
+    skipped = len(unfinished) - len(pending_runs)
+    remaining = len(pending_runs)
 
     print(f"\n{'='*60}")
     print(f"🚀 FASTQ 批量下載器")
@@ -317,8 +819,20 @@ def main():
     print(f"  總任務: {total}")
     print(f"  已完成: {completed} ({completed/total*100:.1f}%)")
     print(f"  失敗: {failed}")
+    if skipped:
+        print(f"  永久失敗 (跳過): {skipped}")
     print(f"  剩餘: {remaining}")
-    print(f"  並行數: {MAX_WORKERS}")
+    if args.stream:
+        print(f"  模式: 串流 (不保留 .sra)，fasterq-dump 並行數 {args.dump_workers}")
+    else:
+        print(
+            f"  並行數: prefetch {args.prefetch_workers} / fasterq-dump {args.dump_workers} / I/O {args.io_workers}"
+        )
+    if args.adaptive:
+        print(
+            f"  自適應: 上限 prefetch {args.max_prefetch_workers} / fasterq-dump {args.max_dump_workers}，"
+            f"剩餘空間 < {args.min_free_gb:.0f} GB 時暫停"
+        )
     print(f"  輸出: {output_dir}")
     print(f"{'='*60}\n")
 
@@ -326,101 +840,158 @@ def main():
         print("🎉 所有任務已完成！")
         return
 
+    # 預期大小: 用於每個 run 的下載百分比與以位元組加權的 ETA
+    metadata = load_run_metadata(
+        pending_runs, base_dir / METADATA_NAME, fetch=not args.no_metadata
+    )
+    expected_bytes = {run_id: meta["sra_bytes"] for run_id, meta in metadata.items()}
+    expected_md5 = {
+        run_id: meta["sra_md5"] for run_id, meta in metadata.items() if meta.get("sra_md5")
+    }
+    byte_eta = ByteEta(pending_runs, expected_bytes)
+
+    # 依預期大小排序 (上次中斷前已有進度的 run 優先)
+    pending_runs = order_runs(
+        pending_runs,
+        expected_bytes,
+        args.order,
+        resumed=[run_id for run_id in pending_runs if journal.done_steps(run_id)],
+    )
+    budget = None
+    if args.max_inflight_gb > 0:
+        budget = DiskBudget(
+            fill_unknown_sizes(pending_runs, expected_bytes), args.max_inflight_gb * 1024 ** 3
+        )
+    print(
+        f"📋 排序: {args.order}，已知大小 {len(expected_bytes)}/{len(pending_runs)} 個"
+        + (f"，流水線中上限 {args.max_inflight_gb:.0f} GB" if budget else "")
+    )
+
     # 開始下載
     success_count = 0
     fail_count = 0
     batch_start_time = time.time()
     processed_in_batch = 0
-    lock = threading.Lock()
 
-    # 過濾出需要處理的任務
-    pending_runs = [
-        run_id
-        for run_id in all_runs
-        if run_id not in progress_data.get("completed", [])
-    ]
-
-    # 使用並行下載
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # 提交所有任務
-        future_to_run = {
-            executor.submit(
-                download_fastq, run_id, sra_bin, output_dir, progress_data, base_dir
-            ): run_id
-            for run_id in pending_runs
-        }
-
-        for future in as_completed(future_to_run):
-            # 檢查中斷標誌
-            if interrupt_flag:
-                print("\n⏸️  停止接收新結果...")
-                break
-                
-            run_id = future_to_run[future]
-            try:
-                success = future.result()
-
-                with lock:
-                    if success:
-                        success_count += 1
-                        processed_in_batch += 1
-                    else:
-                        fail_count += 1
-
-                    # 計算預估剩餘時間
-                    if processed_in_batch > 0:
-                        elapsed_time = time.time() - batch_start_time
-                        avg_time_per_item = elapsed_time / processed_in_batch
-                        remaining_items = len(pending_runs) - processed_in_batch
-                        estimated_seconds = avg_time_per_item * remaining_items
-
-                        hours = int(estimated_seconds // 3600)
-                        minutes = int((estimated_seconds % 3600) // 60)
-                        seconds = int(estimated_seconds % 60)
-
-                        if hours > 0:
-                            eta_str = f"{hours}小時{minutes}分鐘{seconds}秒"
-                        elif minutes > 0:
-                            eta_str = f"{minutes}分鐘{seconds}秒"
-                        else:
-                            eta_str = f"{seconds}秒"
-
-                        print(
-                            f"\n[{processed_in_batch}/{len(pending_runs)}] 進度: {processed_in_batch/len(pending_runs)*100:.1f}% | ⏱️  預估剩餘: {eta_str}"
-                        )
-
-                    # 每10個顯示統計
-                    if processed_in_batch % 10 == 0:
-                        current_completed = len(progress_data.get("completed", []))
-                        current_failed = len(progress_data.get("failed", []))
-                        total_size = progress_data.get("total_size_mb", 0)
-
-                        elapsed_time = time.time() - batch_start_time
-                        avg_time = (
-                            elapsed_time / processed_in_batch
-                            if processed_in_batch > 0
-                            else 0
-                        )
-
-                        print(f"\n{'='*60}")
-                        print(f"📊 中期報告 [{processed_in_batch}/{total}]")
-                        print(f"  成功: {current_completed}")
-                        print(f"  失敗: {current_failed}")
-                        print(
-                            f"  總大小: {total_size:.1f} MB ({total_size/1024:.2f} GB)"
-                        )
-                        print(f"  平均處理時間: {avg_time:.1f} 秒/個")
-                        print(f"{'='*60}\n")
-
-            except Exception as e:
-                with lock:
-                    fail_count += 1
-                    print(f"\n❌ 處理 {run_id} 時發生錯誤: {e}")
+    # 建立流水線: 各階段由獨立執行緒池處理，結果統一回到主執行緒寫入進度
+    metrics = MetricsSink(base_dir / METRICS_NAME, prom_path=args.prom_textfile)
+    qc_executor = None
+    if args.qc:
+        qc_executor = ProcessPoolExecutor(
+            max_workers=max(1, args.qc_processes), initializer=fastq_stats.worker_init
+        )
+    pipeline = build_pipeline(
+        sra_bin,
+        output_dir,
+        base_dir,
+        SRA_BACKUP_ROOT,
+        args,
+        journal=journal,
+        metrics=metrics,
+        expected_bytes=expected_bytes,
+        expected_md5=expected_md5,
+        qc_executor=qc_executor,
+    )
+    pipeline.start()
+    progress_board.start()
+    probe = TransferProbe(progress_board, base_dir).start()
+    controller = None
+    if args.adaptive:
+        controller = AdaptiveController(
+            pipeline,
+            output_dir,
+            min_free_gb=args.min_free_gb,
+            stage_names=("fasterq-dump",) if args.stream else ("prefetch", "fasterq-dump"),
+            interval=args.adapt_interval,
+            max_idle_wait=args.max_disk_wait * 60,
+            log=echo,
+        ).start()
+    # 暫時性失敗會在同一批次內退避後重新送入流水線
+    scheduler = RetryScheduler(
+        pending_runs,
+        lambda run_id: new_job(run_id, journal),
+        base_delay=args.retry_base_delay,
+    )
+    jobs = scheduler.jobs(should_stop=lambda: interrupt_flag)
+    if budget is not None:
+        jobs = budget.admit(jobs, should_stop=lambda: interrupt_flag)
+    pipeline.feed(jobs, should_stop=lambda: interrupt_flag)
+
+    for job in pipeline.iter_results():
+        progress_board.finish(job.run_id)
+        if budget is not None:
+            budget.release(job.run_id)
+        decision, kind, delay = scheduler.handle_result(job)
+        record_result(job, journal, metrics, kind=kind)
+
+        if decision == RetryScheduler.RETRY:
+            echo(
+                f"\n🔁 {job.run_id} 失敗於 {job.failed_step} ({kind})，"
+                f"{delay:.0f} 秒後重試 (第 {scheduler.attempts[job.run_id] + 1} 次)"
+            )
+            continue
+
+        processed_in_batch += 1
+        byte_eta.finish(job.run_id)
+        if job.ok:
+            success_count += 1
+            echo(f"\n✅ {job.run_id} 完成 (⏱️  {job.elapsed:.1f} 秒)")
+        else:
+            fail_count += 1
+            note = "永久失敗，之後跳過" if is_permanent(kind) else "本批次不再重試"
+            echo(f"\n❌ {job.run_id} 失敗於 {job.failed_step} ({kind}，{note})")
+
+        # 計算預估剩餘時間 (有預期大小時以位元組加權，否則以平均秒數)
+        elapsed_time = time.time() - batch_start_time
+        avg_time_per_item = elapsed_time / processed_in_batch
+        remaining_items = len(pending_runs) - processed_in_batch
+        eta_seconds, byte_rate = byte_eta.estimate(progress_board.in_flight_bytes("prefetch"))
+        if eta_seconds is None:
+            eta_seconds = avg_time_per_item * remaining_items
+        eta_str = format_eta(eta_seconds)
+        if byte_rate:
+            eta_str += f" ({byte_eta.remaining_total / 1024 ** 3:.1f} GB 待下載，{byte_rate / 1024 ** 2:.1f} MB/s)"
+
+        echo(
+            f"[{processed_in_batch}/{len(pending_runs)}] 進度: {processed_in_batch/len(pending_runs)*100:.1f}% | ⏱️  預估剩餘: {eta_str}"
+        )
+
+        # 每10個顯示統計
+        if processed_in_batch % 10 == 0:
+            current_completed = len(journal.completed)
+            current_failed = len(journal.failed)
+            total_size = journal.total_size_mb
+
+            echo(
+                f"\n{'='*60}\n"
+                f"📊 中期報告 [{processed_in_batch}/{total}]\n"
+                f"  成功: {current_completed}\n"
+                f"  失敗: {current_failed}\n"
+                f"  總大小: {total_size:.1f} MB ({total_size/1024:.2f} GB)\n"
+                f"  平均處理時間: {avg_time_per_item:.1f} 秒/個\n"
+                f"{format_stage_stats(pipeline.stats())}\n"
+                f"{'='*60}\n"
+            )
+
+    probe.stop()
+    progress_board.stop()
+    if controller is not None:
+        controller.stop()
+    if qc_executor is not None:
+        qc_executor.shutdown()
+
+    if interrupt_flag:
+        print("\n⏸️  已停止接收新任務，進行中的任務已完成")
+        if pipeline.skipped:
+            print(f"   跳過 {len(pipeline.skipped)} 個已排入佇列的任務 (下次執行從斷點繼續)")
 
     # 最終報告
-    final_completed = len(progress_data.get("completed", []))
-    final_failed = len(progress_data.get("failed", []))
-    final_size = progress_data.get("total_size_mb", 0)
+    journal.close()
+    metrics.close()
+
+    final_completed = len(journal.completed)
+    final_failed = len(journal.failed)
+    final_size = journal.total_size_mb
 
     print(f"\n{'='*60}")
     print(f"🎉 下載完成！")
@@ -429,12 +1000,16 @@ def main():
     print(f"  成功: {final_completed} ({final_completed/total*100:.1f}%)")
     print(f"  失敗: {final_failed} ({final_failed/total*100:.1f}%)")
     print(f"  總大小: {final_size:.1f} MB ({final_size/1024:.2f} GB)")
-    print(f"{'='*60}\n")
+    print(f"  本批: 成功 {success_count} / 失敗 {fail_count}")
+    print(f"{'='*60}")
+    print("📊 各階段吞吐量:")
+    print(format_stage_stats(pipeline.stats()))
+    print()
 
     if final_failed > 0:
         print("❌ 失敗的任務:")
-        for item in progress_data.get("failed", [])[-10:]:
-            print(f"  - {item.get('run_id')}: {item.get('step')}")
+        for item in list(journal.failed.values())[-10:]:
+            print(f"  - {item.get('run_id')}: {item.get('step')} ({item.get('kind') or '未分類'})")
 
 
 if __name__ == "__main__":
@@ -443,7 +1018,7 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         interrupt_flag = True
         print("\n\n⚠️  下載被用戶中斷")
-        print("💾 進度已保存到 download_progress.json")
+        print(f"💾 進度已保存到 {JOURNAL_NAME}")
         print("🔄 下次執行將從斷點繼續")
     except Exception as e:
         print(f"\n❌ 發生錯誤: {e}")
@@ -4,22 +4,38 @@
 Check SRA files integrity
 """
 
+import argparse
+import os
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import json
 from datetime import datetime
 
+from progress_journal import JOURNAL_NAME, ProgressJournal
+
+DEFAULT_BASE_DIR = Path("D:/OneDrive/學校上課/課程/四上/科學大數據專題/data_collector")
+CACHE_NAME = "sra_integrity_cache.jsonl"
+# 同時檢查的檔案數 (vdb-validate 以 CPU 與磁碟讀取為主)
+CHECK_WORKERS = max(1, min(8, (os.cpu_count() or 2) // 2))
+# 每檢查幾個檔案更新一次報告
+REPORT_EVERY = 20
+
 
 def check_sra_file(sra_file, sra_bin):
-    """檢查單個 SRA 檔案的完整性"""
+    """
+    檢查單個 SRA 檔案的完整性
+
+    回傳 (True/False, 訊息) 表示 vdb-validate 的判定；工具不存在、無法執行或逾時
+    等與檔案內容無關的情況回傳 (None, 訊息)，不寫入快取。
+    """
     vdb_validate = sra_bin / "vdb-validate.exe"
-    
+
     if not vdb_validate.exists():
-        # 如果沒有 vdb-validate，使用 sra-stat 作為替代
-        sra_stat = sra_bin / "sra-stat.exe"
-        if not sra_stat.exists():
-            return None, "檢查工具不存在"
-    
+        # sra-stat 只能取得資訊，無法判定完整性
+        return None, "檢查工具不存在 (vdb-validate)"
+
     try:
         # 使用 vdb-validate 檢查檔案完整性
         result = subprocess.run(
@@ -38,9 +54,9 @@ def check_sra_file(sra_file, sra_bin):
             return False, result.stderr[:200]
             
     except subprocess.TimeoutExpired:
-        return False, "檢查超時"
-    except Exception as e:
-        return False, str(e)
+        return None, "檢查超時"
+    except OSError as e:
+        return None, f"無法執行 vdb-validate: {e}"
 
 
 def get_sra_info(sra_file, sra_bin):
@@ -70,85 +86,220 @@ def get_sra_info(sra_file, sra_bin):
         return f"錯誤: {str(e)}"
 
 
-def check_all_sra_files():
-    """檢查所有 SRA 檔案"""
-    base_dir = Path("D:/OneDrive/學校上課/課程/四上/科學大數據專題/data_collector")
-    sra_bin = base_dir / "sratoolkit.3.2.1-win64" / "bin"
-    
+def load_cache(cache_file):
+    """讀取檢查快取 {路徑: 最後一筆結果}"""
+    cache = {}
+    if not cache_file.exists():
+        return cache
+    with open(cache_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 中斷時寫到一半的最後一行
+            cache[entry["file"]] = entry
+    return cache
+
+
+def cache_hit(entry, stat):
+    """快取的結果是否仍適用 (路徑、大小、修改時間都相同)"""
+    return (
+        entry is not None
+        and entry.get("size") == stat.st_size
+        and entry.get("mtime_ns") == stat.st_mtime_ns
+        and entry.get("status") in ("valid", "invalid")
+    )
+
+
+def load_verified_digests(journal_file):
+    """
+    從下載器的進度日誌讀取備份時已驗證 MD5 的檔案 {路徑: archive 步驟資訊}
+
+    只讀取，不影響執行中的下載器。
+    """
+    if not journal_file.exists():
+        return {}
+    journal = ProgressJournal(journal_file).load(read_only=True)
+    verified = {}
+    for run in journal.runs.values():
+        info = run.info.get("archive") or {}
+        if info.get("md5_verified") and info.get("path"):
+            verified[info["path"]] = info
+    return verified
+
+
+def default_journal(base_dir):
+    """掃描目錄下的下載日誌；沒有時 (例如掃描備份目錄) 使用下載器所在目錄的日誌"""
+    journal_file = Path(base_dir) / JOURNAL_NAME
+    if journal_file.exists():
+        return journal_file
+    return Path(__file__).parent / JOURNAL_NAME
+
+
+def digest_entry(sra_file, stat, info):
+    """以備份時驗證過的 MD5 作為檢查結果 (檔案之後未被修改才適用)"""
+    if info.get("size") != stat.st_size or info.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return {
+        "sample_id": sra_file.parent.name,
+        "file": str(sra_file),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "size_mb": stat.st_size / (1024 * 1024),
+        "status": "valid",
+        "info": f"md5 {info['md5']}",
+        "message": "MD5 與 NCBI 相符 (備份時驗證)",
+        "seconds": 0.0,
+        "checked": datetime.now().isoformat(),
+    }
+
+
+def validate_one(sra_file, sra_bin):
+    """在 worker 執行緒中檢查一個檔案: sra-stat 取得資訊後以 vdb-validate 驗證"""
+    stat = sra_file.stat()
+    start = time.time()
+    info = get_sra_info(sra_file, sra_bin)
+    is_valid, message = check_sra_file(sra_file, sra_bin)
+
+    if is_valid is True:
+        status = "valid"
+    elif is_valid is False:
+        status = "invalid"
+    else:
+        # 工具不存在、逾時等與檔案內容無關的結果不寫入快取，下次重新檢查
+        status = "unknown"
+    return {
+        "sample_id": sra_file.parent.name,
+        "file": str(sra_file),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "size_mb": stat.st_size / (1024 * 1024),
+        "status": status,
+        "info": info,
+        "message": message,
+        "seconds": round(time.time() - start, 1),
+        "checked": datetime.now().isoformat(),
+    }
+
+
+def build_report(entries, check_time):
+    """依檢查結果組成 sra_integrity_report.json 的內容"""
+    results = {
+        "valid": [],
+        "invalid": [],
+        "unknown": [],
+        "total_size_mb": 0,
+        "check_time": check_time,
+    }
+    for entry in entries:
+        results["total_size_mb"] += entry["size_mb"]
+        item = {
+            "sample_id": entry["sample_id"],
+            "file": entry["file"],
+            "size_mb": entry["size_mb"],
+        }
+        if entry["status"] == "valid":
+            item["info"] = entry["info"]
+        elif entry["status"] == "invalid":
+            item["error"] = entry["message"]
+        else:
+            item["note"] = entry["message"]
+        results[entry["status"]].append(item)
+    return results
+
+
+def save_report(report_file, results):
+    """原子寫入報告 (寫入暫存檔後取代)，中斷時不會留下半份報告"""
+    tmp = report_file.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, report_file)
+
+
+def check_all_sra_files(
+    base_dir=None, workers=CHECK_WORKERS, use_cache=True, sra_bin=None, journal_file=None
+):
+    """
+    檢查所有 SRA 檔案
+
+    以 workers 個執行緒同時檢查 (每個檔案的 sra-stat / vdb-validate 是獨立子行程)。
+    每個結果立即追加到 sra_integrity_cache.jsonl，路徑、大小與修改時間
+    都沒變的檔案下次直接沿用；報告每 REPORT_EVERY 個檔案更新一次。
+    下載器備份時已比對 NCBI MD5 且之後未被修改的檔案也不再重新讀取；
+    journal_file 為下載器的進度日誌 (預設: 掃描目錄下的 download_progress.jsonl，
+    不存在時使用本程式所在目錄的日誌，即下載器寫入的位置)。
+    """
+    base_dir = Path(base_dir) if base_dir else DEFAULT_BASE_DIR
+    sra_bin = Path(sra_bin) if sra_bin else DEFAULT_BASE_DIR / "sratoolkit.3.2.1-win64" / "bin"
+    report_file = base_dir / "sra_integrity_report.json"
+    cache_file = base_dir / CACHE_NAME
+
     print(f"\n{'='*80}")
     print(f"🔍 SRA 檔案完整性檢查")
     print(f"{'='*80}")
     print(f"📁 掃描目錄: {base_dir}")
     print(f"🛠️  SRA Toolkit: {sra_bin}")
+    print(f"🧵 並行數: {workers}")
     print(f"{'='*80}\n")
     
     # 找出所有 SRA 檔案
-    sra_files = list(base_dir.glob("*/SRR*.sra"))
+    sra_files = sorted(base_dir.glob("*/SRR*.sra"))
     
     if not sra_files:
         print("❌ 找不到任何 SRA 檔案")
         return
     
-    print(f"📊 找到 {len(sra_files)} 個 SRA 檔案\n")
-    
-    results = {
-        "valid": [],
-        "invalid": [],
-        "unknown": [],
-        "total_size_mb": 0,
-        "check_time": datetime.now().isoformat()
-    }
-    
-    # 檢查每個檔案
-    for i, sra_file in enumerate(sra_files, 1):
-        sample_id = sra_file.parent.name
-        file_size = sra_file.stat().st_size / (1024 * 1024)  # MB
-        results["total_size_mb"] += file_size
-        
-        print(f"[{i}/{len(sra_files)}] 檢查: {sample_id}")
-        print(f"  📁 檔案: {sra_file.name}")
-        print(f"  💾 大小: {file_size:.1f} MB")
-        
-        # 快速檢查: 使用 sra-stat 獲取資訊
-        print(f"  🔍 快速檢查...", end="", flush=True)
-        info = get_sra_info(sra_file, sra_bin)
-        print(f" {info}")
-        
-        # 完整性驗證
-        print(f"  ✓ 完整性驗證...", end="", flush=True)
-        is_valid, message = check_sra_file(sra_file, sra_bin)
-        
-        if is_valid is True:
-            print(f" ✅ {message}")
-            results["valid"].append({
-                "sample_id": sample_id,
-                "file": str(sra_file),
-                "size_mb": file_size,
-                "info": info
-            })
-        elif is_valid is False:
-            print(f" ❌ {message}")
-            results["invalid"].append({
-                "sample_id": sample_id,
-                "file": str(sra_file),
-                "size_mb": file_size,
-                "error": message
-            })
+    print(f"📊 找到 {len(sra_files)} 個 SRA 檔案")
+
+    # 沿用快取中仍有效的結果，以及備份時已驗證 MD5 的檔案
+    cache = load_cache(cache_file) if use_cache else {}
+    journal_file = Path(journal_file) if journal_file else default_journal(base_dir)
+    if use_cache:
+        print(f"📒 下載日誌: {journal_file}{'' if journal_file.exists() else ' (不存在)'}")
+    digests = load_verified_digests(journal_file) if use_cache else {}
+    entries = []
+    todo = []
+    trusted = 0
+    for sra_file in sra_files:
+        stat = sra_file.stat()
+        entry = cache.get(str(sra_file))
+        if cache_hit(entry, stat):
+            entries.append(entry)
+            continue
+        info = digests.get(str(sra_file))
+        entry = digest_entry(sra_file, stat, info) if info else None
+        if entry is not None:
+            entries.append(entry)
+            trusted += 1
         else:
-            print(f" ⚠️  {message}")
-            results["unknown"].append({
-                "sample_id": sample_id,
-                "file": str(sra_file),
-                "size_mb": file_size,
-                "note": message
-            })
-        
-        print()
-    
-    # 保存結果
-    report_file = base_dir / "sra_integrity_report.json"
-    with open(report_file, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+            todo.append(sra_file)
+    print(
+        f"♻️  快取沿用: {len(entries) - trusted} 個，MD5 已驗證: {trusted} 個，"
+        f"需要檢查: {len(todo)} 個\n"
+    )
+
+    check_time = datetime.now().isoformat()
+    with open(cache_file, "a", encoding="utf-8") as cache_out, ThreadPoolExecutor(
+        max_workers=max(1, workers)
+    ) as pool:
+        futures = [pool.submit(validate_one, sra_file, sra_bin) for sra_file in todo]
+        for i, future in enumerate(as_completed(futures), 1):
+            entry = future.result()
+            entries.append(entry)
+            if entry["status"] != "unknown":
+                cache_out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                cache_out.flush()
+
+            icon = {"valid": "✅", "invalid": "❌"}.get(entry["status"], "⚠️ ")
+            print(
+                f"[{i}/{len(todo)}] {icon} {entry['sample_id']} "
+                f"({entry['size_mb']:.1f} MB, {entry['seconds']:.0f}秒) {entry['info']} | {entry['message']}"
+            )
+            if i % REPORT_EVERY == 0:
+                save_report(report_file, build_report(entries, check_time))
+
+    results = build_report(entries, check_time)
+    save_report(report_file, results)
     
     # 顯示摘要
     print(f"\n{'='*80}")
@@ -172,9 +323,9 @@ def check_all_sra_files():
     return results
 
 
-def quick_check_all_sra_files():
+def quick_check_all_sra_files(base_dir=None):
     """快速檢查所有 SRA 檔案 (只檢查檔案大小和可讀性)"""
-    base_dir = Path("D:/OneDrive/學校上課/課程/四上/科學大數據專題/data_collector")
+    base_dir = Path(base_dir) if base_dir else DEFAULT_BASE_DIR
     
     print(f"\n{'='*80}")
     print(f"⚡ SRA 檔案快速檢查 (檔案大小檢查)")
@@ -237,6 +388,41 @@ def quick_check_all_sra_files():
     return results
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="檢查 SRA 檔案完整性")
+    parser.add_argument("--quick", action="store_true", help="只檢查檔案大小 (不執行 vdb-validate)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=CHECK_WORKERS,
+        help=f"同時檢查的檔案數 (預設: {CHECK_WORKERS})",
+    )
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=None,
+        help="掃描目錄 (預設: data_collector；備份目錄例如 E:/sra_files)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=None,
+        help=f"下載器的進度日誌，用來沿用備份時的 MD5 驗證結果 (預設: 掃描目錄或本程式目錄下的 {JOURNAL_NAME})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"忽略 {CACHE_NAME} 與備份時的 MD5 驗證結果，全部重新檢查",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    # 直接執行完整檢查
-    check_all_sra_files()
+    args = parse_args()
+    if args.quick:
+        quick_check_all_sra_files(args.root)
+    else:
+        # 完整檢查
+        check_all_sra_files(
+            args.root, workers=args.workers, use_cache=not args.no_cache, journal_file=args.journal
+        )
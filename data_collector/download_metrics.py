@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+下載流程的結構化計時資料
+Structured per-step telemetry for batch_fastq_downloader
+
+每個步驟 (prefetch / fasterq-dump / backup / cleanup / compress) 結束時
+追加一行 JSON 到 download_metrics.jsonl；可選擇同時輸出 Prometheus
+textfile (供 node_exporter textfile collector 讀取)。
+
+統計整個歷史紀錄:
+    python download_metrics.py summary
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+METRICS_NAME = "download_metrics.jsonl"
+PROM_WRITE_INTERVAL = 10  # Prometheus textfile 最短重寫間隔 (秒)
+
+
+class MetricsSink:
+    """執行緒安全的指標輸出 (JSONL + 選用的 Prometheus textfile)"""
+
+    def __init__(self, path, prom_path=None):
+        self.path = Path(path)
+        self.prom_path = Path(prom_path) if prom_path else None
+        self._totals = {}  # stage -> {"ok": n, "failed": n, "seconds": s, "bytes": b}
+        self._last_prom_write = 0.0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def emit(self, run_id, stage, seconds, nbytes=0, ok=True, **extra):
+        """記錄一個步驟的耗時與位元組數"""
+        event = {
+            "time": datetime.now().isoformat(),
+            "run_id": run_id,
+            "stage": stage,
+            "seconds": round(seconds, 3),
+            "bytes": nbytes,
+            "ok": ok,
+        }
+        event.update(extra)
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+            totals = self._totals.setdefault(
+                stage, {"ok": 0, "failed": 0, "seconds": 0.0, "bytes": 0}
+            )
+            totals["ok" if ok else "failed"] += 1
+            totals["seconds"] += seconds
+            totals["bytes"] += nbytes
+
+            if self.prom_path and time.time() - self._last_prom_write >= PROM_WRITE_INTERVAL:
+                self._write_prom()
+
+    def close(self):
+        with self._lock:
+            if self.prom_path:
+                self._write_prom()
+
+    def _write_prom(self):
+        lines = [
+            "# HELP sra_stage_runs_total Finished steps per stage and result.",
+            "# TYPE sra_stage_runs_total counter",
+        ]
+        for stage, t in sorted(self._totals.items()):
+            lines.append(f'sra_stage_runs_total{{stage="{stage}",result="ok"}} {t["ok"]}')
+            lines.append(f'sra_stage_runs_total{{stage="{stage}",result="failed"}} {t["failed"]}')
+        lines += [
+            "# HELP sra_stage_seconds_total Wall-clock seconds spent per stage.",
+            "# TYPE sra_stage_seconds_total counter",
+        ]
+        for stage, t in sorted(self._totals.items()):
+            lines.append(f'sra_stage_seconds_total{{stage="{stage}"}} {t["seconds"]:.3f}')
+        lines += [
+            "# HELP sra_stage_bytes_total Bytes handled per stage.",
+            "# TYPE sra_stage_bytes_total counter",
+        ]
+        for stage, t in sorted(self._totals.items()):
+            lines.append(f'sra_stage_bytes_total{{stage="{stage}"}} {t["bytes"]}')
+
+        # 寫入暫存檔後原子替換，避免 collector 讀到一半的檔案
+        tmp = self.prom_path.with_suffix(self.prom_path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, self.prom_path)
+        self._last_prom_write = time.time()
+
+
+def percentile(sorted_values, q):
+    """線性內插百分位數 (sorted_values 需已排序)"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def summarize(path):
+    """單次讀取指標檔，計算各階段 p50/p95 耗時與 MB/s"""
+    stages = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            s = stages.setdefault(
+                event["stage"],
+                {"durations": [], "rates": [], "failed": 0, "seconds": 0.0, "bytes": 0},
+            )
+            if not event.get("ok", True):
+                s["failed"] += 1
+                continue
+            seconds = event.get("seconds", 0.0)
+            nbytes = event.get("bytes", 0)
+            s["durations"].append(seconds)
+            s["seconds"] += seconds
+            s["bytes"] += nbytes
+            if nbytes and seconds > 0:
+                s["rates"].append(nbytes / (1024 * 1024) / seconds)
+
+    summary = []
+    for stage, s in stages.items():
+        durations = sorted(s["durations"])
+        rates = sorted(s["rates"])
+        summary.append(
+            {
+                "stage": stage,
+                "runs": len(durations),
+                "failed": s["failed"],
+                "p50_seconds": percentile(durations, 0.50),
+                "p95_seconds": percentile(durations, 0.95),
+                "p50_mb_per_s": percentile(rates, 0.50),
+                "p95_mb_per_s": percentile(rates, 0.95),
+                "mb_per_s": s["bytes"] / (1024 * 1024) / s["seconds"] if s["seconds"] > 0 else 0.0,
+                "total_hours": s["seconds"] / 3600,
+            }
+        )
+    summary.sort(key=lambda item: item["total_hours"], reverse=True)
+    return summary
+
+
+def print_summary(path):
+    path = Path(path)
+    if not path.exists():
+        print(f"❌ 找不到指標檔: {path}")
+        return None
+
+    summary = summarize(path)
+    print(f"\n{'='*88}")
+    print(f"📊 各階段耗時統計 ({path.name})")
+    print(f"{'='*88}")
+    print(
+        f"  {'階段':<14}{'次數':>6}{'失敗':>6}{'p50秒':>10}{'p95秒':>10}"
+        f"{'p50 MB/s':>10}{'p95 MB/s':>10}{'整體MB/s':>10}{'總時數':>8}"
+    )
+    for s in summary:
+        print(
+            f"  {s['stage']:<14}{s['runs']:>6}{s['failed']:>6}{s['p50_seconds']:>10.1f}{s['p95_seconds']:>10.1f}"
+            f"{s['p50_mb_per_s']:>10.2f}{s['p95_mb_per_s']:>10.2f}{s['mb_per_s']:>10.2f}{s['total_hours']:>8.1f}"
+        )
+    if summary:
+        print(f"\n  ⚠️  最耗時階段 (瓶頸): {summary[0]['stage']}")
+    print(f"{'='*88}\n")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="下載流程計時指標工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="統計各階段 p50/p95 耗時與 MB/s")
+    summary_parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=Path(__file__).parent / METRICS_NAME,
+        help=f"指標檔路徑 (預設: {METRICS_NAME})",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        print_summary(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
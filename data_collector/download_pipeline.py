@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+分階段下載流水線
+Staged download pipeline
+
+prefetch (網路)、fasterq-dump (CPU/磁碟)、備份與清理 (磁碟 I/O) 各自擁有
+獨立的執行緒池，階段之間以有界佇列串接，讓網路與磁碟可以分別保持滿載。
+"""
+
+import queue
+import threading
+import time
+
+# 佇列結束標記
+_STOP = object()
+
+
+class RunJob:
+    """單個 run 在流水線中的狀態"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.start_time = time.time()
+        self.end_time = None
+        self.step_times = {}
+        self.step_bytes = {}
+        self.step_info = {}
+        self.fastq_files = []
+        self.fastq_size_mb = 0.0
+        self.backup_method = None
+        self.failed_step = None
+        self.error = ""
+        self.done_steps = set()  # 上次中斷前已完成的步驟 (續傳用)
+        self.skipped_steps = set()  # 本次因續傳而略過的步驟
+        self.invalidated_steps = set()  # 失敗處理時已刪除輸出的步驟 (重試時不可沿用)
+        self.resume_info = {}  # 上次各步驟的額外資訊 (例如備份大小)，用於判斷能否沿用
+        self.sra_path = None  # 沿用既有備份時的 .sra 路徑
+
+    @property
+    def ok(self):
+        return self.failed_step is None
+
+    @property
+    def elapsed(self):
+        end = self.end_time or time.time()
+        return end - self.start_time
+
+    def fail(self, step, error):
+        """標記失敗 (只保留錯誤訊息前 200 字)"""
+        self.failed_step = step
+        self.error = (error or "")[:200]
+
+
+class StageStats:
+    """單一階段的吞吐量統計"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.bytes = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.first_start is None:
+                self.first_start = time.time()
+
+    def end(self, ok, seconds, nbytes):
+        with self._lock:
+            self.in_flight -= 1
+            self.busy_seconds += seconds
+            self.bytes += nbytes
+            self.last_end = time.time()
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self):
+        """回傳目前統計 (MB/s 以階段實際運作的牆鐘時間計算)"""
+        with self._lock:
+            wall = 0.0
+            if self.first_start is not None:
+                wall = (self.last_end or time.time()) - self.first_start
+            size_mb = self.bytes / (1024 * 1024)
+            done = self.processed + self.failed
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "processed": self.processed,
+                "failed": self.failed,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "busy_seconds": self.busy_seconds,
+                "size_mb": size_mb,
+                "mb_per_s": size_mb / wall if wall > 0 else 0.0,
+                "runs_per_hour": done / wall * 3600 if wall > 0 else 0.0,
+                "avg_seconds": self.busy_seconds / done if done else 0.0,
+            }
+
+
+class PipelineStage:
+    """
+    流水線中的一個階段: 一組工作執行緒 + 一個有界輸入佇列
+
+    會建立 max_workers 個執行緒，但同時處理中的任務數受 limit 限制，
+    limit 可在執行中以 set_limit() 調整 (見 adaptive_concurrency.py)。
+    """
+
+    def __init__(self, name, handler, workers, queue_size=None, max_workers=None):
+        if workers < 1:
+            raise ValueError(f"{name}: workers 必須 >= 1")
+        self.name = name
+        self.handler = handler
+        self.max_workers = max(max_workers or workers, workers)
+        self.limit = workers
+        self.inbox = queue.Queue(maxsize=queue_size or workers * 2)
+        self.stats = StageStats(name, workers)
+        self._threads = []
+        self._alive = 0
+        self._alive_lock = threading.Lock()
+        self._active = 0
+        self._slots = threading.Condition()
+
+    @property
+    def workers(self):
+        return self.limit
+
+    def set_limit(self, limit):
+        """調整同時處理中的任務上限 (1 ~ max_workers)"""
+        limit = max(1, min(self.max_workers, int(limit)))
+        with self._slots:
+            self.limit = limit
+            self.stats.workers = limit
+            self._slots.notify_all()
+        return limit
+
+    def backlog(self):
+        return self.inbox.qsize()
+
+    def _acquire(self):
+        with self._slots:
+            while self._active >= self.limit:
+                self._slots.wait()
+            self._active += 1
+
+    def _release(self):
+        with self._slots:
+            self._active -= 1
+            self._slots.notify()
+
+
+class StagedPipeline:
+    """
+    將多個 PipelineStage 串成流水線
+
+    handler(job) 回傳 True 表示成功並送往下一階段；回傳 False 或拋出例外時
+    job 會被標記失敗並直接送到結果佇列。on_start(job, stage_name) 在每個階段
+    開始前、on_step(job, stage_name, seconds) 在每個階段成功後於工作執行緒中呼叫；
+    回呼拋出例外時該 job 標記失敗，工作執行緒照常繼續。
+    feed() 的 should_stop 成立後，各階段佇列中尚未開始的 job 不再處理，
+    直接放入 skipped (不會出現在結果中)。暫停收件期間呼叫 reject_admission()
+    後，feed() 送入的 job 不再等待，直接以指定訊息標記為第一階段失敗。
+    """
+
+    def __init__(self, stages, on_step=None, on_start=None, log=print):
+        if not stages:
+            raise ValueError("至少需要一個階段")
+        self.stages = stages
+        self.on_step = on_step
+        self.on_start = on_start
+        self.log = log
+        self.results = queue.Queue()
+        self.skipped = []  # 中斷後未處理的 job
+        self._should_stop = None
+        self._admission = threading.Event()
+        self._admission.set()
+        self._reject_reason = None
+        self._started = False
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            stage._alive = stage.max_workers
+            for n in range(stage.max_workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(index,),
+                    name=f"{stage.name}-{n + 1}",
+                    daemon=True,
+                )
+                stage._threads.append(thread)
+                thread.start()
+        self._started = True
+
+    def submit(self, job):
+        """送入第一階段 (佇列滿或暫停收件時阻塞，形成背壓)"""
+        self._admission.wait()
+        self.stages[0].inbox.put(job)
+
+    def pause_admission(self):
+        """暫停送入新任務 (已在流水線中的任務照常處理)"""
+        self._admission.clear()
+
+    def resume_admission(self):
+        self._reject_reason = None
+        self._admission.set()
+
+    def reject_admission(self, reason):
+        """暫停收件期間，feed() 的 job 直接以 reason 失敗 (resume_admission() 後恢復)"""
+        self._reject_reason = reason
+
+    def idle(self):
+        """所有階段都沒有處理中或排隊中的 job"""
+        return all(stage.stats.in_flight == 0 and stage.backlog() == 0 for stage in self.stages)
+
+    @property
+    def admission_paused(self):
+        return not self._admission.is_set()
+
+    @property
+    def admission_rejected(self):
+        return self._reject_reason is not None
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def close(self):
+        """不再送入新任務，各階段處理完佇列後依序結束"""
+        first = self.stages[0]
+        for _ in range(first.max_workers):
+            first.inbox.put(_STOP)
+
+    def feed(self, jobs, should_stop=None):
+        """在背景執行緒中逐一送入任務，結束後自動 close()"""
+        self._should_stop = should_stop
+
+        def _stopped():
+            return should_stop is not None and should_stop()
+
+        def _feeder():
+            try:
+                for job in jobs:
+                    # 暫停收件期間仍定期檢查是否要停止或改為拒收
+                    while self._reject_reason is None and not self._admission.wait(1) and not _stopped():
+                        pass
+                    if _stopped():
+                        break
+                    reason = self._reject_reason
+                    if reason is not None and not self._admission.is_set():
+                        job.fail(self.stages[0].name, reason)
+                        job.end_time = time.time()
+                        self.results.put(job)
+                        continue
+                    self.submit(job)
+            finally:
+                self.close()
+
+        thread = threading.Thread(target=_feeder, name="pipeline-feeder", daemon=True)
+        thread.start()
+        return thread
+
+    def iter_results(self):
+        """依完成順序產出已結束 (成功或失敗) 的 job"""
+        while True:
+            job = self.results.get()
+            if job is _STOP:
+                return
+            yield job
+
+    def stats(self):
+        return [stage.stats.snapshot() for stage in self.stages]
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            stage._acquire()
+            job = stage.inbox.get()
+            if job is _STOP:
+                stage._release()
+                break
+
+            if self._should_stop is not None and self._should_stop():
+                # 已中斷: 清空佇列但不再處理 (已完成的步驟都已記錄，下次可續傳)
+                self.skipped.append(job)
+                stage._release()
+                continue
+
+            stage.stats.begin()
+            step_start = time.time()
+            ok = self._callback(self.on_start, job, stage.name)
+            if ok:
+                try:
+                    ok = bool(stage.handler(job))
+                    if not ok and job.ok:
+                        job.fail(stage.name, "")
+                except Exception as e:
+                    ok = False
+                    job.fail(stage.name, str(e))
+            seconds = time.time() - step_start
+            job.step_times.setdefault(stage.name, seconds)
+            if ok:
+                ok = self._callback(self.on_step, job, stage.name, seconds)
+            stage.stats.end(ok, seconds, job.step_bytes.get(stage.name, 0))
+            stage._release()
+
+            if ok and next_stage is not None:
+                next_stage.inbox.put(job)
+            else:
+                job.end_time = time.time()
+                self.results.put(job)
+
+        # 最後一個結束的工作執行緒負責通知下一階段
+        with stage._alive_lock:
+            stage._alive -= 1
+            last = stage._alive == 0
+        if last:
+            if next_stage is not None:
+                for _ in range(next_stage.max_workers):
+                    next_stage.inbox.put(_STOP)
+            else:
+                self.results.put(_STOP)
+
+
+    def _callback(self, callback, job, stage_name, *args):
+        """在工作執行緒中呼叫回呼；例外 (例如寫入日誌時磁碟已滿) 只讓該 job 失敗"""
+        if callback is None:
+            return True
+        try:
+            callback(job, stage_name, *args)
+            return True
+        except Exception as e:
+            self.log(f"⚠️  [{job.run_id}] {stage_name} 回呼失敗: {e}")
+            job.fail(stage_name, f"callback error: {e}")
+            return False
+
+
+def format_stage_stats(stats):
+    """格式化各階段統計為多行文字"""
+    lines = [
+        f"  {'階段':<14}{'並行':>4}{'成功':>6}{'失敗':>6}{'MB':>10}{'MB/s':>8}{'個/時':>8}{'平均秒':>8}"
+    ]
+    for s in stats:
+        lines.append(
+            f"  {s['stage']:<14}{s['workers']:>4}{s['processed']:>6}{s['failed']:>6}"
+            f"{s['size_mb']:>10.1f}{s['mb_per_s']:>8.2f}{s['runs_per_hour']:>8.1f}{s['avg_seconds']:>8.1f}"
+        )
+    return "\n".join(lines)
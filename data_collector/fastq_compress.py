@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+FASTQ 串流壓縮
+Streaming, multi-threaded FASTQ compression
+
+gzip: 把輸入切成固定大小的區塊，各區塊在執行緒池中獨立壓縮成一個 gzip member
+(zlib 壓縮時會釋放 GIL)，再依序寫出；多個 member 串接仍是合法的 .gz
+(gzip / zcat / Python gzip 模組都能直接讀)。同時處理中的區塊數有上限，
+記憶體用量約為 block_size x threads x 2。
+
+zstd: 需要安裝 zstandard 套件，使用其內建的多執行緒串流壓縮。
+"""
+
+import gzip
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+BLOCK_SIZE = 4 * 1024 * 1024  # 每個壓縮區塊 4 MB
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+FORMATS = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class CompressResult:
+    """單一檔案的壓縮結果"""
+
+    def __init__(self, source, dest, raw_bytes, compressed_bytes, seconds):
+        self.source = source
+        self.dest = dest
+        self.raw_bytes = raw_bytes
+        self.compressed_bytes = compressed_bytes
+        self.seconds = seconds
+
+    @property
+    def ratio(self):
+        """壓縮比 (原始 / 壓縮後)"""
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+
+    @property
+    def mb_per_s(self):
+        return self.raw_bytes / (1024 * 1024) / self.seconds if self.seconds > 0 else 0.0
+
+
+def _gzip_block(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip 標頭
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_gzip(fsrc, fdst, level, threads, block_size):
+    max_pending = threads * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        while True:
+            block = fsrc.read(block_size)
+            if not block:
+                break
+            pending.append(pool.submit(_gzip_block, block, level))
+            if len(pending) >= max_pending:
+                fdst.write(pending.popleft().result())
+        while pending:
+            fdst.write(pending.popleft().result())
+
+
+def _compress_zstd(fsrc, fdst, level, threads, block_size):
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd 壓縮需要 zstandard 套件: pip install zstandard")
+
+    compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+    compressor.copy_stream(fsrc, fdst, read_size=block_size, write_size=block_size)
+
+
+def compress_file(path, fmt="gzip", level=None, threads=None, block_size=BLOCK_SIZE, remove_source=True):
+    """
+    壓縮單一檔案為 path + .gz / .zst
+
+    先寫入 .part 暫存檔，fsync 後改名並 fsync 所在目錄，確定壓縮檔已落盤
+    才依 remove_source=True 刪除原始檔 (斷電時不會兩個都遺失)。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的壓縮格式: {fmt} (可用: {', '.join(FORMATS)})")
+    path = os.fspath(path)
+    dest = path + FORMATS[fmt]
+    tmp = dest + ".part"
+    threads = threads or os.cpu_count() or 1
+
+    start = time.time()
+    raw_bytes = os.stat(path).st_size
+    try:
+        with open(path, "rb") as fsrc, open(tmp, "wb") as fdst:
+            if fmt == "gzip":
+                _compress_gzip(fsrc, fdst, level or GZIP_LEVEL, threads, block_size)
+            else:
+                _compress_zstd(fsrc, fdst, level or ZSTD_LEVEL, threads, block_size)
+            fdst.flush()
+            os.fsync(fdst.fileno())
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    os.replace(tmp, dest)
+    _fsync_dir(os.path.dirname(dest) or ".")
+    if remove_source:
+        os.remove(path)
+    return CompressResult(path, dest, raw_bytes, os.stat(dest).st_size, time.time() - start)
+
+
+def _fsync_dir(path):
+    """fsync 目錄讓改名落盤 (Windows 無法開啟目錄，略過)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def is_compressed(path):
+    return os.fspath(path).endswith(tuple(FORMATS.values()))
+
+
+def prefer_compressed(paths):
+    """
+    去掉已有壓縮版本的原始檔 (壓縮改名後、刪除原始檔前中斷時兩者並存)
+
+    壓縮檔只在完整寫入並 fsync 後才改名出現，所以並存時以壓縮檔為準。
+    """
+    names = {os.fspath(p) for p in paths}
+    return [
+        p for p in paths
+        if is_compressed(p) or not any(os.fspath(p) + ext in names for ext in FORMATS.values())
+    ]
+
+
+def superseded_raw(path):
+    """壓縮檔對應、仍殘留的原始檔路徑 (不存在時回傳 None)"""
+    path = os.fspath(path)
+    for ext in FORMATS.values():
+        if path.endswith(ext):
+            raw = path[: -len(ext)]
+            return raw if os.path.exists(raw) else None
+    return None
+
+
+def open_fastq(path):
+    """以二進位模式開啟 FASTQ (依副檔名自動解壓 .gz / .zst)"""
+    path = os.fspath(path)
+    if path.endswith(FORMATS["gzip"]):
+        return gzip.open(path, "rb")
+    if path.endswith(FORMATS["zstd"]):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("讀取 .zst 需要 zstandard 套件: pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
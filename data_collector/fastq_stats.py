@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+FASTQ 內容統計
+Streaming FASTQ statistics with vectorized NumPy parsing
+
+逐塊讀取 {run_id}_1 / _2.fastq (可為 .gz / .zst)，每塊以 NumPy 在位元組陣列上
+一次找出所有換行位置，據此切出序列行與品質行，計算:
+
+* reads / bases 數量與讀長分佈
+* GC 含量與 N 鹼基數
+* 每個位置的平均品質 (Phred+33) 與 Q30 鹼基比例
+
+不在 Python 迴圈中逐 read 處理，速度接近磁碟 (或解壓) 讀取速度。
+未壓縮的大檔案以 mmap 依 record 邊界切成多段，在行程池中各自統計後合併
+(FastqStats 可相加)，速度隨 CPU 核心數線性增加。
+每個 run 的結果以一行 JSON 追加到 fastq_stats.jsonl。
+
+用法:
+    python fastq_stats.py                    # 統計 E:/fastq_data 中所有尚未統計的 run
+    python fastq_stats.py SRR10810025 ...    # 指定 run
+"""
+
+import argparse
+import json
+import mmap
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from fastq_compress import is_compressed, open_fastq
+
+STATS_NAME = "fastq_stats.jsonl"
+CHUNK_SIZE = 8 * 1024 * 1024  # 每次讀取 8 MB
+PHRED_OFFSET = 33
+Q30 = 30
+STATS_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+STATS_PROCESSES = os.cpu_count() or 1
+# 小於此大小的檔案不切段 (行程間傳遞結果的成本大於平行的好處)
+MIN_SPLIT_BYTES = 64 * 1024 * 1024
+
+_NEWLINE = ord("\n")
+_CR = ord("\r")
+
+_GC_BYTES = [ord(c) for c in "GCgc"]
+_N_BYTES = [ord(c) for c in "Nn"]
+
+
+def _grow(array, size):
+    """將累計陣列延長到 size (新位置補 0)"""
+    if len(array) >= size:
+        return array
+    grown = np.zeros(size, dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+def record_bounds(buf):
+    """
+    解析一塊只包含完整 record 的位元組陣列
+
+    回傳 (序列行起點, 品質行起點, 讀長)，沒有 record 時回傳 None；格式錯誤時拋出 ValueError。
+    """
+    newlines = np.flatnonzero(buf == _NEWLINE)
+    if len(newlines) == 0:
+        return None
+    if len(newlines) % 4:
+        raise ValueError("FASTQ 行數不是 4 的倍數")
+
+    starts = np.empty_like(newlines)
+    starts[0] = 0
+    starts[1:] = newlines[:-1] + 1
+    ends = newlines - (buf[np.maximum(newlines - 1, 0)] == _CR)  # 去掉 Windows 換行的 \r
+
+    if not np.all(buf[starts[0::4]] == ord("@")) or not np.all(buf[starts[2::4]] == ord("+")):
+        raise ValueError("不是有效的 FASTQ (標頭行應以 @ 開頭、第三行以 + 開頭)")
+
+    seq_starts, seq_ends = starts[1::4], ends[1::4]
+    qual_starts, qual_ends = starts[3::4], ends[3::4]
+    lengths = seq_ends - seq_starts
+    if not np.array_equal(lengths, qual_ends - qual_starts):
+        raise ValueError("序列與品質長度不一致")
+    return seq_starts, qual_starts, lengths
+
+
+def iter_record_blocks(path, chunk_size=CHUNK_SIZE):
+    """逐塊讀取 FASTQ，產生只包含完整 record 的 np.uint8 陣列；不完整的 record 留到下一塊"""
+    leftover = b""
+    with open_fastq(path) as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = leftover + data
+            buf = np.frombuffer(data, dtype=np.uint8)
+            newlines = np.flatnonzero(buf == _NEWLINE)
+            complete = len(newlines) // 4 * 4
+            if complete == 0:
+                leftover = data
+                continue
+            cut = int(newlines[complete - 1]) + 1
+            yield buf[:cut]
+            leftover = data[cut:]
+
+    if leftover.strip():
+        # 最後一個 record 沒有結尾換行
+        yield np.frombuffer(leftover.rstrip(b"\r\n") + b"\n", dtype=np.uint8)
+
+
+class FastqStats:
+    """單一 FASTQ 檔的累計統計"""
+
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.gc = 0
+        self.n = 0
+        self.q30 = 0
+        self.length_counts = np.zeros(0, dtype=np.int64)  # 讀長 → reads 數
+        self.quality_sum = np.zeros(0, dtype=np.int64)  # 位置 → 品質總和
+        self.quality_count = np.zeros(0, dtype=np.int64)  # 位置 → 鹼基數
+
+    def update(self, buf):
+        """統計一塊只包含完整 record 的位元組陣列 (np.uint8)"""
+        bounds = record_bounds(buf)
+        if bounds is None:
+            return
+        seq_starts, qual_starts, lengths = bounds
+
+        self.reads += len(lengths)
+        self.bases += int(lengths.sum())
+        counts = np.bincount(lengths)
+        self.length_counts = _grow(self.length_counts, len(counts))
+        self.length_counts[: len(counts)] += counts
+
+        # 依讀長分組，以 (reads x 讀長) 的二維索引一次取出序列與品質
+        # (定長或少數幾種讀長時只有幾組)；區塊遠小於 2 GB，索引用 int32 減少記憶體頻寬
+        size = int(lengths.max())
+        self.quality_sum = _grow(self.quality_sum, size)
+        self.quality_count = _grow(self.quality_count, size)
+        seq_starts = seq_starts.astype(np.int32)
+        qual_starts = qual_starts.astype(np.int32)
+        for length in np.flatnonzero(counts):
+            if length == 0:
+                continue
+            selected = lengths == length
+            columns = np.arange(length, dtype=np.int32)
+            seq = np.take(buf, seq_starts[selected, None] + columns)
+            qual = np.take(buf, qual_starts[selected, None] + columns)
+            base_counts = np.bincount(seq.ravel(), minlength=256)
+            self.gc += int(base_counts[_GC_BYTES].sum())
+            self.n += int(base_counts[_N_BYTES].sum())
+            self.q30 += int(np.count_nonzero(qual >= Q30 + PHRED_OFFSET))
+            self.quality_sum[:length] += qual.sum(axis=0, dtype=np.int64) - PHRED_OFFSET * len(qual)
+            self.quality_count[:length] += len(qual)
+
+    def merge(self, other):
+        """合併另一個檔案的統計 (例如 paired-end 的兩個 mate)"""
+        self.reads += other.reads
+        self.bases += other.bases
+        self.gc += other.gc
+        self.n += other.n
+        self.q30 += other.q30
+        for name in ("length_counts", "quality_sum", "quality_count"):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            merged = _grow(mine, len(theirs)).copy()
+            merged[: len(theirs)] += theirs
+            setattr(self, name, merged)
+        return self
+
+    def to_dict(self):
+        lengths = np.flatnonzero(self.length_counts)
+        mean_quality = np.divide(
+            self.quality_sum,
+            self.quality_count,
+            out=np.zeros(len(self.quality_sum)),
+            where=self.quality_count > 0,
+        )
+        called = self.bases - self.n
+        return {
+            "reads": self.reads,
+            "bases": self.bases,
+            "min_length": int(lengths[0]) if len(lengths) else 0,
+            "max_length": int(lengths[-1]) if len(lengths) else 0,
+            "mean_length": round(self.bases / self.reads, 2) if self.reads else 0.0,
+            "gc_percent": round(self.gc / called * 100, 2) if called else 0.0,
+            "n_bases": self.n,
+            "q30_percent": round(self.q30 / self.bases * 100, 2) if self.bases else 0.0,
+            # 只保留出現過的讀長，amplicon / 固定讀長資料只有少數幾項
+            "length_distribution": {str(int(k)): int(self.length_counts[k]) for k in lengths},
+            "mean_quality_by_position": [round(float(q), 2) for q in mean_quality],
+        }
+
+
+def fastq_file_stats(path, chunk_size=CHUNK_SIZE):
+    """逐塊讀取一個 FASTQ 檔並回傳 FastqStats"""
+    stats = FastqStats()
+    for buf in iter_record_blocks(path, chunk_size):
+        stats.update(buf)
+    return stats
+
+
+def _record_start(mm, pos, end):
+    """pos 之後 (含) 第一個 record 的起點；找不到時回傳 end"""
+    if pos == 0:
+        return 0
+    pos = mm.find(b"\n", pos - 1, end)
+    while 0 <= pos < end:
+        start = pos + 1
+        # 標頭行以 @ 開頭，且兩行後以 + 開頭 (品質行也可能以 @ 開頭，但它兩行後是序列行)
+        line2 = mm.find(b"\n", start, end)
+        line3 = mm.find(b"\n", line2 + 1, end) if line2 >= 0 else -1
+        if line3 < 0:
+            return end
+        if mm[start : start + 1] == b"@" and mm[line3 + 1 : line3 + 2] == b"+":
+            return start
+        pos = line2
+    return end
+
+
+def split_records(path, parts):
+    """將未壓縮的 FASTQ 依 record 邊界切成最多 parts 段 [(start, end)]"""
+    size = os.stat(path).st_size
+    if size == 0:
+        return []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, parts):
+            start = _record_start(mm, max(size * i // parts, bounds[-1]), size)
+            if start > bounds[-1] and start < size:
+                bounds.append(start)
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def range_stats(path, start, end, chunk_size=CHUNK_SIZE):
+    """
+    統計未壓縮 FASTQ 中 [start, end) 的 record (start 必須是 record 起點)
+
+    以 mmap 直接在檔案頁面上建立 NumPy 檢視，不另外複製資料；
+    在行程池中執行，回傳可合併的 FastqStats。
+    """
+    stats = FastqStats()
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _scan_range(mm, start, end, chunk_size, stats)
+        finally:
+            try:
+                mm.close()
+            except BufferError:
+                # 解析錯誤的 traceback 仍持有 NumPy 檢視；mmap 在例外釋放後由 GC 關閉，
+                # 讓原本的 ValueError 繼續往上拋
+                pass
+    return stats
+
+
+def _scan_range(mm, start, end, chunk_size, stats):
+    """range_stats 的迴圈本體 (mm 由呼叫端負責關閉)"""
+    pos = start
+    size = chunk_size
+    while pos < end:
+        count = min(size, end - pos)
+        buf = np.frombuffer(mm, dtype=np.uint8, count=count, offset=pos)
+        newlines = np.flatnonzero(buf == _NEWLINE)
+        complete = len(newlines) // 4 * 4
+        if complete == 0:
+            if pos + count < end:
+                size *= 2  # 單一 record 比區塊還大
+                continue
+            # 檔尾最後一個 record 沒有結尾換行
+            tail = bytes(buf).rstrip(b"\r\n")
+            del buf
+            if tail:
+                stats.update(np.frombuffer(tail + b"\n", dtype=np.uint8))
+            break
+        cut = int(newlines[complete - 1]) + 1
+        stats.update(buf[:cut])
+        del buf  # 關閉 mmap 前必須釋放所有檢視
+        pos += cut
+        size = chunk_size
+
+
+def worker_init():
+    """行程池初始化: 忽略 Ctrl+C，由主行程決定何時停止"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def parallel_file_stats(path, executor, parts, chunk_size=CHUNK_SIZE):
+    """
+    在行程池中統計一個 FASTQ，回傳 future 清單 (結果皆為 FastqStats)
+
+    未壓縮檔依 record 邊界切段平行處理；壓縮檔無法隨機讀取，整個檔案交給一個行程。
+    """
+    if is_compressed(path) or parts <= 1 or os.stat(path).st_size < MIN_SPLIT_BYTES:
+        return [executor.submit(fastq_file_stats, path, chunk_size)]
+    return [
+        executor.submit(range_stats, path, start, end, chunk_size)
+        for start, end in split_records(path, parts)
+    ]
+
+
+def run_fastq_stats(run_id, fastq_files, executor=None, parts=None):
+    """
+    統計一個 run 的所有 FASTQ，回傳可寫入 fastq_stats.jsonl 的 dict
+
+    executor: ProcessPoolExecutor；指定時每個檔案切成 parts 段在各行程中統計後合併
+    """
+    start = time.time()
+    total = FastqStats()
+    files = []
+    raw_bytes = 0
+    if executor is None:
+        per_file = [[fastq_file_stats(path)] for path in fastq_files]
+    else:
+        parts = parts or os.cpu_count() or 1
+        futures = [parallel_file_stats(path, executor, parts) for path in fastq_files]
+        per_file = [[future.result() for future in file_futures] for file_futures in futures]
+
+    for path, partials in zip(fastq_files, per_file):
+        stats = FastqStats()
+        for partial in partials:
+            stats.merge(partial)
+        total.merge(stats)
+        files.append({"file": Path(path).name, "reads": stats.reads, "bases": stats.bases})
+        raw_bytes += os.stat(path).st_size
+    seconds = time.time() - start
+    record = {"run_id": run_id, "files": files}
+    record.update(total.to_dict())
+    record["seconds"] = round(seconds, 2)
+    record["mb_per_s"] = round(raw_bytes / (1024 * 1024) / seconds, 1) if seconds > 0 else 0.0
+    record["time"] = datetime.now().isoformat()
+    return record
+
+
+def load_stats(path):
+    """讀取已有的統計 {run_id: record}"""
+    records = {}
+    if not Path(path).exists():
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record["run_id"]] = record
+    return records
+
+
+_append_lock = threading.Lock()
+
+
+def append_stats(path, record):
+    """追加一筆 run 統計 (多個執行緒同時寫入時不會交錯)"""
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _append_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def group_fastq_files(fastq_dir):
+    """依 run_id 分組資料夾中的 FASTQ ({run_id}.fastq / {run_id}_1.fastq ...，含壓縮檔)"""
+    groups = {}
+    for path in sorted(Path(fastq_dir).glob("*.fastq*")):
+        if path.name.endswith(".part"):
+            continue
+        stem = path.name.split(".fastq", 1)[0]
+        run_id = stem.rsplit("_", 1)[0] if "_" in stem else stem
+        groups.setdefault(run_id, []).append(path)
+    return groups
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="統計 FASTQ 讀數、讀長、GC 含量與品質")
+    parser.add_argument("run_ids", nargs="*", help="要統計的 run (預設: 資料夾中所有尚未統計的 run)")
+    parser.add_argument(
+        "--fastq-dir", type=Path, default=Path("E:/fastq_data"), help="FASTQ 資料夾 (預設: E:/fastq_data)"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(__file__).parent / STATS_NAME,
+        help=f"統計結果 (預設: {STATS_NAME})",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=STATS_WORKERS, help=f"同時統計的 run 數 (預設: {STATS_WORKERS})"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=STATS_PROCESSES,
+        help=f"解析 FASTQ 的行程數，大檔案依 record 邊界切段平行處理 (預設: {STATS_PROCESSES})",
+    )
+    parser.add_argument("--force", action="store_true", help="重新統計已有結果的 run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    groups = group_fastq_files(args.fastq_dir)
+    run_ids = args.run_ids or sorted(groups)
+    done = {} if args.force else load_stats(args.output)
+    todo = [run_id for run_id in run_ids if run_id not in done]
+
+    missing = [run_id for run_id in todo if run_id not in groups]
+    for run_id in missing:
+        print(f"⚠️  {run_id}: 找不到 FASTQ", file=sys.stderr)
+    todo = [run_id for run_id in todo if run_id in groups]
+    print(f"📊 需要統計 {len(todo)} 個 run (已有結果 {len(run_ids) - len(todo) - len(missing)} 個)")
+
+    # 執行緒負責同時處理多個 run；實際解析在行程池中依檔案區段平行執行
+    processes = max(1, args.processes)
+    executor = ProcessPoolExecutor(max_workers=processes, initializer=worker_init)
+    with executor, ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(run_fastq_stats, run_id, groups[run_id], executor, processes): run_id
+            for run_id in todo
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            run_id = futures[future]
+            try:
+                record = future.result()
+            except (OSError, ValueError, RuntimeError, BufferError) as e:
+                print(f"[{i}/{len(todo)}] ❌ {run_id}: {e}")
+                continue
+            append_stats(args.output, record)
+            print(
+                f"[{i}/{len(todo)}] ✅ {run_id}: {record['reads']:,} reads, "
+                f"平均讀長 {record['mean_length']}, GC {record['gc_percent']}%, "
+                f"Q30 {record['q30_percent']}% ({record['mb_per_s']} MB/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+零複製檔案搬移 / 備份
+Zero-copy file transfer helpers for the SRA backup step
+
+依成本由低到高嘗試:
+
+1. rename       同一檔案系統直接搬移 (只改目錄項目)
+2. hardlink     同一檔案系統建立硬連結 (保留來源時)
+3. reflink      支援 copy-on-write 的檔案系統 (Btrfs / XFS) 共用資料區塊
+4. 串流複製      copy_file_range → sendfile → 分塊讀寫，寫入 .part 後驗證大小再改名
+
+指定 digest (例如 "md5") 時，只有串流複製能在複製的同一次讀取中計算雜湊
+(改走分塊讀寫)。rename / hardlink / reflink 本身不讀取資料，雜湊要在搬移後
+另外完整讀一次 dest，所以同一磁碟上的搬移並沒有省下這次讀取；不需要驗證時
+請不要指定 digest。
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import sys
+
+CHUNK_SIZE = 8 * 1024 * 1024  # 串流複製每次 8 MB
+
+# Linux FICLONE ioctl (見 ioctl_ficlone(2))
+_FICLONE = 0x40049409
+
+
+class TransferResult:
+    """一次搬移的結果"""
+
+    def __init__(self, method, nbytes, digest=None):
+        self.method = method
+        self.bytes = nbytes
+        self.digest = digest  # 十六進位雜湊 (未要求時為 None)
+
+    def __repr__(self):
+        return f"TransferResult({self.method!r}, {self.bytes}, {self.digest!r})"
+
+
+def hash_file(path, digest="md5"):
+    """讀取整個檔案計算雜湊 (十六進位字串)"""
+    hasher = hashlib.new(digest)
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+def same_filesystem(src, dest_dir):
+    """來源檔與目的資料夾是否位於同一檔案系統"""
+    try:
+        return os.stat(src).st_dev == os.stat(dest_dir).st_dev
+    except OSError:
+        return False
+
+
+def transfer_file(src, dest, keep_source=False, digest=None):
+    """
+    將 src 搬移 (keep_source=False) 或複製 (keep_source=True) 到 dest
+
+    回傳 TransferResult；串流複製後若大小不符會拋出 OSError。
+    digest: hashlib 演算法名稱，指定時結果附帶 dest 內容的雜湊
+            (rename / hardlink / reflink 時會額外讀取整個 dest)。
+    """
+    src = os.fspath(src)
+    dest = os.fspath(dest)
+    dest_dir = os.path.dirname(dest) or "."
+    os.makedirs(dest_dir, exist_ok=True)
+    size = os.stat(src).st_size
+
+    if same_filesystem(src, dest_dir):
+        try:
+            if keep_source:
+                _replace_with_link(src, dest)
+                method = "hardlink"
+            else:
+                os.replace(src, dest)
+                method = "rename"
+            return TransferResult(method, size, hash_file(dest, digest) if digest else None)
+        except OSError:
+            pass  # 例如 FAT/exFAT 不支援硬連結，改用下面的方式
+
+    if _try_reflink(src, dest):
+        method = "reflink"
+        result_digest = hash_file(dest, digest) if digest else None
+    else:
+        hasher = hashlib.new(digest) if digest else None
+        method = _stream_copy(src, dest, size, hasher)
+        result_digest = hasher.hexdigest() if hasher else None
+
+    if not keep_source:
+        os.remove(src)
+    return TransferResult(method, size, result_digest)
+
+
+def _replace_with_link(src, dest):
+    tmp = dest + ".part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    os.link(src, tmp)
+    os.replace(tmp, dest)
+
+
+def _try_reflink(src, dest):
+    """嘗試 copy-on-write 複製，不支援時回傳 False"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    tmp = dest + ".part"
+    try:
+        with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    shutil.copystat(src, tmp)
+    os.replace(tmp, dest)
+    return True
+
+
+def _stream_copy(src, dest, size, hasher=None):
+    """分塊串流複製到 dest.part，驗證大小後改名；回傳使用的方法名稱"""
+    tmp = dest + ".part"
+    with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+        method = _copy_fd(fsrc, fdst, size, hasher)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+
+    copied = os.stat(tmp).st_size
+    if copied != size:
+        os.remove(tmp)
+        raise OSError(errno.EIO, f"複製後大小不符 ({copied} != {size} bytes)", src)
+    shutil.copystat(src, tmp)
+    os.replace(tmp, dest)
+    return method
+
+
+def _copy_fd(fsrc, fdst, size, hasher=None):
+    if hasher is not None:
+        return _chunked_copy(fsrc, fdst, hasher)
+    in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+
+    # 1) copy_file_range: 資料不經過使用者空間
+    if hasattr(os, "copy_file_range"):
+        try:
+            offset = 0
+            while offset < size:
+                n = os.copy_file_range(in_fd, out_fd, min(CHUNK_SIZE, size - offset))
+                if n == 0:
+                    break
+                offset += n
+            if offset == size:
+                return "copy_file_range"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+        _rewind(fsrc, fdst)
+
+    # 2) sendfile: Linux 允許檔案到檔案
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            offset = 0
+            while offset < size:
+                n = os.sendfile(out_fd, in_fd, offset, min(CHUNK_SIZE, size - offset))
+                if n == 0:
+                    break
+                offset += n
+            if offset == size:
+                return "sendfile"
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL):
+                raise
+        _rewind(fsrc, fdst)
+
+    # 3) 分塊讀寫
+    return _chunked_copy(fsrc, fdst)
+
+
+def _chunked_copy(fsrc, fdst, hasher=None):
+    """分塊讀寫 (重複使用同一個緩衝區)，可同時計算雜湊"""
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = fsrc.readinto(buf)
+        if not n:
+            break
+        chunk = view[:n]
+        if hasher is not None:
+            hasher.update(chunk)
+        fdst.write(chunk)
+    return "chunked"
+
+
+def _rewind(fsrc, fdst):
+    fsrc.seek(0)
+    fdst.seek(0)
+    fdst.truncate()
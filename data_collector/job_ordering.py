@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+依預期大小排序與配置下載任務
+Size-aware ordering and in-flight disk budget for the download queue
+
+runs.txt 的順序常讓數個 100 GB 的 run 同時佔滿所有 worker，
+數千個小型 amplicon run 只能排隊等待。這裡依預期的 .sra 大小
+(run_metadata.py) 重新排序:
+
+* file      維持 runs.txt 順序
+* shortest  由小到大 (每小時完成的 run 數最多)
+* mixed     小 run 由小到大，大 run 平均穿插其中 (網路與磁碟負載較平均)
+
+不論哪種順序，上次中斷前已有進度的 run 一律排在最前面 (.sra 已在磁碟上)。
+
+DiskBudget 限制同時在流水線中的預期大小總和，超過預算時暫停送入新任務；
+流水線中沒有任何任務時一定放行，避免單一超大 run 永遠無法開始。
+"""
+
+import statistics
+import threading
+
+ORDER_FILE = "file"
+ORDER_SHORTEST = "shortest"
+ORDER_MIXED = "mixed"
+ORDERS = (ORDER_FILE, ORDER_SHORTEST, ORDER_MIXED)
+
+# mixed: 大於中位數此倍數的 run 視為大 run
+LARGE_FACTOR = 4
+
+
+def fill_unknown_sizes(run_ids, expected_bytes):
+    """回傳每個 run 的大小 (未知者以已知大小的平均值代替)"""
+    known = [expected_bytes[r] for r in run_ids if expected_bytes.get(r)]
+    default = sum(known) / len(known) if known else 0
+    return {r: expected_bytes.get(r) or default for r in run_ids}
+
+
+def order_runs(run_ids, expected_bytes, order=ORDER_MIXED, resumed=()):
+    """依策略排序 run_ids；resumed 中的 run 排在最前面 (保留原相對順序)"""
+    if order not in ORDERS:
+        raise ValueError(f"未知的排序方式: {order}")
+
+    resumed = set(resumed)
+    first = [r for r in run_ids if r in resumed]
+    rest = [r for r in run_ids if r not in resumed]
+    if order == ORDER_FILE or not rest:
+        return first + rest
+
+    sizes = fill_unknown_sizes(rest, expected_bytes)
+    by_size = sorted(rest, key=lambda r: sizes[r])  # sorted 為穩定排序，同大小保留原順序
+    if order == ORDER_SHORTEST:
+        return first + by_size
+
+    threshold = statistics.median(sizes.values()) * LARGE_FACTOR
+    small = [r for r in by_size if sizes[r] <= threshold]
+    large = [r for r in by_size if sizes[r] > threshold]
+    if not small or not large:
+        return first + by_size
+
+    # 大 run 由小到大，平均插入小 run 之間
+    ordered = []
+    step = len(small) / (len(large) + 1)
+    next_large = 0
+    for i, run_id in enumerate(small):
+        while next_large < len(large) and i >= step * (next_large + 1):
+            ordered.append(large[next_large])
+            next_large += 1
+        ordered.append(run_id)
+    ordered.extend(large[next_large:])
+    return first + ordered
+
+
+class DiskBudget:
+    """限制流水線中同時存在的預期位元組總和"""
+
+    def __init__(self, sizes, max_bytes):
+        self.sizes = sizes
+        self.max_bytes = max_bytes
+        self.in_flight = {}
+        self._cond = threading.Condition()
+
+    @property
+    def used(self):
+        with self._cond:
+            return sum(self.in_flight.values())
+
+    def admit(self, jobs, should_stop=None):
+        """包裝 job 來源: 預算不足時等待，直到有 run 結束"""
+        for job in jobs:
+            nbytes = self.sizes.get(job.run_id, 0)
+            with self._cond:
+                while self.in_flight and sum(self.in_flight.values()) + nbytes > self.max_bytes:
+                    if should_stop is not None and should_stop():
+                        return
+                    self._cond.wait(1.0)
+                self.in_flight[job.run_id] = nbytes
+            yield job
+
+    def release(self, run_id):
+        with self._cond:
+            self.in_flight.pop(run_id, None)
+            self._cond.notify_all()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+k-mer 組成輪廓
+Vectorized canonical k-mer profiles for downloaded runs
+
+逐塊讀取下載器產生的 {run_id}_1 / _2.fastq (可為 .gz / .zst，解析沿用 fastq_stats.py)，
+將鹼基以查表轉成 2-bit 編碼 (A=0 C=1 G=2 T=3)，在 (reads x 讀長) 矩陣上以位移倍增
+算出所有 k-mer 與其反向互補的 uint64 編碼，取較小者為 canonical k-mer；
+含 N 的視窗直接遮掉。
+
+* k <= EXACT_MAX_K  以 np.bincount 在 4^k 個槽位上精確計數
+* k 較大 (<= 32)    FracMinHash 取樣: 只保留雜湊值 < 2^64 / scale 的 k-mer，
+                    約為全部不同 k-mer 的 1/scale，記憶體與輸出大小都有上限；
+                    同一 k-mer 在所有 run 中必定同時被保留或捨棄，可直接比較
+
+每個 run 輸出一個稀疏計數向量 kmer_profiles/{run_id}.k{k}.npz:
+keys (uint64，k-mer 編碼或雜湊值，已排序)、counts (uint32) 與 k / scale / 總 k-mer 數。
+
+用法:
+    python kmer_profile.py                       # 處理 E:/fastq_data 中所有尚未處理的 run
+    python kmer_profile.py SRR10810025 --k 11    # 指定 run 與 k
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from fastq_stats import CHUNK_SIZE, group_fastq_files, iter_record_blocks, record_bounds, worker_init
+
+PROFILE_DIR = "kmer_profiles"
+DEFAULT_K = 21
+DEFAULT_SCALE = 1000
+MAX_K = 32  # uint64 最多容納 32 個 2-bit 鹼基
+EXACT_MAX_K = 11  # 4^11 個 int64 槽位 = 32 MB
+PROFILE_WORKERS = os.cpu_count() or 1
+BLOCK_ROWS = 256  # canonical_kmers 每次處理的 read 數
+# 取樣模式下暫存的 (key, count) 超過此數量時合併一次
+MERGE_EVERY = 4 * 1024 * 1024
+
+_INVALID = 4
+_ENCODE = np.full(256, _INVALID, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt")):
+    for _base in _bases:
+        _ENCODE[ord(_base)] = _code
+
+
+def hash64(values):
+    """splitmix64 混合函式 (uint64 陣列，溢位即環繞)"""
+    with np.errstate(over="ignore"):
+        x = values + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def hash_threshold(scale):
+    """FracMinHash 門檻: 雜湊值小於此值的 k-mer 才保留"""
+    return np.uint64((1 << 64) // scale - 1)
+
+
+def _window_codes(bases, k, windows):
+    """
+    bases: (reads, 讀長) 的 uint64 2-bit 鹼基；回傳每個起點往後 k 個鹼基的編碼
+
+    以倍增計算: 先由長度 m 的編碼拼出長度 2m 的編碼，再依 k 的二進位組合，
+    只需約 2 * log2(k) 次陣列運算，而不是逐鹼基位移 k 次。
+    """
+    codes = None
+    width = 0
+    power = bases  # power[:, i] = bases[i : i + m] 的編碼
+    m = 1
+    while True:
+        if k & m:
+            if codes is None:
+                codes = power[:, :windows].copy()
+            else:
+                codes <<= np.uint64(2 * m)
+                codes |= power[:, width : width + windows]
+            width += m
+        if 2 * m > k:
+            return codes
+        n = power.shape[1] - m
+        power = (power[:, :n] << np.uint64(2 * m)) | power[:, m : m + n]
+        m *= 2
+
+
+def canonical_kmers(codes, k, rows=BLOCK_ROWS):
+    """
+    codes: (reads, 讀長) 的 2-bit 編碼矩陣 (無效鹼基為 4)
+
+    回傳所有不含無效鹼基視窗的 canonical k-mer 編碼 (一維 uint64)
+    """
+    windows = codes.shape[1] - k + 1
+    invalid = codes == _INVALID
+    bases = np.where(invalid, 0, codes).astype(np.uint64)
+
+    # 視窗內無效鹼基數 = 累計和之差
+    bad = np.zeros((codes.shape[0], codes.shape[1] + 1), dtype=np.int32)
+    np.cumsum(invalid, axis=1, out=bad[:, 1:])
+    valid = bad[:, k:] == bad[:, :windows]
+
+    # 每次處理 rows 條 read，中間陣列留在 CPU 快取內
+    canonical = np.empty((codes.shape[0], windows), dtype=np.uint64)
+    for start in range(0, codes.shape[0], rows):
+        block = bases[start : start + rows]
+        forward = _window_codes(block, k, windows)
+        # 反向互補 = 互補鹼基反轉後的正向編碼，再反轉回原本的起點順序
+        reverse = _window_codes((np.uint64(3) - block)[:, ::-1], k, windows)[:, ::-1]
+        np.minimum(forward, reverse, out=canonical[start : start + rows])
+    return canonical[valid]
+
+
+def merge_counts(keys, counts):
+    """合併多組 (key, count)，回傳依 key 排序且不重複的 (keys, counts)"""
+    keys = np.concatenate(keys)
+    counts = np.concatenate(counts)
+    if len(keys) == 0:
+        return keys.astype(np.uint64), counts.astype(np.uint64)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    counts = counts[order]
+    first = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[first], np.add.reduceat(counts, first)
+
+
+class KmerCounter:
+    """逐塊累計一個 run 的 canonical k-mer 計數"""
+
+    def __init__(self, k=DEFAULT_K, scale=DEFAULT_SCALE):
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"k 必須介於 1 與 {MAX_K} 之間")
+        self.k = k
+        self.exact = k <= EXACT_MAX_K
+        self.scale = 1 if self.exact else max(1, int(scale))
+        self.threshold = hash_threshold(self.scale)
+        self.reads = 0
+        self.total_kmers = 0
+        if self.exact:
+            self.table = np.zeros(4**k, dtype=np.int64)
+        else:
+            self._keys = []
+            self._counts = []
+            self._merged = 0  # 上次合併後的不同 key 數
+            self._pending = 0  # 之後新增、尚未合併的 key 數
+
+    def update(self, buf):
+        """計數一塊只包含完整 record 的位元組陣列 (np.uint8)"""
+        bounds = record_bounds(buf)
+        if bounds is None:
+            return
+        seq_starts, _, lengths = bounds
+        self.reads += len(lengths)
+
+        # 依讀長分組，一次取出 (reads x 讀長) 的序列矩陣；短於 k 的 read 沒有 k-mer
+        seq_starts = seq_starts.astype(np.int32)
+        groups = []
+        for length in np.flatnonzero(np.bincount(lengths)):
+            if length < self.k:
+                continue
+            selected = lengths == length
+            index = seq_starts[selected, None] + np.arange(length, dtype=np.int32)
+            kmers = canonical_kmers(_ENCODE[np.take(buf, index)], self.k)
+            self.total_kmers += len(kmers)
+            if not self.exact:
+                kmers = hash64(kmers)
+                kmers = kmers[kmers <= self.threshold]
+            groups.append(kmers)
+        if not groups:
+            return
+        # 整塊只累計一次 (修剪過的 read 讀長種類很多，不逐組配置計數陣列)
+        kmers = np.concatenate(groups)
+        if self.exact:
+            self._count_exact(kmers)
+            return
+        keys, counts = np.unique(kmers, return_counts=True)
+        self._keys.append(keys)
+        self._counts.append(counts.astype(np.uint64))
+        self._pending += len(keys)
+        # 新 key 超過已合併大小才合併，總成本維持 O(n log n)
+        if self._pending > max(MERGE_EVERY, self._merged):
+            self._compact()
+
+    def _count_exact(self, kmers):
+        if len(kmers) * 8 >= len(self.table):
+            self.table += np.bincount(kmers.astype(np.intp), minlength=len(self.table))
+        else:
+            # k-mer 遠少於槽位數時不配置整個 4^k 的 bincount 陣列
+            keys, counts = np.unique(kmers, return_counts=True)
+            self.table[keys.astype(np.intp)] += counts
+
+    def _compact(self):
+        keys, counts = merge_counts(self._keys, self._counts)
+        self._keys, self._counts = [keys], [counts]
+        self._merged = len(keys)
+        self._pending = 0
+
+    def profile(self):
+        """回傳稀疏計數向量 (keys uint64 已排序, counts uint32)"""
+        if self.exact:
+            keys = np.flatnonzero(self.table).astype(np.uint64)
+            counts = self.table[keys.astype(np.intp)]
+        else:
+            self._compact()
+            keys, counts = self._keys[0], self._counts[0]
+        return keys, np.minimum(counts, np.iinfo(np.uint32).max).astype(np.uint32)
+
+
+def profile_path(out_dir, run_id, k):
+    return Path(out_dir) / f"{run_id}.k{k}.npz"
+
+
+def save_profile(path, run_id, counter):
+    """原子寫入 .npz (先寫暫存檔再改名，中斷時不會留下半個檔案)"""
+    keys, counts = counter.profile()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".part")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(
+            f,
+            run_id=np.array(run_id),
+            k=np.array(counter.k),
+            scale=np.array(counter.scale),
+            reads=np.array(counter.reads),
+            total_kmers=np.array(counter.total_kmers),
+            keys=keys,
+            counts=counts,
+        )
+    os.replace(tmp, path)
+    return keys, counts
+
+
+def load_profile(path):
+    """讀取 save_profile 的輸出，回傳 dict (純量欄位轉成 Python 型別)"""
+    with np.load(path) as data:
+        profile = {name: data[name] for name in data.files}
+    for name in ("run_id", "k", "scale", "reads", "total_kmers"):
+        profile[name] = profile[name].item()
+    return profile
+
+
+def run_kmer_profile(run_id, fastq_files, out_dir, k=DEFAULT_K, scale=DEFAULT_SCALE, chunk_size=CHUNK_SIZE):
+    """計數一個 run 的所有 FASTQ (雙端兩個檔案合併) 並寫入 profile，回傳摘要 dict"""
+    started = time.time()
+    counter = KmerCounter(k, scale)
+    nbytes = 0
+    for path in fastq_files:
+        nbytes += os.path.getsize(path)
+        for buf in iter_record_blocks(path, chunk_size):
+            counter.update(buf)
+    keys, _ = save_profile(profile_path(out_dir, run_id, k), run_id, counter)
+    elapsed = time.time() - started
+    return {
+        "run_id": run_id,
+        "reads": counter.reads,
+        "total_kmers": counter.total_kmers,
+        "distinct": len(keys),
+        "seconds": round(elapsed, 1),
+        "mb_per_s": round(nbytes / 1024 / 1024 / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="計算每個 run 的 canonical k-mer 稀疏計數向量")
+    parser.add_argument("run_ids", nargs="*", help="要處理的 run (預設: 資料夾中所有尚未處理的 run)")
+    parser.add_argument(
+        "--fastq-dir", type=Path, default=Path("E:/fastq_data"), help="FASTQ 資料夾 (預設: E:/fastq_data)"
+    )
+    parser.add_argument(
+        "--out-dir",
+        type=Path,
+        default=Path(__file__).parent / PROFILE_DIR,
+        help=f"輸出資料夾 (預設: {PROFILE_DIR})",
+    )
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help=f"k-mer 長度，1-{MAX_K} (預設: {DEFAULT_K})")
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=DEFAULT_SCALE,
+        help=f"k > {EXACT_MAX_K} 時約保留 1/scale 的不同 k-mer (預設: {DEFAULT_SCALE})",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=PROFILE_WORKERS, help=f"同時處理的 run 數 (預設: {PROFILE_WORKERS})"
+    )
+    parser.add_argument("--force", action="store_true", help="重新計算已有輸出的 run")
+    args = parser.parse_args(argv)
+    if not 1 <= args.k <= MAX_K:
+        parser.error(f"--k 必須介於 1 與 {MAX_K} 之間")
+    if args.scale < 1:
+        parser.error("--scale 必須 >= 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    groups = group_fastq_files(args.fastq_dir)
+    run_ids = args.run_ids or sorted(groups)
+
+    missing = [run_id for run_id in run_ids if run_id not in groups]
+    for run_id in missing:
+        print(f"⚠️  {run_id}: 找不到 FASTQ", file=sys.stderr)
+    todo = [
+        run_id
+        for run_id in run_ids
+        if run_id in groups and (args.force or not profile_path(args.out_dir, run_id, args.k).exists())
+    ]
+    mode = "精確計數" if args.k <= EXACT_MAX_K else f"FracMinHash 1/{args.scale}"
+    print(f"🧬 k={args.k} ({mode})，需要處理 {len(todo)} 個 run (已有結果 {len(run_ids) - len(todo) - len(missing)} 個)")
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=worker_init) as executor:
+        futures = {
+            executor.submit(run_kmer_profile, run_id, groups[run_id], args.out_dir, args.k, args.scale): run_id
+            for run_id in todo
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            run_id = futures[future]
+            try:
+                result = future.result()
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"[{i}/{len(todo)}] ❌ {run_id}: {e}")
+                continue
+            print(
+                f"[{i}/{len(todo)}] ✅ {run_id}: {result['reads']:,} reads, "
+                f"{result['total_kmers']:,} k-mers, 保留 {result['distinct']:,} 個不同 k-mer "
+                f"({result['mb_per_s']} MB/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""Asyncio MGnify client.
+
+:class:`AsyncMGnifyClient` mirrors :class:`mgnify_insecta_scraper.MGnifyClient`
+(``iter_pages``, ``iter_biome_samples``, ``fetch_sample_runs``,
+``fetch_runs_for_samples``) as coroutines and async generators, so the same
+scraping logic can run inside an event loop (e.g. from server code) without
+blocking it:
+
+* one pooled ``httpx.AsyncClient`` with keep-alive connections, HTTP/2 when
+  the ``h2`` package is installed
+* a semaphore limiting requests in flight and an async token bucket limiting
+  requests per second
+* the same retry policy as the sync client (every failed request, 4xx
+  included, up to ``MAX_RETRIES`` times), backing off with ``asyncio.sleep``
+  and honouring ``Retry-After`` on 429/503 responses
+* ``ResponseCache`` reads and writes run in a worker thread
+  (``asyncio.to_thread``) so disk I/O does not block the loop
+
+Requires ``httpx`` (``pip install httpx``; ``pip install "httpx[http2]"`` for
+HTTP/2).
+
+Usage
+-----
+python mgnify_async.py --output insecta_runs.csv --concurrency 8
+python mgnify_async.py --output insecta_runs.csv --incremental
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import sys
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+try:
+    import httpx
+except ImportError:  # optional dependency
+    httpx = None
+
+from mgnify_insecta_scraper import (
+    BASE_URL,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_OUTPUT,
+    DEFAULT_RATE_LIMIT,
+    MAX_RETRIES,
+    PAGE_SIZE,
+    REQUEST_TIMEOUT,
+    RETRY_BACKOFF,
+    STATE_SUFFIX,
+    CSVStreamWriter,
+    ResponseCache,
+    ScrapeState,
+    build_run_index,
+    finish_stream,
+    lineage_scans,
+    merge_into_csv,
+    missing_run_links,
+    open_checkpoint,
+    require_records,
+    unique_records,
+    use_incremental,
+)
+
+MAX_RETRY_AFTER = 300.0  # seconds; never wait longer than this on a Retry-After header
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header (delta seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), MAX_RETRY_AFTER)
+
+
+class AsyncTokenBucket:
+    """Token bucket for coroutines: at most ``rate`` acquisitions per second on average."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncMGnifyClient:
+    """Async counterpart of :class:`mgnify_insecta_scraper.MGnifyClient`.
+
+    Use as ``async with AsyncMGnifyClient() as client:`` so the connection
+    pool is closed when done.
+    """
+
+    def __init__(
+        self,
+        client: Optional["httpx.AsyncClient"] = None,
+        *,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        cache: Optional[ResponseCache] = None,
+        http2: Optional[bool] = None,
+    ) -> None:
+        if httpx is None:
+            raise RuntimeError("AsyncMGnifyClient requires httpx: pip install httpx")
+        self.concurrency = max(1, concurrency)
+        if client is None:
+            if http2 is None:
+                http2 = importlib.util.find_spec("h2") is not None
+            connect, read = REQUEST_TIMEOUT
+            client = httpx.AsyncClient(
+                http2=http2,
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(
+                    max_connections=self.concurrency, max_keepalive_connections=self.concurrency
+                ),
+                headers={"User-Agent": "MGnifyInsectaScraper/1.0"},
+            )
+        self.client = client
+        self.limiter = AsyncTokenBucket(rate_limit)
+        self.cache = cache
+        self._in_flight = asyncio.Semaphore(self.concurrency)
+
+    async def __aenter__(self) -> "AsyncMGnifyClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _request(self, method: str, url: str, *, params: Optional[Dict] = None) -> Dict:
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        headers: Dict[str, str] = {}
+        cache_key = cached = None
+        if self.cache is not None and method.upper() == "GET":
+            cache_key = self.cache.key(method, url, params)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+        last_error: Optional[Exception] = None
+        for attempt in range(1, MAX_RETRIES + 1):
+            await self.limiter.acquire()
+            delay = RETRY_BACKOFF * attempt
+            try:
+                async with self._in_flight:
+                    response = await self.client.request(method, url, params=params or None, headers=headers)
+            except httpx.HTTPError as exc:
+                last_error = exc
+            else:
+                if response.status_code == 304 and cached is not None:
+                    self.cache.hits += 1
+                    return cached["body"]
+                try:
+                    # Every HTTP error is retried, like MGnifyClient
+                    response.raise_for_status()
+                except httpx.HTTPStatusError as exc:
+                    last_error = exc
+                    delay = retry_after_seconds(response.headers.get("Retry-After")) or delay
+                else:
+                    body = response.json()
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+                    if cache_key is not None and (etag or last_modified):
+                        await asyncio.to_thread(
+                            self.cache.put,
+                            cache_key,
+                            {"url": url, "etag": etag, "last_modified": last_modified, "body": body},
+                        )
+                    return body
+            if attempt == MAX_RETRIES:
+                break
+            print(
+                f"⚠️  Request failed ({last_error}). Retrying in {delay:.1f}s...",
+                file=sys.stderr,
+            )
+            await asyncio.sleep(delay)
+        raise RuntimeError(f"Failed to fetch {url}: {last_error}")
+
+    async def iter_pages(
+        self, url: str, params: Optional[Dict] = None, *, start_page: int = 1
+    ) -> AsyncIterator[Dict]:
+        """Yield every page of a paginated endpoint, in page order (see ``MGnifyClient.iter_pages``)."""
+
+        if start_page > 1:
+            params = {**(params or {}), "page": start_page}
+        first = await self._request("GET", url, params=params)
+        yield first
+
+        pages = first.get("meta", {}).get("pagination", {}).get("pages")
+        if not pages:
+            next_url = first.get("links", {}).get("next")
+            while next_url:
+                page = await self._request("GET", next_url)
+                yield page
+                next_url = page.get("links", {}).get("next")
+            return
+
+        base_params = dict(params or {})
+        numbers = iter(range(start_page + 1, pages + 1))
+        pending: Deque[asyncio.Task] = deque()
+
+        def refill() -> None:
+            # Keep a bounded window of pages ahead of the consumer
+            while len(pending) < self.concurrency * 2:
+                number = next(numbers, None)
+                if number is None:
+                    return
+                page_params = {**base_params, "page": number}
+                pending.append(asyncio.ensure_future(self._request("GET", url, params=page_params)))
+
+        try:
+            refill()
+            while pending:
+                page = await pending.popleft()
+                refill()
+                yield page
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def iter_biome_samples(
+        self,
+        biome_lineage: str,
+        *,
+        include_runs: bool = True,
+        ordering: Optional[str] = None,
+        start_page: int = 1,
+    ) -> AsyncIterator[Tuple[List[Dict], List[Dict]]]:
+        """Yield each page of samples (and optionally included runs) for a biome."""
+
+        encoded_lineage = quote(biome_lineage, safe="")
+        url = f"{BASE_URL}/biomes/{encoded_lineage}/samples"
+        params: Dict = {
+            "page_size": PAGE_SIZE,
+            "include": "runs" if include_runs else None,
+            "ordering": ordering,
+        }
+
+        async for page in self.iter_pages(url, params, start_page=start_page):
+            samples = page.get("data", [])
+            included = page.get("included", []) if include_runs else []
+            yield samples, included
+
+    async def fetch_sample_runs(self, runs_url: str) -> List[Dict]:
+        """Fetch all runs for a given sample via the dedicated runs endpoint."""
+
+        runs: List[Dict] = []
+        async for page in self.iter_pages(runs_url):
+            runs.extend(page.get("data", []))
+        return runs
+
+    async def fetch_runs_for_samples(self, runs_urls: Dict[str, str]) -> Dict[str, List[Dict]]:
+        """Fetch the runs of many samples concurrently (keyed like ``runs_urls``)."""
+
+        sample_ids = list(runs_urls)
+        results = await asyncio.gather(*(self.fetch_sample_runs(runs_urls[s]) for s in sample_ids))
+        return dict(zip(sample_ids, results))
+
+
+async def iter_record_pages(
+    client: AsyncMGnifyClient,
+    *,
+    state: Optional[ScrapeState] = None,
+    incremental: bool = False,
+    start_pages: Optional[Dict[str, int]] = None,
+    lineages: Optional[Dict[str, str]] = None,
+) -> AsyncIterator[Tuple[str, int, List[Dict[str, Optional[str]]]]]:
+    """Async counterpart of ``mgnify_insecta_scraper.iter_record_pages``.
+
+    Page selection and incremental early stopping come from the same
+    ``LineageScan`` helper as the sync scraper.
+    """
+
+    for biome_name, scan, start_page in lineage_scans(
+        state=state, incremental=incremental, start_pages=start_pages, lineages=lineages
+    ):
+        lineage = scan.lineage
+        pages = client.iter_biome_samples(lineage, ordering=scan.ordering, start_page=start_page)
+        page_number = start_page
+        try:
+            async for samples, included in pages:
+                samples = scan.select(samples)
+                if samples is None:
+                    break
+                records: List[Dict[str, Optional[str]]] = []
+                if samples:
+                    run_index = build_run_index(included)
+                    run_index.update(await client.fetch_runs_for_samples(missing_run_links(samples, run_index)))
+                    records = scan.records(biome_name, samples, run_index)
+                yield lineage, page_number, records
+                page_number += 1
+        finally:
+            await pages.aclose()
+
+
+async def collect_records(
+    client: AsyncMGnifyClient,
+    *,
+    state: Optional[ScrapeState] = None,
+    incremental: bool = False,
+    lineages: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, Optional[str]]]:
+    """Async counterpart of ``mgnify_insecta_scraper.collect_records``."""
+
+    pages = []
+    async for _, _, records in iter_record_pages(client, state=state, incremental=incremental, lineages=lineages):
+        pages.append(records)
+    records = unique_records(record for page in pages for record in page)
+    require_records(len(records), allow_empty=incremental)
+    return records
+
+
+async def stream_records(
+    client: AsyncMGnifyClient,
+    output_path: Path,
+    state: ScrapeState,
+    *,
+    restart: bool = False,
+    lineages: Optional[Dict[str, str]] = None,
+    allow_empty: bool = False,
+) -> int:
+    """Full scrape with the same streaming CSV output and checkpoint as the sync scraper."""
+
+    checkpoint, checkpoint_path, resume = open_checkpoint(output_path, state, restart=restart)
+    with CSVStreamWriter(output_path, resume=resume) as writer:
+        async for lineage, page_number, records in iter_record_pages(
+            client, state=state, start_pages=checkpoint.pages, lineages=lineages
+        ):
+            writer.write(records)
+            checkpoint.advance(checkpoint_path, lineage, page_number, state)
+    return finish_stream(output_path, checkpoint_path, writer.count, allow_empty=allow_empty)
+
+
+async def scrape(
+    client: AsyncMGnifyClient,
+    output_path: Path,
+    *,
+    incremental: bool = False,
+    restart: bool = False,
+    lineages: Optional[Dict[str, str]] = None,
+    allow_empty: bool = False,
+) -> int:
+    """Async counterpart of ``mgnify_insecta_scraper.scrape`` (full, resumed or incremental)."""
+
+    state_path = output_path.with_name(output_path.name + STATE_SUFFIX)
+    state = ScrapeState.load(state_path)
+    if use_incremental(output_path, incremental):
+        records = await collect_records(client, state=state, incremental=True, lineages=lineages)
+        count = merge_into_csv(output_path, records)
+    else:
+        count = await stream_records(
+            client, output_path, state, restart=restart, lineages=lineages, allow_empty=allow_empty
+        )
+    state.save(state_path)
+    return count
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Scrape MGnify Insecta sample runs with the asyncio client.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(DEFAULT_OUTPUT),
+        help=f"Path to the CSV output file (default: {DEFAULT_OUTPUT}).",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=DEFAULT_RATE_LIMIT,
+        help=f"Maximum API requests per second (default: {DEFAULT_RATE_LIMIT}).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum requests in flight / pooled connections (default: {DEFAULT_CONCURRENCY}).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(DEFAULT_CACHE_DIR),
+        help=f"Directory for cached API responses (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk response cache.")
+    parser.add_argument("--no-http2", action="store_true", help="Use HTTP/1.1 even if h2 is installed.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch samples updated since the previous scrape and merge them into --output.",
+    )
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+    args = parser.parse_args(argv)
+    if args.rate_limit <= 0:
+        parser.error("--rate-limit must be positive")
+    return args
+
+
+async def run(args: argparse.Namespace) -> None:
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+    async with AsyncMGnifyClient(
+        rate_limit=args.rate_limit,
+        concurrency=args.concurrency,
+        cache=cache,
+        http2=False if args.no_http2 else None,
+    ) as client:
+        await scrape(client, args.output, incremental=args.incremental, restart=args.restart)
+    if cache is not None and cache.hits:
+        print(f"   Served {cache.hits} unchanged responses from the cache")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if httpx is None:
+        sys.exit("❌ This client requires httpx: pip install httpx")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""Multi-biome MGnify harvester.
+
+Generalises ``mgnify_insecta_scraper`` from its two hard-coded Insecta
+lineages to any set of MGnify biome lineages:
+
+* ``--discover`` walks the biome tree (``/biomes/{lineage}/children``) and
+  adds every sub-lineage that has samples
+* lineages are harvested in parallel threads sharing one ``MGnifyClient``,
+  so its token bucket is a single global rate budget for the whole harvest
+* ``/biomes/{lineage}/samples`` also lists the samples of every
+  sub-lineage, so only the topmost lineages are scanned (once each, into
+  ``{out_dir}/scans/`` with their own checkpoint and incremental state);
+  every sample is tagged with the deepest harvested lineage containing its
+  own biome
+* each scan is then split into one partition ``{out_dir}/{name}.csv`` per
+  lineage; ``manifest.json`` lists the partitions and their row counts
+* ``--parquet`` also converts the partitions into a Parquet dataset
+  (see ``mgnify_parquet``)
+
+Usage
+-----
+python mgnify_harvester.py --lineage root:Host-associated --discover --out-dir mgnify_harvest
+python mgnify_harvester.py --lineage root:Host-associated --discover --list
+python mgnify_harvester.py --lineage root:Host-associated --discover --parquet
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from mgnify_insecta_scraper import (
+    BIOME_LINEAGES,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RATE_LIMIT,
+    MGnifyClient,
+    ResponseCache,
+    read_csv,
+    scrape,
+    write_csv,
+)
+
+DEFAULT_OUT_DIR = "mgnify_harvest"
+DEFAULT_PARALLEL = 4  # lineages harvested at the same time
+MANIFEST_NAME = "manifest.json"
+SCAN_DIR = "scans"  # one combined CSV per scanned top-level lineage
+
+
+def partition_name(lineage: str) -> str:
+    """File-system safe partition name, e.g. ``root_Host-associated_Insecta``."""
+    return re.sub(r"[^A-Za-z0-9-]+", "_", lineage).strip("_")
+
+
+def lineage_depth(lineage: str) -> int:
+    return lineage.count(":")
+
+
+def discover_lineages(
+    client: MGnifyClient,
+    roots: Iterable[str],
+    *,
+    max_depth: Optional[int] = None,
+    min_samples: int = 1,
+) -> Dict[str, str]:
+    """Return ``{lineage: biome name}`` for ``roots`` and the sub-lineages below them.
+
+    ``max_depth`` limits how many levels below each root are followed.
+    Sub-lineages reporting fewer than ``min_samples`` samples are not
+    harvested, but the tree below them is still explored.
+    """
+
+    lineages: Dict[str, str] = {}
+    for root in roots:
+        lineages.setdefault(root, BIOME_LINEAGES.get(root, root.rsplit(":", 1)[-1]))
+        queue = [root]
+        visited = {root}
+        while queue:
+            parent = queue.pop(0)
+            for biome in client.iter_child_biomes(parent):
+                attributes = biome.get("attributes", {})
+                lineage = attributes.get("lineage") or biome.get("id")
+                # The endpoint may list direct children or all descendants
+                if not lineage or lineage in visited or not lineage.startswith(parent + ":"):
+                    continue
+                if max_depth is not None and lineage_depth(lineage) - lineage_depth(root) > max_depth:
+                    continue
+                visited.add(lineage)
+                queue.append(lineage)
+                if (attributes.get("samples-count") or 0) >= min_samples:
+                    lineages.setdefault(lineage, attributes.get("biome-name") or lineage.rsplit(":", 1)[-1])
+    return lineages
+
+
+def scan_groups(lineages: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    """Group lineages under the topmost ones: ``{root: {lineage: name}}`` (root included)."""
+
+    groups: Dict[str, Dict[str, str]] = {}
+    for lineage in sorted(lineages, key=lineage_depth):
+        root = next((r for r in groups if lineage.startswith(r + ":")), lineage)
+        groups.setdefault(root, {})[lineage] = lineages[lineage]
+    return groups
+
+
+def load_manifest(path: Path) -> Dict[str, Dict]:
+    try:
+        with path.open(encoding="utf-8") as handle:
+            return {entry["lineage"]: entry for entry in json.load(handle).get("partitions", [])}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(path: Path, partitions: Dict[str, Dict]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as handle:
+        payload = {"partitions": sorted(partitions.values(), key=lambda entry: entry["lineage"])}
+        json.dump(payload, handle, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def harvest(
+    client: MGnifyClient,
+    lineages: Dict[str, str],
+    out_dir: Path,
+    *,
+    parallel: int = DEFAULT_PARALLEL,
+    incremental: bool = False,
+    restart: bool = False,
+) -> Dict[str, Dict]:
+    """Harvest every lineage into its own partition; returns the updated manifest entries.
+
+    Only the topmost lineages are requested (see :func:`scan_groups`); each
+    scan is split into the partitions of the lineages below it. A failing
+    scan is reported and left with its checkpoint, so the next run resumes
+    it; its partitions keep their previous files and the other scans are not
+    affected.
+    """
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    groups = scan_groups(lineages)
+
+    def harvest_one(root: str) -> Dict[str, int]:
+        group = groups[root]
+        scan_path = out_dir / SCAN_DIR / f"{partition_name(root)}.csv"
+        scrape(
+            client,
+            scan_path,
+            incremental=incremental,
+            restart=restart,
+            lineages={root: group[root]},
+            partitions=group,
+            allow_empty=True,
+        )
+        rows: Dict[str, List[Dict[str, Optional[str]]]] = {lineage: [] for lineage in group}
+        for row in read_csv(scan_path):
+            rows.setdefault(row["biome_lineage"], []).append(row)
+        for lineage in group:
+            write_csv(rows[lineage], out_dir / f"{partition_name(lineage)}.csv")
+        return {lineage: len(rows[lineage]) for lineage in group}
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix="harvest") as executor:
+        futures = {executor.submit(harvest_one, root): root for root in groups}
+        for i, future in enumerate(as_completed(futures), 1):
+            root = futures[future]
+            harvested_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            try:
+                counts = future.result()
+                status = "complete"
+            except (RuntimeError, OSError, requests.RequestException, ValueError, KeyError) as exc:
+                counts = {}
+                status = "failed"
+                print(f"[{i}/{len(futures)}] ❌ {root}: {exc}", file=sys.stderr)
+            for lineage in groups[root]:
+                if status == "complete":
+                    records = counts[lineage]
+                    print(f"[{i}/{len(futures)}] ✅ {lineage}: {records} records")
+                else:
+                    records = manifest.get(lineage, {}).get("records", 0)
+                manifest[lineage] = {
+                    "lineage": lineage,
+                    "biome_name": lineages[lineage],
+                    "file": f"{partition_name(lineage)}.csv",
+                    "harvested_at": harvested_at,
+                    "records": records,
+                    "status": status,
+                }
+            save_manifest(manifest_path, manifest)
+    return manifest
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Harvest MGnify run metadata for any set of biome lineages.")
+    parser.add_argument(
+        "--lineage",
+        action="append",
+        help="Biome lineage to harvest (repeatable; default: the Insecta lineages of the scraper).",
+    )
+    parser.add_argument("--discover", action="store_true", help="Also harvest sub-lineages found in the biome tree.")
+    parser.add_argument("--max-depth", type=int, default=None, help="Levels below each lineage to discover.")
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=1,
+        help="Skip discovered sub-lineages with fewer samples (default: 1).",
+    )
+    parser.add_argument("--list", action="store_true", help="Only print the lineages that would be harvested.")
+    parser.add_argument(
+        "--out-dir",
+        type=Path,
+        default=Path(DEFAULT_OUT_DIR),
+        help=f"Directory for per-biome partitions (default: {DEFAULT_OUT_DIR}).",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=DEFAULT_PARALLEL,
+        help=f"Lineages harvested at the same time (default: {DEFAULT_PARALLEL}).",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=DEFAULT_RATE_LIMIT,
+        help=f"Global API requests per second shared by all lineages (default: {DEFAULT_RATE_LIMIT}).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Pages fetched in parallel per lineage (default: {DEFAULT_CONCURRENCY}).",
+    )
+    parser.add_argument("--incremental", action="store_true", help="Only fetch samples updated since the last harvest.")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing checkpoints.")
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(DEFAULT_CACHE_DIR),
+        help=f"Directory for cached API responses (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk response cache.")
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="Also write the complete partitions to a Parquet dataset in {out-dir}/parquet (needs pyarrow).",
+    )
+    args = parser.parse_args(argv)
+    if args.rate_limit <= 0:
+        parser.error("--rate-limit must be positive")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+
+    # All harvesting threads share the client's worker pool and connection
+    # slots: give them room for --concurrency requests per lineage.
+    client = MGnifyClient(
+        rate_limit=args.rate_limit,
+        concurrency=args.concurrency,
+        max_connections=max(1, args.parallel) * max(1, args.concurrency),
+        cache=cache,
+    )
+
+    try:
+        roots = args.lineage or list(BIOME_LINEAGES)
+        if args.discover:
+            print(f"🌳 Discovering sub-lineages of {len(roots)} lineage(s)...")
+            lineages = discover_lineages(client, roots, max_depth=args.max_depth, min_samples=args.min_samples)
+        else:
+            lineages = {lineage: BIOME_LINEAGES.get(lineage, lineage.rsplit(":", 1)[-1]) for lineage in roots}
+
+        if args.list:
+            for lineage, name in lineages.items():
+                print(f"{lineage}\t{name}\t{partition_name(lineage)}.csv")
+            return
+
+        print(
+            f"🚜 Harvesting {len(lineages)} lineage(s) from {len(scan_groups(lineages))} scan(s) "
+            f"into {args.out_dir} ({args.parallel} at a time)"
+        )
+        manifest = harvest(
+            client,
+            lineages,
+            args.out_dir,
+            parallel=args.parallel,
+            incremental=args.incremental,
+            restart=args.restart,
+        )
+    finally:
+        client.close()
+
+    total = sum(manifest[lineage]["records"] for lineage in lineages)
+    failed = [lineage for lineage in lineages if manifest[lineage]["status"] != "complete"]
+    print(f"✅ {total} records in {len(lineages) - len(failed)} complete partition(s)")
+    if failed:
+        print(f"⚠️  {len(failed)} lineage(s) failed; run again to resume them.", file=sys.stderr)
+    if cache is not None and cache.hits:
+        print(f"   Served {cache.hits} unchanged responses from the cache")
+    if args.parquet:
+        from mgnify_parquet import DEFAULT_DATASET_DIR, convert_harvest  # needs pyarrow
+
+        converted = convert_harvest(args.out_dir)
+        print(f"🧱 {len(converted)} partition(s) written to {args.out_dir / DEFAULT_DATASET_DIR}")
+
+
+if __name__ == "__main__":
+    main()
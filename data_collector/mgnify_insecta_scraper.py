@@ -11,20 +11,31 @@ to samples within the following biomes:
 Usage
 -----
 python mgnify_insecta_scraper.py --output insecta_runs.csv
+python mgnify_insecta_scraper.py --output insecta_runs.csv --incremental
+
+Records are appended to the CSV page by page; an interrupted full scrape
+resumes from ``<output>.checkpoint.json`` on the next run.
 """
 
 from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
+import json
+import os
 import sys
+import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import quote
 
 import requests
+from requests.adapters import HTTPAdapter
 
 BASE_URL = "https://www.ebi.ac.uk/metagenomics/api/v1"
 DEFAULT_OUTPUT = "insecta_runs.csv"
@@ -32,7 +43,11 @@ PAGE_SIZE = 100
 REQUEST_TIMEOUT = (5, 30)  # (connect, read) seconds
 MAX_RETRIES = 3
 RETRY_BACKOFF = 2.5  # seconds
-RATE_LIMIT_DELAY = 0.2  # delay between page fetches
+DEFAULT_RATE_LIMIT = 5.0  # requests per second, shared by all worker threads
+DEFAULT_CONCURRENCY = 4  # pages fetched in parallel
+DEFAULT_CACHE_DIR = ".mgnify_cache"
+STATE_SUFFIX = ".state.json"
+CHECKPOINT_SUFFIX = ".checkpoint.json"
 
 BIOME_LINEAGES: Dict[str, str] = {
     "root:Host-associated:Insecta": "Insecta (excl. sub-lineages)",
@@ -40,6 +55,108 @@ BIOME_LINEAGES: Dict[str, str] = {
 }
 
 
+@dataclass
+class ScrapeState:
+    """High-water mark of sample ``last-update`` values seen per lineage.
+
+    Saved next to the CSV so an ``--incremental`` scrape can skip samples
+    that have not changed since the previous scrape.
+    """
+
+    last_update: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "ScrapeState":
+        try:
+            with path.open(encoding="utf-8") as handle:
+                return cls(last_update=json.load(handle).get("last_update", {}))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls()
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as handle:
+            json.dump({"last_update": self.last_update}, handle, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def observe(self, lineage: str, last_update: Optional[str]) -> None:
+        if last_update and last_update > self.last_update.get(lineage, ""):
+            self.last_update[lineage] = last_update
+
+
+class ResponseCache:
+    """On-disk cache of JSON responses keyed by method, URL and query params.
+
+    Each entry keeps the response's ``ETag`` / ``Last-Modified`` validators so
+    the next request for the same key can be sent as a conditional request;
+    a ``304 Not Modified`` answer is then served from disk.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+
+    @staticmethod
+    def key(method: str, url: str, params: Optional[Dict]) -> str:
+        query = sorted((k, str(v)) for k, v in (params or {}).items() if v is not None)
+        raw = json.dumps([method.upper(), url, query], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            with self._path(key).open(encoding="utf-8") as handle:
+                return json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, entry: Dict) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        # Unique temp name: several worker threads may write the same key
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with tmp.open("w", encoding="utf-8") as handle:
+            json.dump(entry, handle, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+@dataclass
+class Checkpoint:
+    """Last sample page written to the CSV per lineage during a full scrape.
+
+    Pages are fetched by number, so the page number plays the role of the
+    ``links.next`` URL. A resumed scrape re-reads the checkpointed page (its
+    rows are dropped as duplicates) and continues after it.
+    """
+
+    pages: Dict[str, int] = field(default_factory=dict)
+    last_update: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Checkpoint"]:
+        try:
+            with path.open(encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return cls(pages=data.get("pages", {}), last_update=data.get("last_update", {}))
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as handle:
+            json.dump({"pages": self.pages, "last_update": self.last_update}, handle, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def advance(self, path: Path, lineage: str, page_number: int, state: ScrapeState) -> None:
+        """Record ``page_number`` of ``lineage`` as written and save the checkpoint."""
+        self.pages[lineage] = page_number
+        self.last_update = dict(state.last_update)
+        self.save(path)
+
+
 @dataclass
 class SampleRecord:
     biome_lineage: str
@@ -55,25 +172,128 @@ class RunRecord:
     experiment_type: Optional[str]
 
 
+class TokenBucket:
+    """Thread-safe token bucket: at most ``rate`` acquisitions per second on average.
+
+    ``burst`` tokens may be spent back to back after an idle period.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
 class MGnifyClient:
-    """Lightweight helper around the MGnify JSON:API endpoints."""
+    """Lightweight helper around the MGnify JSON:API endpoints.
+
+    Every HTTP request (including retries) first takes a token from a shared
+    :class:`TokenBucket`, so the configured rate limit holds no matter how many
+    pages are fetched concurrently.
+
+    ``concurrency`` is how many pages one :meth:`iter_pages` call keeps in
+    flight. ``max_connections`` (default ``concurrency``) caps the requests
+    in flight across the whole client: all background fetches run on one
+    shared thread pool of that size and every request holds a connection
+    slot, so callers sharing a client (e.g. parallel harvest threads) never
+    exceed the connection pool.
+    """
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        *,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_connections: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.max_connections = max(1, max_connections or self.concurrency)
+        if session is None:
+            session = requests.Session()
+            # One pooled keep-alive connection per connection slot
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self.limiter = TokenBucket(rate_limit)
+        self.cache = cache
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Created on first use and shared by every iter_pages / fetch_runs_for_samples call
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_connections, thread_name_prefix="mgnify"
+                )
+            return self._executor
 
-    def __init__(self, session: Optional[requests.Session] = None) -> None:
-        self.session = session or requests.Session()
+    def close(self) -> None:
+        """Shut down the shared worker pool (it is recreated if used again)."""
+
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
 
     def _request(self, method: str, url: str, *, params: Optional[Dict] = None) -> Dict:
+        headers = {"User-Agent": "MGnifyInsectaScraper/1.0"}
+        cache_key = cached = None
+        if self.cache is not None and method.upper() == "GET":
+            cache_key = self.cache.key(method, url, params)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
         last_error: Optional[Exception] = None
         for attempt in range(1, MAX_RETRIES + 1):
+            self.limiter.acquire()
             try:
-                response = self.session.request(
-                    method,
-                    url,
-                    params=params,
-                    timeout=REQUEST_TIMEOUT,
-                    headers={"User-Agent": "MGnifyInsectaScraper/1.0"},
-                )
+                with self._slots:
+                    response = self.session.request(
+                        method,
+                        url,
+                        params=params,
+                        timeout=REQUEST_TIMEOUT,
+                        headers=headers,
+                    )
+                if response.status_code == 304 and cached is not None:
+                    self.cache.hits += 1
+                    return cached["body"]
                 response.raise_for_status()
-                return response.json()
+                body = response.json()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if cache_key is not None and (etag or last_modified):
+                    self.cache.put(
+                        cache_key,
+                        {"url": url, "etag": etag, "last_modified": last_modified, "body": body},
+                    )
+                return body
             except requests.RequestException as exc:
                 last_error = exc
                 if attempt == MAX_RETRIES:
@@ -86,43 +306,126 @@ class MGnifyClient:
                 time.sleep(sleep_time)
         raise RuntimeError(f"Failed to fetch {url}: {last_error}")
 
+    def iter_pages(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        *,
+        start_page: int = 1,
+        concurrent: bool = True,
+    ) -> Iterator[Dict]:
+        """Yield every page of a paginated endpoint, in page order.
+
+        The first response's ``meta.pagination.pages`` gives the total page
+        count; the remaining pages are then requested on the client's shared
+        pool by page number (at most ``concurrency * 2`` queued per call).
+        With ``concurrent=False``, or for endpoints without pagination
+        metadata, pages are fetched serially by following ``links.next``.
+        Pages before ``start_page`` are skipped.
+        """
+
+        if start_page > 1:
+            params = {**(params or {}), "page": start_page}
+        first = self._request("GET", url, params=params)
+        yield first
+
+        pages = first.get("meta", {}).get("pagination", {}).get("pages")
+        if not pages or not concurrent:
+            next_url = first.get("links", {}).get("next")
+            while next_url:
+                # subsequent pages already include query params in URL
+                page = self._request("GET", next_url)
+                yield page
+                next_url = page.get("links", {}).get("next")
+            return
+
+        base_params = dict(params or {})
+        numbers = iter(range(start_page + 1, pages + 1))
+        pending: Deque[Future] = deque()
+        executor = self._pool()
+
+        def refill() -> None:
+            # Keep a bounded window of pages ahead of the consumer
+            while len(pending) < self.concurrency * 2:
+                number = next(numbers, None)
+                if number is None:
+                    return
+                page_params = {**base_params, "page": number}
+                pending.append(executor.submit(self._request, "GET", url, params=page_params))
+
+        try:
+            refill()
+            while pending:
+                page = pending.popleft().result()
+                refill()
+                yield page
+        finally:
+            # The consumer may stop early: drop queued pages, wait for in-flight ones
+            running = [future for future in pending if not future.cancel()]
+            wait(running)
+
     def iter_biome_samples(
-        self, biome_lineage: str, *, include_runs: bool = True
+        self,
+        biome_lineage: str,
+        *,
+        include_runs: bool = True,
+        ordering: Optional[str] = None,
+        start_page: int = 1,
     ) -> Iterable[Tuple[List[Dict], List[Dict]]]:
-        """Yield each page of samples (and optionally included runs) for a biome."""
+        """Yield each page of samples (and optionally included runs) for a biome.
+
+        ``ordering`` is passed through to the API (e.g. ``"-last_update"``).
+        """
 
         encoded_lineage = quote(biome_lineage, safe="")
         url = f"{BASE_URL}/biomes/{encoded_lineage}/samples"
-        params: Optional[Dict] = {
+        params: Dict = {
             "page_size": PAGE_SIZE,
             "include": "runs" if include_runs else None,
+            "ordering": ordering,
         }
 
-        while url:
-            page = self._request("GET", url, params=params)
+        for page in self.iter_pages(url, params, start_page=start_page):
             samples = page.get("data", [])
             included = page.get("included", []) if include_runs else []
             yield samples, included
 
-            next_url = page.get("links", {}).get("next")
-            url = next_url
-            params = None  # subsequent pages already include query params in URL
-            time.sleep(RATE_LIMIT_DELAY)
+    def iter_child_biomes(self, biome_lineage: str) -> Iterable[Dict]:
+        """Yield the biomes listed under ``biome_lineage`` in the MGnify biome tree."""
+
+        encoded_lineage = quote(biome_lineage, safe="")
+        url = f"{BASE_URL}/biomes/{encoded_lineage}/children"
+        for page in self.iter_pages(url, {"page_size": PAGE_SIZE}):
+            yield from page.get("data", [])
 
     def fetch_sample_runs(self, runs_url: str) -> List[Dict]:
-        """Fetch all runs for a given sample via the dedicated runs endpoint."""
+        """Fetch all runs for a given sample via the dedicated runs endpoint.
+
+        Pages are followed serially: this runs as a task on the shared pool
+        (see :meth:`fetch_runs_for_samples`) and must not queue more work there.
+        """
 
-        url = runs_url
-        params = None
         runs: List[Dict] = []
-        while url:
-            page = self._request("GET", url, params=params)
+        for page in self.iter_pages(runs_url, concurrent=False):
             runs.extend(page.get("data", []))
-            url = page.get("links", {}).get("next")
-            params = None
-            time.sleep(RATE_LIMIT_DELAY)
         return runs
 
+    def fetch_runs_for_samples(self, runs_urls: Dict[str, str]) -> Dict[str, List[Dict]]:
+        """Fetch the runs of many samples concurrently.
+
+        ``runs_urls`` maps a sample id to its runs link; the result maps the
+        same ids to their runs. Each sample is one task on the client's shared
+        pool, so requests still go through the shared rate limiter and
+        connection slots, but round trips overlap instead of running one per
+        sample.
+        """
+
+        if not runs_urls:
+            return {}
+        sample_ids = list(runs_urls)
+        results = self._pool().map(self.fetch_sample_runs, [runs_urls[s] for s in sample_ids])
+        return dict(zip(sample_ids, results))
+
 
 def extract_host_scientific_name(sample: Dict) -> Optional[str]:
     metadata = sample.get("attributes", {}).get("sample-metadata", [])
@@ -146,104 +449,422 @@ def build_run_index(included: List[Dict]) -> Dict[str, List[Dict]]:
     return run_map
 
 
-def collect_records(client: MGnifyClient) -> List[Dict[str, Optional[str]]]:
-    records: List[Dict[str, Optional[str]]] = []
-
-    for lineage, biome_name in BIOME_LINEAGES.items():
-        print(f"📥 Fetching samples for biome: {biome_name} ({lineage})")
+def missing_run_links(samples: List[Dict], run_index: Dict[str, List[Dict]]) -> Dict[str, str]:
+    """Runs links of the samples whose runs were not included in the page.
 
-        for samples, included in client.iter_biome_samples(lineage):
-            if not samples:
-                continue
+    They are looked up together, so a page costs one batch of overlapping
+    requests instead of one serial round trip per sample.
+    """
+    missing: Dict[str, str] = {}
+    for sample in samples:
+        sample_id = sample.get("id")
+        runs_link = sample.get("relationships", {}).get("runs", {}).get("links", {}).get("related")
+        if sample_id not in run_index and runs_link:
+            missing[sample_id] = runs_link
+    return missing
 
-            run_index = build_run_index(included)
 
-            for sample in samples:
-                sample_id = sample.get("id")
-                attributes = sample.get("attributes", {})
-                sample_accession = attributes.get("accession", sample_id)
-                host_name = extract_host_scientific_name(sample)
+def page_records(
+    lineage: str, biome_name: str, samples: List[Dict], run_index: Dict[str, List[Dict]]
+) -> List[Dict[str, Optional[str]]]:
+    """Flatten one page of samples and their runs into CSV records."""
+    records: List[Dict[str, Optional[str]]] = []
+    for sample in samples:
+        sample_id = sample.get("id")
+        attributes = sample.get("attributes", {})
+        sample_accession = attributes.get("accession", sample_id)
+        host_name = extract_host_scientific_name(sample)
+
+        sample_record = SampleRecord(
+            biome_lineage=lineage,
+            biome_name=biome_name,
+            sample_accession=sample_accession,
+            host_scientific_name=host_name,
+        )
 
-                sample_record = SampleRecord(
-                    biome_lineage=lineage,
-                    biome_name=biome_name,
-                    sample_accession=sample_accession,
-                    host_scientific_name=host_name,
-                )
+        runs = run_index.get(sample_id, [])
 
-                runs = run_index.get(sample_id, [])
-
-                if not runs and sample.get("relationships", {}).get("runs", {}).get(
-                    "links"
-                ):
-                    runs_link = sample["relationships"]["runs"]["links"].get("related")
-                    if runs_link:
-                        fetched_runs = client.fetch_sample_runs(runs_link)
-                        runs = []
-                        for run in fetched_runs:
-                            run_attrs = run.get("attributes", {})
-                            runs.append(
-                                {
-                                    "id": run.get("id"),
-                                    "attributes": run_attrs,
-                                    "relationships": run.get("relationships", {}),
-                                }
-                            )
-
-                if not runs:
-                    # No associated runs, skip sample (only analysed runs requested).
-                    continue
-
-                for run in runs:
-                    run_attrs = run.get("attributes", {})
-                    run_accession = run_attrs.get("accession") or run.get("id")
-                    experiment_type = run_attrs.get("experiment-type")
-
-                    records.append(
-                        {
-                            "biome_lineage": sample_record.biome_lineage,
-                            "biome_name": sample_record.biome_name,
-                            "sample_accession": sample_record.sample_accession,
-                            "host_scientific_name": sample_record.host_scientific_name,
-                            "run_accession": run_accession,
-                            "experiment_type": experiment_type,
-                        }
-                    )
+        if not runs:
+            # No associated runs, skip sample (only analysed runs requested).
+            continue
 
-    if not records:
+        for run in runs:
+            run_attrs = run.get("attributes", {})
+            run_accession = run_attrs.get("accession") or run.get("id")
+            experiment_type = run_attrs.get("experiment-type")
+
+            records.append(
+                {
+                    "biome_lineage": sample_record.biome_lineage,
+                    "biome_name": sample_record.biome_name,
+                    "sample_accession": sample_record.sample_accession,
+                    "host_scientific_name": sample_record.host_scientific_name,
+                    "run_accession": run_accession,
+                    "experiment_type": experiment_type,
+                }
+            )
+    return records
+
+
+def sample_last_update(sample: Dict) -> str:
+    return sample.get("attributes", {}).get("last-update") or ""
+
+
+def sample_biome(sample: Dict) -> Optional[str]:
+    """The sample's own (most specific) biome lineage, if the API included it."""
+    return sample.get("relationships", {}).get("biome", {}).get("data", {}).get("id")
+
+
+def record_key(record: Dict[str, Optional[str]]) -> Tuple[Optional[str], Optional[str]]:
+    return record["sample_accession"], record["run_accession"]
+
+
+class LineageScan:
+    """Page bookkeeping for one lineage, shared by the sync and async scrapers.
+
+    Every page's sample ``last-update`` values go into ``state``. With
+    ``since`` (incremental mode) samples not updated after it are dropped,
+    and :meth:`select` reports when paging can stop. ``partitions`` maps
+    sub-lineages to display names: a biome's sample list also contains the
+    samples of its sub-lineages, so :meth:`records` tags each sample with the
+    deepest of them that contains the sample's own biome.
+    """
+
+    def __init__(
+        self,
+        lineage: str,
+        *,
+        state: Optional[ScrapeState] = None,
+        since: Optional[str] = None,
+        partitions: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.lineage = lineage
+        self.state = state
+        self.since = since
+        # Deepest first, so the first match is the most specific lineage
+        self.partitions = sorted(
+            (sub for sub in partitions or () if sub.startswith(lineage + ":")),
+            key=lambda sub: sub.count(":"),
+            reverse=True,
+        )
+        self.names = dict(partitions or {})
+        # Early stopping is only safe while the API actually honours the
+        # requested ordering; otherwise the whole lineage is scanned.
+        self.ordered = True
+        self.oldest_seen: Optional[str] = None
+
+    @property
+    def ordering(self) -> Optional[str]:
+        """API ordering to request: newest first in incremental mode."""
+        return "-last_update" if self.since else None
+
+    def select(self, samples: List[Dict]) -> Optional[List[Dict]]:
+        """Return the samples of one page whose runs are needed, or ``None`` to stop paging."""
+        if not samples:
+            return []
+
+        updates = [sample_last_update(sample) for sample in samples]
+        if self.state is not None:
+            for last_update in updates:
+                self.state.observe(self.lineage, last_update)
+        if not self.since:
+            return samples
+
+        if any(a < b for a, b in zip(updates, updates[1:])) or (
+            self.oldest_seen is not None and updates[0] > self.oldest_seen
+        ):
+            self.ordered = False
+        self.oldest_seen = updates[-1]
+        samples = [sample for sample, update in zip(samples, updates) if not update or update > self.since]
+        if not samples and self.ordered:
+            return None
+        return samples
+
+    def partition_of(self, sample: Dict) -> str:
+        """The deepest partition lineage containing the sample's biome (else this lineage)."""
+        biome = sample_biome(sample)
+        if biome:
+            for sub in self.partitions:
+                if biome == sub or biome.startswith(sub + ":"):
+                    return sub
+        return self.lineage
+
+    def records(
+        self, biome_name: str, samples: List[Dict], run_index: Dict[str, List[Dict]]
+    ) -> List[Dict[str, Optional[str]]]:
+        """Flatten one selected page into CSV records (see :func:`page_records`)."""
+        if not self.partitions:
+            return page_records(self.lineage, biome_name, samples, run_index)
+        groups: Dict[str, List[Dict]] = {}
+        for sample in samples:
+            groups.setdefault(self.partition_of(sample), []).append(sample)
+        records: List[Dict[str, Optional[str]]] = []
+        for lineage, group in groups.items():
+            records.extend(page_records(lineage, self.names.get(lineage, biome_name), group, run_index))
+        return records
+
+
+def lineage_scans(
+    *,
+    state: Optional[ScrapeState] = None,
+    incremental: bool = False,
+    start_pages: Optional[Dict[str, int]] = None,
+    lineages: Optional[Dict[str, str]] = None,
+    partitions: Optional[Dict[str, str]] = None,
+) -> Iterator[Tuple[str, LineageScan, int]]:
+    """Yield ``(biome_name, scan, start_page)`` for each lineage to scrape, announcing it."""
+
+    previous = dict(state.last_update) if state is not None else {}
+    for lineage, biome_name in (lineages or BIOME_LINEAGES).items():
+        start_page = (start_pages or {}).get(lineage, 1)
+        resumed = f" from page {start_page}" if start_page > 1 else ""
+        print(f"📥 Fetching samples for biome: {biome_name} ({lineage}){resumed}")
+        since = previous.get(lineage) if incremental else None
+        yield biome_name, LineageScan(lineage, state=state, since=since, partitions=partitions), start_page
+
+
+def iter_record_pages(
+    client: MGnifyClient,
+    *,
+    state: Optional[ScrapeState] = None,
+    incremental: bool = False,
+    start_pages: Optional[Dict[str, int]] = None,
+    lineages: Optional[Dict[str, str]] = None,
+    partitions: Optional[Dict[str, str]] = None,
+) -> Iterator[Tuple[str, int, List[Dict[str, Optional[str]]]]]:
+    """Yield ``(lineage, page_number, records)`` for each sample page, as it arrives.
+
+    ``state`` is updated with the newest sample ``last-update`` per lineage.
+    With ``incremental`` only samples updated after the mark stored in
+    ``state`` are returned; samples are then requested newest first and
+    paging stops at the first page that is entirely older than the mark.
+    ``start_pages`` resumes each lineage at the given page number.
+    ``lineages`` maps lineage to display name (default: ``BIOME_LINEAGES``).
+    ``partitions`` re-tags samples of listed sub-lineages (see :class:`LineageScan`).
+    """
+
+    for biome_name, scan, start_page in lineage_scans(
+        state=state, incremental=incremental, start_pages=start_pages, lineages=lineages, partitions=partitions
+    ):
+        lineage = scan.lineage
+        pages = client.iter_biome_samples(lineage, ordering=scan.ordering, start_page=start_page)
+        for page_number, (samples, included) in enumerate(pages, start_page):
+            samples = scan.select(samples)
+            if samples is None:
+                break
+            records: List[Dict[str, Optional[str]]] = []
+            if samples:
+                run_index = build_run_index(included)
+                run_index.update(client.fetch_runs_for_samples(missing_run_links(samples, run_index)))
+                records = scan.records(biome_name, samples, run_index)
+            yield lineage, page_number, records
+        pages.close()
+
+
+def require_records(count: int, *, allow_empty: bool = False) -> None:
+    """Treat a scrape that found no run records as an API failure unless ``allow_empty``."""
+    if not count and not allow_empty:
         raise RuntimeError(
             "No run records were collected. Please verify the API availability."
         )
 
-    # Deduplicate records based on (sample, run)
+
+def unique_records(records: Iterable[Dict[str, Optional[str]]]) -> List[Dict[str, Optional[str]]]:
+    """Drop repeated (sample, run) pairs, keeping the first occurrence."""
     seen = set()
-    unique_records: List[Dict[str, Optional[str]]] = []
+    unique: List[Dict[str, Optional[str]]] = []
     for record in records:
-        key = (record["sample_accession"], record["run_accession"])
+        key = record_key(record)
         if key in seen:
             continue
         seen.add(key)
-        unique_records.append(record)
+        unique.append(record)
+    return unique
+
+
+def collect_records(
+    client: MGnifyClient,
+    *,
+    state: Optional[ScrapeState] = None,
+    incremental: bool = False,
+    lineages: Optional[Dict[str, str]] = None,
+    partitions: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, Optional[str]]]:
+    """Collect all run records in memory (see :func:`iter_record_pages`)."""
+
+    pages = iter_record_pages(
+        client, state=state, incremental=incremental, lineages=lineages, partitions=partitions
+    )
+    records = unique_records(record for _, _, page in pages for record in page)
+    require_records(len(records), allow_empty=incremental)
+    return records
+
+
+CSV_FIELDS = [
+    "biome_lineage",
+    "biome_name",
+    "sample_accession",
+    "host_scientific_name",
+    "run_accession",
+    "experiment_type",
+]
+
+
+def read_csv(path: Path) -> List[Dict[str, Optional[str]]]:
+    """Load a CSV previously written by :func:`write_csv` (empty if missing)."""
+    try:
+        with path.open(newline="", encoding="utf-8") as csvfile:
+            return [{name: row.get(name) or None for name in CSV_FIELDS} for row in csv.DictReader(csvfile)]
+    except FileNotFoundError:
+        return []
+
+
+def merge_records(
+    existing: List[Dict[str, Optional[str]]], updates: List[Dict[str, Optional[str]]]
+) -> List[Dict[str, Optional[str]]]:
+    """Replace the rows of every (biome, sample) present in ``updates``; keep the rest."""
+    updated = {(r["biome_lineage"], r["sample_accession"]) for r in updates}
+    kept = [r for r in existing if (r["biome_lineage"], r["sample_accession"]) not in updated]
+    return kept + updates
+
+
+class CSVStreamWriter:
+    """Append records to a CSV as pages arrive, dropping duplicate (sample, run) pairs.
+
+    Every :meth:`write` is flushed and fsynced before it returns, so a
+    checkpoint saved afterwards never points past data that is not on disk.
+    With ``resume`` the existing rows are kept (a torn last line from a crash
+    is cut off) and seed the duplicate set.
+    """
+
+    def __init__(self, path: Path, *, resume: bool = False) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        existing: List[Dict[str, Optional[str]]] = []
+        if resume and path.exists():
+            with path.open("rb+") as raw:
+                data = raw.read()
+                if data and not data.endswith(b"\n"):
+                    raw.truncate(data.rfind(b"\n") + 1)
+            existing = read_csv(path)
+        self.seen = {record_key(record) for record in existing}
+        self.count = len(existing)
+        append = resume and path.exists() and path.stat().st_size > 0
+        self._handle = path.open("a" if append else "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._handle, fieldnames=CSV_FIELDS)
+        if not append:
+            self._writer.writeheader()
+
+    def write(self, records: Iterable[Dict[str, Optional[str]]]) -> int:
+        written = 0
+        for record in records:
+            key = record_key(record)
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            self._writer.writerow(record)
+            written += 1
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self.count += written
+        return written
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def __enter__(self) -> "CSVStreamWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def open_checkpoint(output_path: Path, state: ScrapeState, *, restart: bool = False) -> Tuple[Checkpoint, Path, bool]:
+    """Return ``(checkpoint, checkpoint_path, resume)`` for a full scrape into ``output_path``.
+
+    When an interrupted scrape is resumed, ``state`` gets its marks back.
+    """
+
+    checkpoint_path = output_path.with_name(output_path.name + CHECKPOINT_SUFFIX)
+    checkpoint = None if restart else Checkpoint.load(checkpoint_path)
+    resume = checkpoint is not None and output_path.exists()
+    if resume:
+        print(f"⏯️  Resuming interrupted scrape from {checkpoint_path}")
+        for lineage, last_update in checkpoint.last_update.items():
+            state.observe(lineage, last_update)
+    else:
+        checkpoint = Checkpoint()
+    return checkpoint, checkpoint_path, resume
+
+
+def finish_stream(output_path: Path, checkpoint_path: Path, count: int, *, allow_empty: bool = False) -> int:
+    """Drop the checkpoint of a finished full scrape; returns ``count``."""
+
+    require_records(count, allow_empty=allow_empty)
+    checkpoint_path.unlink()
+    print(f"✅ CSV saved to {output_path}")
+    print(f"   Total records: {count}")
+    return count
+
+
+def stream_records(
+    client: MGnifyClient,
+    output_path: Path,
+    state: ScrapeState,
+    *,
+    restart: bool = False,
+    lineages: Optional[Dict[str, str]] = None,
+    partitions: Optional[Dict[str, str]] = None,
+    allow_empty: bool = False,
+) -> int:
+    """Full scrape that appends each page to ``output_path`` and checkpoints it.
+
+    Returns the number of rows in the CSV. Finding no runs at all is an error
+    unless ``allow_empty`` (e.g. for a biome that simply has no analysed runs).
+    """
+
+    checkpoint, checkpoint_path, resume = open_checkpoint(output_path, state, restart=restart)
+    with CSVStreamWriter(output_path, resume=resume) as writer:
+        for lineage, page_number, records in iter_record_pages(
+            client, state=state, start_pages=checkpoint.pages, lineages=lineages, partitions=partitions
+        ):
+            writer.write(records)
+            checkpoint.advance(checkpoint_path, lineage, page_number, state)
+    return finish_stream(output_path, checkpoint_path, writer.count, allow_empty=allow_empty)
+
+
+def use_incremental(output_path: Path, incremental: bool) -> bool:
+    """Whether an incremental scrape can update ``output_path`` (else run a full one)."""
 
-    return unique_records
+    checkpoint_path = output_path.with_name(output_path.name + CHECKPOINT_SUFFIX)
+    run_incremental = incremental and output_path.exists() and not checkpoint_path.exists()
+    if incremental and not run_incremental:
+        print(f"ℹ️  No complete {output_path} to update yet; running a full scrape.")
+    return run_incremental
+
+
+def merge_into_csv(output_path: Path, records: List[Dict[str, Optional[str]]]) -> int:
+    """Merge incremental ``records`` into the CSV at ``output_path``; returns its row count."""
+
+    print(f"🔄 {len(records)} new or updated records")
+    records = merge_records(read_csv(output_path), records)
+    write_csv(records, output_path)
+    return len(records)
 
 
 def write_csv(records: List[Dict[str, Optional[str]]], output_path: Path) -> None:
+    """Replace ``output_path`` atomically: an interrupted write leaves the old CSV intact."""
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    fieldnames = [
-        "biome_lineage",
-        "biome_name",
-        "sample_accession",
-        "host_scientific_name",
-        "run_accession",
-        "experiment_type",
-    ]
-
-    with output_path.open("w", newline="", encoding="utf-8") as csvfile:
+    fieldnames = CSV_FIELDS
+
+    tmp = output_path.with_name(output_path.name + ".tmp")
+    with tmp.open("w", newline="", encoding="utf-8") as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
         for row in records:
             writer.writerow(row)
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+    os.replace(tmp, output_path)
 
     print(f"✅ CSV saved to {output_path}")
     print(f"   Total records: {len(records)}")
@@ -259,15 +880,90 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
         default=Path(DEFAULT_OUTPUT),
         help=f"Path to the CSV output file (default: {DEFAULT_OUTPUT}).",
     )
-    return parser.parse_args(argv)
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=DEFAULT_RATE_LIMIT,
+        help=f"Maximum API requests per second across all threads (default: {DEFAULT_RATE_LIMIT}).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Number of pages fetched in parallel (default: {DEFAULT_CONCURRENCY}).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch samples updated since the previous scrape and merge them into --output.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(DEFAULT_CACHE_DIR),
+        help=f"Directory for cached API responses revalidated with ETag/Last-Modified (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk response cache.")
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore an existing checkpoint and start the full scrape from the first page.",
+    )
+    args = parser.parse_args(argv)
+    if args.rate_limit <= 0:
+        parser.error("--rate-limit must be positive")
+    return args
+
+
+def scrape(
+    client: MGnifyClient,
+    output_path: Path,
+    *,
+    incremental: bool = False,
+    restart: bool = False,
+    lineages: Optional[Dict[str, str]] = None,
+    partitions: Optional[Dict[str, str]] = None,
+    allow_empty: bool = False,
+) -> int:
+    """Scrape ``lineages`` into ``output_path`` (full, resumed or incremental).
+
+    With ``partitions`` (sub-lineage -> name) rows are tagged with the
+    deepest listed lineage of each sample's own biome. Returns the number of
+    rows in the CSV.
+    """
+
+    state_path = output_path.with_name(output_path.name + STATE_SUFFIX)
+    state = ScrapeState.load(state_path)
+    if use_incremental(output_path, incremental):
+        records = collect_records(
+            client, state=state, incremental=True, lineages=lineages, partitions=partitions
+        )
+        count = merge_into_csv(output_path, records)
+    else:
+        count = stream_records(
+            client,
+            output_path,
+            state,
+            restart=restart,
+            lineages=lineages,
+            partitions=partitions,
+            allow_empty=allow_empty,
+        )
+    state.save(state_path)
+    return count
 
 
 def main(argv: Optional[List[str]] = None) -> None:
     args = parse_args(argv)
-    client = MGnifyClient()
-
-    records = collect_records(client)
-    write_csv(records, args.output)
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+    client = MGnifyClient(rate_limit=args.rate_limit, concurrency=args.concurrency, cache=cache)
+
+    try:
+        scrape(client, args.output, incremental=args.incremental, restart=args.restart)
+    finally:
+        client.close()
+    if cache is not None and cache.hits:
+        print(f"   Served {cache.hits} unchanged responses from the cache")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""Columnar (Parquet) copies of scraped MGnify run metadata.
+
+The CSVs written by ``mgnify_insecta_scraper`` / ``mgnify_harvester`` repeat
+the same ``biome_lineage``, ``biome_name``, ``host_scientific_name`` and
+``experiment_type`` strings on every row. This module converts them into a
+Parquet dataset that downstream code can filter without loading everything:
+
+* categorical columns are dictionary-encoded (one small dictionary plus
+  integer codes per column chunk; read back as ``pandas`` categoricals)
+* the dataset is hive-partitioned by biome
+  (``{dataset}/biome=root_Host-associated_Insecta/part-0.parquet``), so a
+  biome filter only opens that biome's files
+* readers only decode the columns they ask for
+
+Requires ``pyarrow`` (``pip install pyarrow``).
+
+Usage
+-----
+python mgnify_parquet.py mgnify_harvest                    # every harvested partition
+python mgnify_parquet.py insecta_runs.csv --dataset insecta_runs.parquet
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+
+from mgnify_harvester import MANIFEST_NAME, load_manifest, partition_name
+from mgnify_insecta_scraper import CSV_FIELDS
+
+DEFAULT_DATASET_DIR = "parquet"  # inside a harvest directory
+PARTITION_KEY = "biome"
+PART_FILE = "part-0.parquet"
+COMPRESSION = "zstd"
+# Low-cardinality columns stored as dictionaries
+CATEGORICAL_FIELDS = ("biome_lineage", "biome_name", "host_scientific_name", "experiment_type")
+# Rows sorted so equal categories form runs, which Parquet run-length encodes
+SORT_FIELDS = ("host_scientific_name", "experiment_type", "sample_accession", "run_accession")
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("Parquet output requires pyarrow: pip install pyarrow")
+
+
+def run_schema() -> "pa.Schema":
+    """Arrow schema of one partition file (the partition key lives in the path)."""
+
+    _require_pyarrow()
+    return pa.schema(
+        [
+            (name, pa.dictionary(pa.int32(), pa.string()) if name in CATEGORICAL_FIELDS else pa.string())
+            for name in CSV_FIELDS
+        ]
+    )
+
+
+def records_to_table(records: Iterable[Dict[str, Optional[str]]]) -> "pa.Table":
+    """Build an Arrow table (plain string columns) from scraper records."""
+
+    _require_pyarrow()
+    records = list(records)
+    return pa.table({name: pa.array([record.get(name) for record in records], type=pa.string()) for name in CSV_FIELDS})
+
+
+def read_csv_table(csv_path: Path) -> "pa.Table":
+    """Read a scraper CSV straight into Arrow (empty cells become nulls)."""
+
+    _require_pyarrow()
+    convert = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in CSV_FIELDS},
+        include_columns=list(CSV_FIELDS),
+        strings_can_be_null=True,
+    )
+    return pa_csv.read_csv(str(csv_path), convert_options=convert)
+
+
+def encode_table(table: "pa.Table") -> "pa.Table":
+    """Sort the rows and dictionary-encode the categorical columns."""
+
+    if table.num_rows:
+        table = table.sort_by([(name, "ascending") for name in SORT_FIELDS])
+    return table.select(CSV_FIELDS).cast(run_schema())
+
+
+def write_partition(table: "pa.Table", dataset_dir: Path, lineage: str) -> Path:
+    """Atomically replace the partition of ``lineage`` with ``table``."""
+
+    directory = Path(dataset_dir) / f"{PARTITION_KEY}={partition_name(lineage)}"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / PART_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    pq.write_table(encode_table(table), str(tmp), compression=COMPRESSION, use_dictionary=list(CATEGORICAL_FIELDS))
+    os.replace(tmp, path)
+    return path
+
+
+def write_parquet(table: "pa.Table", dataset_dir: Path) -> Dict[str, int]:
+    """Write ``table`` into one partition per biome lineage; returns rows per lineage.
+
+    Partitions of lineages absent from ``table`` are left untouched, so
+    several CSVs can be converted into the same dataset.
+    """
+
+    _require_pyarrow()
+    counts: Dict[str, int] = {}
+    for lineage in pc.unique(table["biome_lineage"]).to_pylist():
+        if lineage is None:
+            continue
+        part = table.filter(pc.equal(table["biome_lineage"], lineage))
+        write_partition(part, dataset_dir, lineage)
+        counts[lineage] = part.num_rows
+    return counts
+
+
+def convert_csv(csv_path: Path, dataset_dir: Path) -> Dict[str, int]:
+    """Convert one scraper CSV into ``dataset_dir``."""
+
+    return write_parquet(read_csv_table(csv_path), dataset_dir)
+
+
+def convert_harvest(harvest_dir: Path, dataset_dir: Optional[Path] = None, *, force: bool = False) -> Dict[str, int]:
+    """Convert the complete partitions of a harvest; returns rows per converted lineage.
+
+    A partition is only rewritten when its CSV is newer than its Parquet
+    file (or ``force`` is set), so re-running after an incremental harvest
+    converts just the biomes that changed. Empty partitions are written too,
+    which keeps the dataset's biome list in line with the manifest.
+    """
+
+    _require_pyarrow()
+    harvest_dir = Path(harvest_dir)
+    dataset_dir = Path(dataset_dir) if dataset_dir is not None else harvest_dir / DEFAULT_DATASET_DIR
+    converted: Dict[str, int] = {}
+    for lineage, entry in sorted(load_manifest(harvest_dir / MANIFEST_NAME).items()):
+        if entry.get("status") != "complete":
+            continue
+        csv_path = harvest_dir / entry["file"]
+        target = dataset_dir / f"{PARTITION_KEY}={partition_name(lineage)}" / PART_FILE
+        if not csv_path.exists():
+            continue
+        if not force and target.exists() and target.stat().st_mtime >= csv_path.stat().st_mtime:
+            continue
+        table = read_csv_table(csv_path)
+        write_partition(table, dataset_dir, lineage)
+        converted[lineage] = table.num_rows
+    return converted
+
+
+def _filter_expression(filters: Dict[str, Union[str, Iterable[str]]]) -> Optional["pa_ds.Expression"]:
+    expression = None
+    for name, wanted in filters.items():
+        values = [wanted] if isinstance(wanted, str) else list(wanted)
+        term = pc.field(name).isin(values)
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def open_dataset(dataset_dir: Path) -> "pa_ds.Dataset":
+    """Open a dataset written by :func:`write_parquet` (no data is read yet)."""
+
+    _require_pyarrow()
+    # Partition values are read as a dictionary too, i.e. a categorical ``biome``
+    partitioning = pa_ds.HivePartitioning.discover(infer_dictionary=True)
+    return pa_ds.dataset(str(dataset_dir), format="parquet", partitioning=partitioning)
+
+
+def load_runs(
+    dataset_dir: Path,
+    *,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Union[str, Iterable[str]]]] = None,
+):
+    """Load runs as a ``pandas.DataFrame`` with categorical columns.
+
+    ``columns`` limits the decoded columns; ``filters`` maps a column to one
+    or more accepted values, e.g.
+    ``{"biome": "root_Host-associated_Insecta", "experiment_type": ["amplicon"]}``.
+    Filters on ``biome`` skip whole partitions, the others use the row-group
+    statistics before any row is decoded.
+    """
+
+    dataset = open_dataset(dataset_dir)
+    expression = _filter_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Convert scraped MGnify run CSVs into a partitioned Parquet dataset.")
+    parser.add_argument("source", type=Path, help="A harvest directory (with manifest.json) or a scraper CSV.")
+    parser.add_argument(
+        "--dataset",
+        type=Path,
+        default=None,
+        help=f"Output dataset directory (default: {{harvest}}/{DEFAULT_DATASET_DIR} or {{csv}} with .parquet).",
+    )
+    parser.add_argument("--force", action="store_true", help="Rewrite partitions even if they are up to date.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.source.is_dir():
+        counts = convert_harvest(args.source, args.dataset, force=args.force)
+        dataset_dir = args.dataset or args.source / DEFAULT_DATASET_DIR
+    else:
+        dataset_dir = args.dataset or args.source.with_suffix(".parquet")
+        counts = convert_csv(args.source, dataset_dir)
+    for lineage, rows in counts.items():
+        print(f"   {lineage}: {rows} rows")
+    print(f"✅ {len(counts)} partition(s) written to {dataset_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+共用的即時進度顯示
+Shared progress renderer for in-flight runs
+
+所有進行中的 run 登記在同一張狀態表 (run_id → 階段、開始時間、位元組數、
+預期大小、即時 MB/s)，
+由單一背景執行緒每秒重繪一行狀態列，取代每個指令各自一個計時執行緒。
+一般訊息請透過 echo() 輸出，會先清掉狀態列再印出，避免互相覆蓋。
+輸出不是終端機時 (例如導向檔案)，改為每 60 秒印一次完整清單。
+"""
+
+import shutil
+import sys
+import threading
+import time
+import unicodedata
+
+RENDER_INTERVAL = 1.0  # 秒
+LOG_INTERVAL = 60.0  # 非終端機輸出時的清單間隔 (秒)
+RATE_SMOOTHING = 0.3  # 即時速度的指數移動平均係數
+
+
+def format_bytes(nbytes):
+    size = float(nbytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def display_width(text):
+    """終端機顯示寬度 (中文等全形字元佔兩格)"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1 for ch in text)
+
+
+def truncate(text, width):
+    """依顯示寬度截斷字串"""
+    if display_width(text) <= width:
+        return text
+    out = []
+    used = 0
+    for ch in text:
+        w = display_width(ch)
+        if used + w > width - 1:
+            break
+        out.append(ch)
+        used += w
+    return "".join(out) + "…"
+
+
+class RunProgress:
+    """狀態表中的一列"""
+
+    __slots__ = (
+        "run_id",
+        "stage",
+        "start",
+        "stage_start",
+        "bytes",
+        "expected",
+        "rate",
+        "_sample_bytes",
+        "_sample_time",
+    )
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.stage = "queued"
+        self.start = time.time()
+        self.stage_start = self.start
+        self.bytes = 0
+        self.expected = None  # 預期大小 (bytes)，未知為 None
+        self.rate = 0.0  # bytes/s
+        self._sample_bytes = 0
+        self._sample_time = self.start
+
+    def sample(self, nbytes, now):
+        """更新位元組數並計算即時速度"""
+        seconds = now - self._sample_time
+        if seconds > 0 and nbytes >= self._sample_bytes:
+            current = (nbytes - self._sample_bytes) / seconds
+            self.rate = current if not self.rate else (
+                RATE_SMOOTHING * current + (1 - RATE_SMOOTHING) * self.rate
+            )
+        self._sample_bytes = nbytes
+        self._sample_time = now
+        self.bytes = nbytes
+
+    def progress_text(self):
+        text = format_bytes(self.bytes) if self.bytes else ""
+        if self.expected:
+            text = f"{format_bytes(self.bytes)}/{format_bytes(self.expected)}"
+        if self.rate:
+            text += f" {format_bytes(self.rate)}/s"
+        return text.strip()
+
+
+class ProgressBoard:
+    """執行緒安全的進度狀態表 + 單一繪製執行緒"""
+
+    def __init__(self, stream=None, interval=RENDER_INTERVAL):
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.runs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._status_width = 0
+        self._last_log = 0.0
+        self.is_tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+
+    # ------------------------------------------------------------------
+    # 狀態更新 (由工作執行緒呼叫)
+    # ------------------------------------------------------------------
+    def start_stage(self, run_id, stage):
+        with self._lock:
+            run = self.runs.get(run_id)
+            if run is None:
+                run = self.runs[run_id] = RunProgress(run_id)
+            run.stage = stage
+            run.stage_start = time.time()
+            run.bytes = 0
+            run.rate = 0.0
+            run._sample_bytes = 0
+            run._sample_time = run.stage_start
+
+    def set_expected(self, run_id, nbytes):
+        with self._lock:
+            run = self.runs.get(run_id)
+            if run is not None:
+                run.expected = nbytes
+
+    def set_bytes(self, run_id, nbytes):
+        """更新目前階段已處理的位元組數 (同時計算即時速度)"""
+        with self._lock:
+            run = self.runs.get(run_id)
+            if run is not None:
+                run.sample(nbytes, time.time())
+
+    def finish(self, run_id):
+        with self._lock:
+            self.runs.pop(run_id, None)
+
+    def snapshot(self):
+        """回傳目前狀態表的副本 [(run_id, 階段, 階段秒數, 總秒數, 進度文字)]"""
+        now = time.time()
+        with self._lock:
+            return [
+                (r.run_id, r.stage, now - r.stage_start, now - r.start, r.progress_text())
+                for r in self.runs.values()
+            ]
+
+    def in_flight_bytes(self, stage):
+        """某階段進行中的 run 已處理的位元組數 {run_id: bytes}"""
+        with self._lock:
+            return {r.run_id: r.bytes for r in self.runs.values() if r.stage == stage}
+
+    def aggregate_rate(self, stage=None):
+        """所有 (或某階段) 進行中 run 的即時速度總和 (bytes/s)"""
+        with self._lock:
+            return sum(r.rate for r in self.runs.values() if stage is None or r.stage == stage)
+
+    # ------------------------------------------------------------------
+    # 輸出
+    # ------------------------------------------------------------------
+    def echo(self, message):
+        """印出一般訊息 (先清掉狀態列)"""
+        with self._lock:
+            self._clear_status()
+            self.stream.write(message + "\n")
+            self.stream.flush()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="progress-board", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        with self._lock:
+            self._clear_status()
+            self.stream.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.render()
+
+    def render(self):
+        rows = self.snapshot()
+        if self.is_tty:
+            self._render_status_line(rows)
+        elif rows and time.time() - self._last_log >= LOG_INTERVAL:
+            self._last_log = time.time()
+            lines = [f"⏳ 進行中 {len(rows)} 個:"]
+            for run_id, stage, stage_secs, total_secs, progress in sorted(rows):
+                lines.append(
+                    f"    {run_id:<14}{stage:<14}{int(stage_secs):>6}秒  (共 {int(total_secs)}秒) {progress}"
+                )
+            self.echo("\n".join(lines))
+
+    def _render_status_line(self, rows):
+        if not rows:
+            with self._lock:
+                self._clear_status()
+            return
+        # 依階段排序，每個 run 顯示階段、該階段秒數與位元組進度
+        parts = []
+        for run_id, stage, stage_secs, _, progress in sorted(rows, key=lambda r: (r[1], r[0])):
+            item = f"{run_id} {stage} {int(stage_secs)}s"
+            if progress:
+                item += f" {progress}"
+            parts.append(item)
+        line = f"⏳ {len(rows)} 進行中"
+        total_rate = self.aggregate_rate()
+        if total_rate:
+            line += f" {format_bytes(total_rate)}/s"
+        line += " | " + " | ".join(parts)
+
+        line = truncate(line, shutil.get_terminal_size((120, 20)).columns - 1)
+        width = display_width(line)
+        with self._lock:
+            self.stream.write("\r" + line + " " * max(0, self._status_width - width))
+            self.stream.flush()
+            self._status_width = width
+
+    def _clear_status(self):
+        if self._status_width:
+            self.stream.write("\r" + " " * self._status_width + "\r")
+            self._status_width = 0
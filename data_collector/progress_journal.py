@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+下載進度日誌與 run 狀態索引 (append-only JSON-lines)
+Crash-safe progress journal and run-state index for batch_fastq_downloader
+
+每筆事件以單一 write() 追加一行 JSON，不再整份重寫 download_progress.json；
+載入時單次串流把每個 accession 的狀態 (state / step / bytes / timings)
+重建到 dict 與 set 中，之後的跳過判斷都是常數時間。
+最後一行若因當機而不完整會被略過，日誌累積一定筆數後自動壓縮為快照
+(寫入暫存檔後 os.replace 原子替換)。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+JOURNAL_NAME = "download_progress.jsonl"
+LEGACY_NAME = "download_progress.json"
+COMPACT_EVERY = 1000  # 追加多少筆事件後壓縮一次
+
+
+# run 狀態
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_COMPLETED = "completed"
+STATE_FAILED = "failed"
+
+
+class RunState:
+    """單一 accession 的狀態記錄"""
+
+    __slots__ = ("run_id", "state", "step", "bytes", "timings", "info", "size_mb", "updated")
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.state = STATE_PENDING
+        self.step = None  # 最後完成的步驟
+        self.bytes = {}  # step -> bytes
+        self.timings = {}  # step -> 秒
+        self.info = {}  # step -> 額外資訊 (例如壓縮比)
+        self.size_mb = 0.0
+        self.updated = None
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "state": self.state,
+            "step": self.step,
+            "bytes": self.bytes,
+            "timings": self.timings,
+            "info": self.info,
+            "size_mb": self.size_mb,
+            "updated": self.updated,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        run = cls(data["run_id"])
+        run.state = data.get("state", STATE_PENDING)
+        run.step = data.get("step")
+        run.bytes = data.get("bytes") or {}
+        run.timings = data.get("timings") or {}
+        run.info = data.get("info") or {}
+        run.size_mb = data.get("size_mb", 0.0)
+        run.updated = data.get("updated")
+        return run
+
+
+class ProgressJournal:
+    """執行緒安全的進度日誌 / run 狀態索引"""
+
+    def __init__(self, path, legacy_path=None, compact_every=COMPACT_EVERY, fsync=True):
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self.runs = {}  # run_id -> RunState
+        self.completed = set()
+        self.failed = {}  # run_id -> 最近一次失敗記錄
+        self.start_time = None
+        self.last_update = None
+        self._base_size_mb = 0.0  # 舊格式只有總量，沒有逐筆大小
+        self._completed_size_mb = 0.0
+        self._appended = 0
+        self._fd = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 載入
+    # ------------------------------------------------------------------
+    def load(self, read_only=False):
+        """
+        單次串流讀取日誌，重建 run 狀態索引
+
+        read_only: 只讀取 (不匯入舊版、不截斷殘行、不開啟寫入)，
+        供其他工具在下載器執行中查詢狀態
+        """
+        with self._lock:
+            if read_only:
+                if self.path.exists():
+                    self._replay(truncate=False)
+                return self
+            if not self.path.exists() and self.legacy_path and self.legacy_path.exists():
+                self._import_legacy()
+                self._write_snapshot()
+            elif self.path.exists():
+                self._replay()
+
+            if self.start_time is None:
+                self.start_time = datetime.now().isoformat()
+                self._open()
+                self._append({"event": "meta", "start_time": self.start_time})
+            else:
+                self._open()
+        return self
+
+    def _replay(self, truncate=True):
+        good_offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 未寫完的最後一行 (當機時被截斷)
+                good_offset += len(line)
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(event)
+
+        # 截掉不完整的尾巴，避免下一筆追加接在殘行後面
+        if truncate and good_offset < self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(good_offset)
+
+    def _run(self, run_id):
+        run = self.runs.get(run_id)
+        if run is None:
+            run = self.runs[run_id] = RunState(run_id)
+        return run
+
+    def _set_state(self, run, state):
+        if run.state == STATE_COMPLETED:
+            self.completed.discard(run.run_id)
+            self._completed_size_mb -= run.size_mb
+        if state == STATE_COMPLETED:
+            self.completed.add(run.run_id)
+            self._completed_size_mb += run.size_mb
+            self.failed.pop(run.run_id, None)
+        run.state = state
+
+    def _apply(self, event):
+        kind = event.get("event")
+        run_id = event.get("run_id")
+        if event.get("time"):
+            self.last_update = event["time"]
+
+        if kind == "meta":
+            self.start_time = event.get("start_time", self.start_time)
+            self._base_size_mb = event.get("base_size_mb", self._base_size_mb)
+            return
+        if run_id is None:
+            return
+
+        if kind == "run":
+            # 快照中的完整狀態
+            old = self.runs.get(run_id)
+            if old is not None:
+                self._set_state(old, STATE_PENDING)
+            run = self.runs[run_id] = RunState.from_dict(event)
+            state, run.state = run.state, STATE_PENDING
+            self._set_state(run, state)
+            if event.get("failure"):
+                self.failed[run_id] = event["failure"]
+            return
+
+        run = self._run(run_id)
+        run.updated = event.get("time", run.updated)
+        if kind == "step":
+            step = event.get("step")
+            run.step = step
+            run.timings[step] = event.get("seconds", 0.0)
+            if event.get("bytes"):
+                run.bytes[step] = event["bytes"]
+            if event.get("info"):
+                run.info[step] = event["info"]
+            if run.state != STATE_COMPLETED:
+                self._set_state(run, STATE_RUNNING)
+        elif kind == "completed":
+            if run.state == STATE_COMPLETED:
+                self._set_state(run, STATE_PENDING)
+            run.size_mb = event.get("size_mb", 0.0)
+            self._set_state(run, STATE_COMPLETED)
+        elif kind == "failed":
+            # 失敗處理時已刪除輸出的步驟不再視為完成，重試時重新執行
+            for step in event.get("invalidated") or ():
+                run.timings.pop(step, None)
+                run.bytes.pop(step, None)
+                run.info.pop(step, None)
+                if run.step == step:
+                    run.step = None
+            self._set_state(run, STATE_FAILED)
+            previous = self.failed.get(run_id) or {}
+            self.failed[run_id] = {
+                "run_id": run_id,
+                "step": event.get("step"),
+                "error": event.get("error", ""),
+                "kind": event.get("kind"),
+                "permanent": event.get("permanent", False),
+                "attempts": event.get("attempts", previous.get("attempts", 0) + 1),
+                "time": event.get("time"),
+            }
+
+    def _import_legacy(self):
+        """匯入舊版 download_progress.json"""
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        self.start_time = data.get("start_time")
+        self.last_update = data.get("last_update")
+        self._base_size_mb = data.get("total_size_mb", 0.0)
+        for item in data.get("failed", []):
+            self._apply(dict(item, event="failed"))
+        for item in data.get("completed", []):
+            # 處理舊格式（dict）轉新格式（string）
+            run_id = item["run_id"] if isinstance(item, dict) else item
+            self._apply({"event": "completed", "run_id": run_id})
+        print(f"📦 已匯入舊版進度檔 {self.legacy_path.name} ({len(self.completed)} 個已完成)")
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+    def is_completed(self, run_id):
+        return run_id in self.completed
+
+    def get(self, run_id):
+        """取得 run 狀態 (不存在時回傳 None)"""
+        return self.runs.get(run_id)
+
+    def is_permanent_failure(self, run_id):
+        """上次失敗是否為永久性 (例如 accession 不存在)"""
+        failure = self.failed.get(run_id)
+        return bool(failure and failure.get("permanent"))
+
+    def done_steps(self, run_id):
+        """上次中斷或失敗前已完成、且輸出未被刪除的步驟 (用於續傳)"""
+        run = self.runs.get(run_id)
+        if run is None or run.state == STATE_COMPLETED:
+            return set()
+        return set(run.timings)
+
+    @property
+    def total_size_mb(self):
+        return self._base_size_mb + self._completed_size_mb
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+    def record_step(self, run_id, step, seconds, nbytes=0, info=None):
+        """記錄某個步驟完成"""
+        event = {
+            "event": "step",
+            "run_id": run_id,
+            "step": step,
+            "seconds": round(seconds, 3),
+            "bytes": nbytes,
+        }
+        if info:
+            event["info"] = info
+        self._record(event)
+
+    def record_completed(self, run_id, size_mb):
+        self._record({"event": "completed", "run_id": run_id, "size_mb": round(size_mb, 3)})
+
+    def record_failed(self, run_id, step, error, kind=None, permanent=False, invalidated=None):
+        """記錄失敗；invalidated 為輸出已被刪除、之後必須重新執行的步驟"""
+        event = {
+            "event": "failed",
+            "run_id": run_id,
+            "step": step,
+            "error": (error or "")[:200],
+            "kind": kind,
+            "permanent": permanent,
+        }
+        if invalidated:
+            event["invalidated"] = sorted(invalidated)
+        self._record(event)
+
+    def compact(self):
+        """將目前狀態寫成快照，取代累積的事件"""
+        with self._lock:
+            self._write_snapshot()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                if self._appended:
+                    self._write_snapshot()
+                os.close(self._fd)
+                self._fd = None
+
+    def _record(self, event):
+        event["time"] = datetime.now().isoformat()
+        with self._lock:
+            self._apply(event)
+            self._append(event)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        self._fd = os.open(self.path, flags, 0o644)
+
+    def _append(self, event):
+        line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+        os.write(self._fd, line)  # 單次 write: 整行追加
+        if self.fsync:
+            os.fsync(self._fd)
+        self._appended += 1
+        if self._appended >= self.compact_every:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        self.start_time = self.start_time or datetime.now().isoformat()
+        with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+            meta = {
+                "event": "meta",
+                "start_time": self.start_time,
+                "base_size_mb": self._base_size_mb,
+                "time": self.last_update,
+            }
+            f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+            for run in self.runs.values():
+                record = run.to_dict()
+                record["event"] = "run"
+                if run.run_id in self.failed:
+                    record["failure"] = self.failed[run.run_id]
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        reopen = self._fd is not None
+        if reopen:
+            os.close(self._fd)
+        os.replace(tmp_path, self.path)
+        if reopen:
+            self._open()
+        self._appended = 0
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+失敗分類與重試排程
+Failure classification and in-session retry scheduling for SRA runs
+
+prefetch / fasterq-dump 的錯誤訊息分為:
+
+* timeout            逾時                 → 同一批次內退避後重試
+* network            連線 / HTTP 錯誤      → 同一批次內退避後重試
+* md5_mismatch       備份的 .sra MD5 不符  → 同一批次內重新下載一次
+* auth               存取被拒 / 未授權     → 同一批次內退避後重試一次 (可能是暫時性的授權問題)
+* unknown            無法判斷             → 同一批次內退避後重試 (次數較少)
+* disk_full          磁碟空間不足          → 本批次不再重試，下次執行再試
+* missing_accession  accession 不存在     → 永久失敗，之後的批次直接跳過
+                     (只認 prefetch / SDL 解析 accession 失敗的訊息，一般的 404 不算)
+
+重試延遲為指數退避加上隨機抖動: base * 2^(n-1) * U(0.5, 1.5)，上限 max_delay。
+"""
+
+import heapq
+import random
+import re
+import threading
+import time
+
+TIMEOUT = "timeout"
+NETWORK = "network"
+DISK_FULL = "disk_full"
+MISSING_ACCESSION = "missing_accession"
+MD5_MISMATCH = "md5_mismatch"
+AUTH = "auth"
+UNKNOWN = "unknown"
+
+# 依序比對，先符合者為準 (SDL 的 403 訊息也含 "failed to resolve accession"，授權要比
+# accession 不存在先判斷；accession 不存在的 404 要比一般 HTTP 錯誤先判斷)
+_PATTERNS = [
+    (MD5_MISMATCH, re.compile(r"md5 mismatch", re.I)),
+    (TIMEOUT, re.compile(r"timeout|timed out", re.I)),
+    (
+        DISK_FULL,
+        re.compile(r"no space left|disk.?limit|disk full|not enough space|storage exhausted|errno 28", re.I),
+    ),
+    (AUTH, re.compile(r"access denied|unauthori[sz]ed|forbidden|\(\s*40[13]\s*\)", re.I)),
+    (
+        MISSING_ACCESSION,
+        re.compile(
+            r"(?:failed to|cannot) resolve accession|no such accession|invalid accession|"
+            r"is not a valid accession|item not found|name not found while resolving|"
+            r"no data\s*\(\s*404\s*\)",
+            re.I,
+        ),
+    ),
+    (
+        NETWORK,
+        re.compile(
+            r"connection|network|ssl|tls|socket|reset by peer|unreachable|name resolution|"
+            r"transfer incomplete|curl|http|\b50[234]\b",
+            re.I,
+        ),
+    ),
+]
+
+# 各類型在同一批次內最多嘗試次數 (含第一次)；0 表示不重試
+MAX_ATTEMPTS = {
+    TIMEOUT: 2,
+    NETWORK: 5,
+    UNKNOWN: 3,
+    MD5_MISMATCH: 2,
+    AUTH: 2,
+    DISK_FULL: 0,
+    MISSING_ACCESSION: 0,
+}
+PERMANENT_KINDS = {MISSING_ACCESSION}
+
+BASE_DELAY = 30  # 秒
+MAX_DELAY = 30 * 60
+
+
+def classify_error(error):
+    """依錯誤訊息判斷失敗類型"""
+    for kind, pattern in _PATTERNS:
+        if pattern.search(error or ""):
+            return kind
+    return UNKNOWN
+
+
+def is_permanent(kind):
+    return kind in PERMANENT_KINDS
+
+
+def backoff_delay(attempt, base=BASE_DELAY, max_delay=MAX_DELAY):
+    """第 attempt 次失敗後的等待秒數 (含抖動)"""
+    delay = min(max_delay, base * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+
+class RetryScheduler:
+    """
+    流水線的任務來源: 先送出待處理的 run，失敗且可重試者依退避時間重新送入
+
+    jobs() 在 feeder 執行緒中逐一產出 job；主執行緒以 handle_result()
+    回報每個結束的 job。所有 run 都有最終結果且沒有待重試項目時 jobs() 結束。
+    """
+
+    RETRY = "retry"
+    DONE = "done"
+    GAVE_UP = "gave_up"
+
+    def __init__(self, run_ids, make_job, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self._initial = iter(run_ids)
+        self._make_job = make_job
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts = {}  # run_id -> 已嘗試次數
+        self._retry_heap = []  # (到期時間, 序號, run_id)
+        self._seq = 0
+        self._outstanding = 0
+        self._initial_done = False
+        self._cond = threading.Condition()
+
+    def jobs(self, should_stop=None):
+        while True:
+            if should_stop is not None and should_stop():
+                return
+            run_id = self._next_run_id()
+            if run_id is None:
+                return
+            if run_id is _WAIT:
+                continue
+            self.attempts[run_id] = self.attempts.get(run_id, 0) + 1
+            yield self._make_job(run_id)
+
+    def _next_run_id(self):
+        with self._cond:
+            # 到期的重試優先
+            if self._retry_heap and self._retry_heap[0][0] <= time.time():
+                self._outstanding += 1
+                return heapq.heappop(self._retry_heap)[2]
+
+            if not self._initial_done:
+                run_id = next(self._initial, None)
+                if run_id is not None:
+                    self._outstanding += 1
+                    return run_id
+                self._initial_done = True
+
+            if not self._retry_heap and self._outstanding == 0:
+                return None
+
+            # 等待下一個重試到期或有 job 結束 (最多 1 秒以便檢查中斷)
+            timeout = 1.0
+            if self._retry_heap:
+                timeout = min(timeout, max(0.0, self._retry_heap[0][0] - time.time()))
+            self._cond.wait(timeout)
+            return _WAIT
+
+    def handle_result(self, job):
+        """回報結束的 job，回傳 (決定, 失敗類型, 延遲秒數)"""
+        with self._cond:
+            self._outstanding -= 1
+            try:
+                if job.ok:
+                    return self.DONE, None, 0.0
+
+                kind = classify_error(job.error)
+                attempt = self.attempts.get(job.run_id, 1)
+                if attempt >= MAX_ATTEMPTS.get(kind, 0):
+                    return self.GAVE_UP, kind, 0.0
+
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                self._seq += 1
+                heapq.heappush(self._retry_heap, (time.time() + delay, self._seq, job.run_id))
+                return self.RETRY, kind, delay
+            finally:
+                self._cond.notify_all()
+
+    def pending_retries(self):
+        with self._cond:
+            return len(self._retry_heap)
+
+
+# jobs() 內部用: 本輪沒有可送出的 run，重新檢查
+_WAIT = object()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+SRA run 的預期大小與 MD5
+Expected .sra size / MD5 per run, from NCBI's SDL locate service
+
+prefetch 本身也是向 SDL (https://locate.ncbi.nlm.nih.gov/sdl/2/retrieve)
+查詢下載位置，回應中包含 .sra 檔的 size 與 md5。查詢結果快取在
+run_metadata.json，之後只查詢快取中沒有的 run。
+"""
+
+import json
+import os
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+SDL_URL = "https://locate.ncbi.nlm.nih.gov/sdl/2/retrieve"
+METADATA_NAME = "run_metadata.json"
+BATCH_SIZE = 100
+REQUEST_TIMEOUT = 30
+
+
+def load_cache(path):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path, cache):
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def fetch_sdl_metadata(run_ids, timeout=REQUEST_TIMEOUT):
+    """向 SDL 查詢一批 run 的 .sra 大小與 MD5，回傳 {run_id: {...}}"""
+    body = urllib.parse.urlencode({"acc": ",".join(run_ids), "filetype": "run"}).encode()
+    request = urllib.request.Request(
+        SDL_URL, data=body, headers={"User-Agent": "batch_fastq_downloader/1.0"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.load(response)
+
+    results = {}
+    for bundle in payload.get("result", []):
+        run_id = bundle.get("bundle")
+        if not run_id or str(bundle.get("status")) != "200":
+            continue
+        for item in bundle.get("files", []):
+            if item.get("type") == "sra" and item.get("size"):
+                results[run_id] = {
+                    "sra_bytes": int(item["size"]),
+                    "sra_md5": item.get("md5"),
+                }
+                break
+    return results
+
+
+def load_run_metadata(run_ids, cache_path, fetch=True, batch_size=BATCH_SIZE):
+    """
+    取得 run 的預期大小與 MD5 (先讀快取，缺少的再向 SDL 批次查詢)
+
+    查詢失敗時只印警告並回傳目前已知的部分。
+    """
+    cache = load_cache(cache_path)
+    missing = [run_id for run_id in run_ids if run_id not in cache]
+
+    if fetch and missing:
+        print(f"📏 查詢 {len(missing)} 個樣本的預期大小...", end="", flush=True)
+        fetched = 0
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i : i + batch_size]
+            try:
+                results = fetch_sdl_metadata(batch)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                print(f" ⚠️  查詢失敗: {e}", file=sys.stderr)
+                break
+            cache.update(results)
+            fetched += len(results)
+        print(f" 取得 {fetched} 個")
+        if fetched:
+            save_cache(cache_path, cache)
+
+    return {run_id: cache[run_id] for run_id in run_ids if run_id in cache}
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+FracMinHash 相似度索引
+FracMinHash sketch index for run-to-run similarity queries
+
+每個 run 的 sketch = kmer_profile.py 輸出中雜湊值 < 2^64 / scale 的 canonical k-mer 雜湊集合
+(精確計數的 profile 先以同一個雜湊函式轉換)。所有 run 的 sketch 合併成一個依雜湊值排序的
+倒排索引，存成 sketch_index/ 下的 .npy 檔並以 mmap 開啟，不需要整個讀入記憶體:
+
+* hashes.npy     所有 (雜湊值, run) 項目依雜湊值排序後的雜湊值 (uint64)
+* owners.npy     每個項目所屬的 run 編號 (int32)
+* positions.npy  依 run 分組的項目位置，offsets.npy 為每個 run 的起點
+* meta.json      k、scale 與 run 清單
+
+查詢一個 run 時，以 searchsorted 找出其每個雜湊值在倒排索引中的範圍，
+用 bincount 一次算出與所有 run 的共同雜湊數，Jaccard = 共同 / (兩者大小和 - 共同)。
+兩兩矩陣則在群組成員的項目上，依每個雜湊值的出現次數一次展開所有成對組合計數。
+
+用法:
+    python sketch_index.py build                          # 由 kmer_profiles/ 建立索引
+    python sketch_index.py similar SRR10810025 --top 10   # 最相似的 run
+    python sketch_index.py matrix --host "Apis mellifera" --output jaccard.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from fastq_stats import group_fastq_files, worker_init
+from kmer_profile import (
+    DEFAULT_K,
+    DEFAULT_SCALE,
+    PROFILE_DIR,
+    PROFILE_WORKERS,
+    hash64,
+    hash_threshold,
+    load_profile,
+    profile_path,
+    run_kmer_profile,
+)
+
+INDEX_DIR = "sketch_index"
+RUNS_CSV = "insecta_runs.csv"
+DEFAULT_TOP = 10
+# 兩兩矩陣一次展開的成對組合上限 (控制記憶體)
+PAIR_BATCH = 16 * 1024 * 1024
+
+
+def profile_sketch(profile, scale):
+    """由 kmer_profile 的輸出取出 scale 下的 FracMinHash sketch (排序後的 uint64)"""
+    if scale < profile["scale"]:
+        raise ValueError(f"{profile['run_id']}: profile 的 scale={profile['scale']} 大於索引的 scale={scale}")
+    keys = profile["keys"]
+    if profile["scale"] == 1:
+        keys = np.unique(hash64(keys))  # 精確計數的 key 是 k-mer 編碼
+    # FracMinHash 可直接降採樣: 較大的 scale 只是更嚴格的門檻
+    return keys[keys <= hash_threshold(scale)]
+
+
+def load_hosts(csv_path):
+    """run_accession -> host_scientific_name (MGnify 爬蟲的輸出)"""
+    hosts = {}
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                hosts[row["run_accession"]] = row.get("host_scientific_name") or ""
+    except FileNotFoundError:
+        pass
+    return hosts
+
+
+class SketchIndex:
+    """依雜湊值排序的倒排索引"""
+
+    def __init__(self, run_ids, hashes, owners, positions, offsets, k, scale):
+        self.run_ids = list(run_ids)
+        self.index_of = {run_id: i for i, run_id in enumerate(self.run_ids)}
+        self.hashes = hashes
+        self.owners = owners
+        self.positions = positions
+        self.offsets = offsets
+        self.sizes = np.diff(offsets)
+        self.k = k
+        self.scale = scale
+
+    @classmethod
+    def from_sketches(cls, sketches, k, scale):
+        """sketches: {run_id: 排序後的 uint64 雜湊}"""
+        run_ids = sorted(sketches)
+        sizes = np.array([len(sketches[r]) for r in run_ids], dtype=np.int64)
+        offsets = np.zeros(len(run_ids) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        if run_ids:
+            hashes = np.concatenate([sketches[r] for r in run_ids]).astype(np.uint64)
+        else:
+            hashes = np.empty(0, dtype=np.uint64)
+        owners = np.repeat(np.arange(len(run_ids), dtype=np.int32), sizes)
+
+        order = np.argsort(hashes, kind="stable")
+        # positions[order[j]] = j: 依 run 分組的項目在排序後的位置 (每個 run 內仍依雜湊值遞增)
+        positions = np.empty_like(order)
+        positions[order] = np.arange(len(order))
+        return cls(run_ids, hashes[order], owners[order], positions, offsets, k, scale)
+
+    def save(self, index_dir):
+        """寫入 index_dir (先寫暫存資料夾再改名，不會留下半個索引)"""
+        index_dir = Path(index_dir)
+        tmp = index_dir.with_name(index_dir.name + ".part")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name in ("hashes", "owners", "positions", "offsets"):
+            np.save(tmp / f"{name}.npy", getattr(self, name))
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"k": self.k, "scale": self.scale, "runs": self.run_ids}, f)
+        old = index_dir.with_name(index_dir.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if index_dir.exists():
+            os.replace(index_dir, old)
+        os.replace(tmp, index_dir)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, index_dir):
+        """以 mmap 開啟索引 (查詢只讀取用到的頁面)"""
+        index_dir = Path(index_dir)
+        with open(index_dir / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(index_dir / f"{name}.npy", mmap_mode="r")
+            for name in ("hashes", "owners", "positions", "offsets")
+        }
+        return cls(meta["runs"], k=meta["k"], scale=meta["scale"], **arrays)
+
+    def sketch(self, run_id):
+        i = self.index_of[run_id]
+        return self.hashes[self.positions[self.offsets[i] : self.offsets[i + 1]]]
+
+    def shared_counts(self, run_id):
+        """與每個 run 的共同雜湊數 (int64 陣列，依 run_ids 順序)"""
+        query = self.sketch(run_id)
+        left = np.searchsorted(self.hashes, query, side="left")
+        right = np.searchsorted(self.hashes, query, side="right")
+        counts = right - left
+        # 展開所有 [left, right) 範圍: 每個項目的位置 = 所屬範圍的 left + 範圍內序號
+        starts = np.cumsum(counts) - counts
+        entries = np.arange(counts.sum()) + np.repeat(left - starts, counts)
+        return np.bincount(self.owners[entries], minlength=len(self.run_ids))
+
+    def similar(self, run_id, top=DEFAULT_TOP, candidates=None):
+        """
+        與 run_id 最相似的 run，回傳 [(run_id, jaccard, 共同雜湊數)]
+
+        candidates: 只考慮這些 run (例如同一宿主)
+        """
+        i = self.index_of[run_id]
+        shared = self.shared_counts(run_id)
+        union = self.sizes[i] + self.sizes - shared
+        jaccard = np.divide(shared, union, out=np.zeros(len(shared)), where=union > 0)
+        mask = np.ones(len(shared), dtype=bool)
+        if candidates is not None:
+            mask[:] = False
+            mask[[self.index_of[r] for r in candidates if r in self.index_of]] = True
+        mask[i] = False
+        chosen = np.flatnonzero(mask)
+        best = chosen[np.argsort(-jaccard[chosen], kind="stable")[:top]]
+        return [(self.run_ids[j], float(jaccard[j]), int(shared[j])) for j in best]
+
+    def pairwise(self, run_ids):
+        """run_ids 兩兩之間的 (Jaccard 矩陣, 共同雜湊數矩陣)"""
+        members = np.array([self.index_of[r] for r in run_ids], dtype=np.int64)
+        n = len(members)
+        local = np.full(len(self.run_ids), -1, dtype=np.int64)
+        local[members] = np.arange(n)
+
+        # 成員的所有項目位置，排序後相同雜湊值的項目相鄰
+        entries = np.sort(
+            np.concatenate(
+                [self.positions[self.offsets[i] : self.offsets[i + 1]] for i in members]
+                or [np.empty(0, dtype=np.int64)]
+            )
+        )
+        owners = local[self.owners[entries]]
+        hashes = self.hashes[entries]
+
+        shared = np.zeros(n * n, dtype=np.int64)
+        if len(entries):
+            first = np.flatnonzero(np.concatenate(([True], hashes[1:] != hashes[:-1])))
+            multiplicity = np.diff(np.append(first, len(entries)))
+            # 出現次數相同的雜湊值排成 (個數, m) 的矩陣，以廣播展開 m x m 的成對組合
+            for m in np.unique(multiplicity):
+                groups = first[multiplicity == m]
+                batch = max(1, PAIR_BATCH // (m * m))
+                for start in range(0, len(groups), batch):
+                    rows = owners[groups[start : start + batch, None] + np.arange(m)]
+                    pairs = rows[:, :, None] * n + rows[:, None, :]
+                    shared += np.bincount(pairs.ravel(), minlength=n * n)
+        shared = shared.reshape(n, n)
+
+        sizes = np.diag(shared)
+        union = sizes[:, None] + sizes[None, :] - shared
+        jaccard = np.divide(shared, union, out=np.zeros((n, n)), where=union > 0)
+        return jaccard, shared
+
+
+def build_index(profiles_dir, index_dir, k=DEFAULT_K, scale=DEFAULT_SCALE):
+    """由 profiles_dir 中所有 {run_id}.k{k}.npz 建立索引，回傳 SketchIndex"""
+    sketches = {}
+    for path in sorted(Path(profiles_dir).glob(f"*.k{k}.npz")):
+        profile = load_profile(path)
+        try:
+            sketches[profile["run_id"]] = profile_sketch(profile, scale)
+        except ValueError as e:
+            print(f"⚠️  {e}", file=sys.stderr)
+    index = SketchIndex.from_sketches(sketches, k, scale)
+    index.save(index_dir)
+    return index
+
+
+def compute_missing_profiles(fastq_dir, profiles_dir, k, scale, workers):
+    """為 fastq_dir 中尚無 profile 的 run 計算 k-mer profile"""
+    groups = group_fastq_files(fastq_dir)
+    todo = [r for r in sorted(groups) if not profile_path(profiles_dir, r, k).exists()]
+    if not todo:
+        return
+    print(f"🧬 計算 {len(todo)} 個 run 的 k-mer profile")
+    with ProcessPoolExecutor(max_workers=max(1, workers), initializer=worker_init) as executor:
+        futures = {
+            executor.submit(run_kmer_profile, run_id, groups[run_id], profiles_dir, k, scale): run_id
+            for run_id in todo
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"❌ {futures[future]}: {e}", file=sys.stderr)
+
+
+def host_groups(run_ids, hosts):
+    """依宿主分組 (沒有宿主資料的 run 歸在空字串)"""
+    groups = {}
+    for run_id in run_ids:
+        groups.setdefault(hosts.get(run_id, ""), []).append(run_id)
+    return groups
+
+
+def cmd_build(args):
+    if args.fastq_dir is not None:
+        compute_missing_profiles(args.fastq_dir, args.profiles_dir, args.k, args.scale, args.workers)
+    started = time.time()
+    index = build_index(args.profiles_dir, args.index, args.k, args.scale)
+    print(
+        f"✅ 索引 {len(index.run_ids)} 個 run、{len(index.hashes):,} 個雜湊 "
+        f"(k={index.k}, scale={index.scale})，耗時 {time.time() - started:.1f}s → {args.index}"
+    )
+
+
+def cmd_similar(args):
+    index = SketchIndex.load(args.index)
+    hosts = load_hosts(args.runs_csv)
+    if args.run_id not in index.index_of:
+        sys.exit(f"❌ 索引中沒有 {args.run_id}")
+    candidates = None
+    if args.same_host:
+        host = hosts.get(args.run_id, "")
+        candidates = [r for r in index.run_ids if hosts.get(r, "") == host]
+
+    started = time.perf_counter()
+    results = index.similar(args.run_id, args.top, candidates)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"🔍 {args.run_id} ({hosts.get(args.run_id) or '未知宿主'}) 最相似的 {len(results)} 個 run ({elapsed:.1f} ms)")
+    for run_id, jaccard, shared in results:
+        print(f"  {run_id:<14} Jaccard {jaccard:.4f}  共同 {shared:>7,}  {hosts.get(run_id, '')}")
+
+
+def cmd_matrix(args):
+    index = SketchIndex.load(args.index)
+    hosts = load_hosts(args.runs_csv)
+    groups = host_groups(index.run_ids, hosts)
+    names = args.host or sorted(groups)
+
+    writer = None
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else None
+    try:
+        if out is not None:
+            writer = csv.writer(out)
+            writer.writerow(["host_scientific_name", "run_a", "run_b", "jaccard", "shared"])
+        for name in names:
+            members = groups.get(name, [])
+            if len(members) < 2:
+                print(f"⚠️  {name or '未知宿主'}: 索引中的 run 少於 2 個，略過")
+                continue
+            started = time.perf_counter()
+            jaccard, shared = index.pairwise(members)
+            elapsed = (time.perf_counter() - started) * 1000
+            upper = np.triu_indices(len(members), 1)
+            print(
+                f"📐 {name or '未知宿主'}: {len(members)} 個 run，"
+                f"平均 Jaccard {jaccard[upper].mean():.4f} ({elapsed:.1f} ms)"
+            )
+            if writer is not None:
+                for a, b in zip(*upper):
+                    writer.writerow([name, members[a], members[b], f"{jaccard[a, b]:.6f}", int(shared[a, b])])
+    finally:
+        if out is not None:
+            out.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FracMinHash 相似度索引")
+    parser.add_argument(
+        "--index", type=Path, default=Path(__file__).parent / INDEX_DIR, help=f"索引資料夾 (預設: {INDEX_DIR})"
+    )
+    parser.add_argument(
+        "--runs-csv",
+        type=Path,
+        default=Path(__file__).parent / RUNS_CSV,
+        help=f"run 與宿主對照 (預設: {RUNS_CSV})",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="由 k-mer profile 建立索引")
+    build_parser.add_argument(
+        "--profiles-dir",
+        type=Path,
+        default=Path(__file__).parent / PROFILE_DIR,
+        help=f"kmer_profile.py 的輸出資料夾 (預設: {PROFILE_DIR})",
+    )
+    build_parser.add_argument("--k", type=int, default=DEFAULT_K, help=f"k-mer 長度 (預設: {DEFAULT_K})")
+    build_parser.add_argument(
+        "--scale", type=int, default=DEFAULT_SCALE, help=f"保留約 1/scale 的雜湊 (預設: {DEFAULT_SCALE})"
+    )
+    build_parser.add_argument(
+        "--fastq-dir", type=Path, default=None, help="先為此資料夾中尚無 profile 的 run 計算 profile"
+    )
+    build_parser.add_argument(
+        "--workers", type=int, default=PROFILE_WORKERS, help=f"計算 profile 的行程數 (預設: {PROFILE_WORKERS})"
+    )
+
+    similar_parser = subparsers.add_parser("similar", help="查詢最相似的 run")
+    similar_parser.add_argument("run_id")
+    similar_parser.add_argument("--top", type=int, default=DEFAULT_TOP, help=f"列出幾個 (預設: {DEFAULT_TOP})")
+    similar_parser.add_argument("--same-host", action="store_true", help="只比較同一宿主的 run")
+
+    matrix_parser = subparsers.add_parser("matrix", help="依宿主計算兩兩 Jaccard 矩陣")
+    matrix_parser.add_argument("--host", action="append", help="只計算此宿主 (可重複；預設: 全部)")
+    matrix_parser.add_argument("--output", type=Path, default=None, help="輸出 CSV (每對 run 一行)")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        if args.scale < 1:
+            parser.error("--scale 必須 >= 1")
+        cmd_build(args)
+    elif args.command == "similar":
+        cmd_similar(args)
+    elif args.command == "matrix":
+        cmd_matrix(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+位元組層級的下載進度
+Byte-level transfer progress for prefetch
+
+TransferProbe 定期量測每個 prefetch 中 run 的暫存資料夾
+({base_dir}/{run_id}/ 下逐漸變大的 .sra / .prefetch / .tmp 檔) 大小，
+交給 ProgressBoard 計算每個 run 的即時 MB/s。
+
+ByteEta 以預期大小 (run_metadata.py) 加權估計剩餘時間，
+取代「已完成個數的平均秒數」這種忽略樣本大小差異的估計。
+"""
+
+import os
+import threading
+import time
+
+from job_ordering import fill_unknown_sizes
+
+PROBE_INTERVAL = 2.0  # 秒
+IGNORED_SUFFIXES = (".lock",)
+
+
+def directory_bytes(path):
+    """資料夾內所有檔案大小總和 (資料夾不存在時為 0)"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.endswith(IGNORED_SUFFIXES):
+                    continue
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                    elif entry.is_dir(follow_symlinks=False):
+                        total += directory_bytes(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        return 0
+    return total
+
+
+class TransferProbe:
+    """背景執行緒: 輪詢 prefetch 暫存檔大小並更新 ProgressBoard"""
+
+    def __init__(self, board, base_dir, stage="prefetch", interval=PROBE_INTERVAL):
+        self.board = board
+        self.base_dir = base_dir
+        self.stage = stage
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="transfer-probe", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        for run_id in self.board.in_flight_bytes(self.stage):
+            self.board.set_bytes(run_id, directory_bytes(os.path.join(self.base_dir, run_id)))
+
+
+class ByteEta:
+    """以預期位元組數加權的剩餘時間估計"""
+
+    def __init__(self, run_ids, expected_bytes):
+        # 沒有大小資料的 run 以已知樣本的平均大小估計
+        self.remaining = fill_unknown_sizes(run_ids, expected_bytes)
+        self.remaining_total = sum(self.remaining.values())
+        self.done_bytes = 0
+        self.start_time = time.time()
+        self.known = sum(1 for r in run_ids if expected_bytes.get(r))
+
+    def finish(self, run_id):
+        """run 已有最終結果 (成功或放棄)"""
+        nbytes = self.remaining.pop(run_id, 0)
+        self.remaining_total -= nbytes
+        self.done_bytes += nbytes
+
+    def estimate(self, in_flight=None):
+        """
+        回傳 (剩餘秒數, 整體 bytes/s)；尚無足夠資料時剩餘秒數為 None
+
+        in_flight: {run_id: 已下載 bytes}，計入尚未完成 run 的部分進度
+        """
+        partial = 0
+        for run_id, nbytes in (in_flight or {}).items():
+            partial += min(nbytes, self.remaining.get(run_id, 0))
+
+        elapsed = time.time() - self.start_time
+        transferred = self.done_bytes + partial
+        if elapsed <= 0 or transferred <= 0 or not self.known:
+            return None, 0.0
+        rate = transferred / elapsed
+        return max(0.0, self.remaining_total - partial) / rate, rate
@@ -6,7 +6,7 @@
 import pandas as pd
 import json
 import requests
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 
 
 class WorldDataProcessor:
@@ -82,6 +82,33 @@ class WorldDataProcessor:
                     continue
             raise ValueError(f"無法讀取檔案 {file_path}")
 
+    def load_parquet_data(
+        self,
+        path: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+    ) -> pd.DataFrame:
+        """載入 Parquet 檔案或分割資料夾 (如 mgnify_parquet.py 的輸出)
+
+        只解碼 columns 指定的欄位；filters 為 {欄位: 值或值清單}，
+        分割欄位 (如 biome) 的條件會直接略過不相符的分割檔。
+        字典編碼的欄位會讀成 pandas 的 category 型別。
+        """
+        conditions = None
+        if filters:
+            conditions = [
+                (col, "in", [value] if isinstance(value, str) else list(value))
+                for col, value in filters.items()
+            ]
+        try:
+            return pd.read_parquet(
+                path, engine="pyarrow", columns=columns, filters=conditions
+            )
+        except ImportError as exc:
+            raise ImportError(
+                "讀取 Parquet 需要 pyarrow 套件: pip install pyarrow"
+            ) from exc
+
     def add_country_codes(
         self, df: pd.DataFrame, country_column: str = "country"
     ) -> pd.DataFrame: